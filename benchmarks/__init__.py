@@ -0,0 +1,7 @@
+"""Reproducible in-process benchmarks for the Found It! API
+
+Run with ``python -m benchmarks`` from the project root. See __main__.py
+for options. Only query counts and peak allocations are gated against
+the baseline; drops in ops/sec are printed as SLOWER lines but never fail
+the run, since throughput depends on the machine.
+"""
@@ -0,0 +1,94 @@
+"""Command line entry point: ``python -m benchmarks [options]``
+
+Builds a fresh sqlite database from the seeded generator, runs every
+scenario (or those matching --only) and prints ops/sec, queries, peak
+allocations and response size per request. Results are compared with --baseline and the
+run exits with status 1 if any scenario made more queries or allocated
+more. Throughput depends on the machine that recorded the baseline, so
+large drops in ops/sec are printed but don't fail the run.
+--update-baseline writes the results as the new baseline instead.
+"""
+import argparse
+import json
+import os
+import sys
+from .environment import setup_django
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Found It! API benchmarks')
+    parser.add_argument('--organizers', type=int, default=10, help='Organizers in the dataset')
+    parser.add_argument('--categories', type=int, default=20, help='Categories in the dataset')
+    parser.add_argument('--items', type=int, default=20000, help='Items in the dataset')
+    parser.add_argument('--skew', type=float, default=1.0,
+                        help='Zipf exponent for items per organizer and category; 0 is uniform')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the data generator')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per scenario')
+    parser.add_argument('--only', action='append', default=[],
+                        help='Run scenarios whose name starts with this prefix; may be repeated')
+    parser.add_argument('--baseline', default=os.path.join(os.path.dirname(__file__), 'baseline.json'),
+                        help='Baseline JSON to compare with')
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results to --baseline')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='Allowed fractional growth in allocations')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    setup_django()
+
+    from .data import Dataset
+    from .runner import Bench, compare, run_scenario, slower
+    from .scenarios import SCENARIOS
+
+    dataset_options = {
+        'organizers': options.organizers, 'categories': options.categories,
+        'items': options.items, 'skew': options.skew, 'seed': options.seed,
+    }
+    bench = Bench(Dataset(**dataset_options).build())
+
+    results = {}
+    print('%-32s %12s %8s %12s %12s' % ('scenario', 'ops/sec', 'queries', 'peak KiB', 'body KiB'))
+    for scenario in SCENARIOS:
+        if options.only and not any(scenario.name.startswith(prefix) for prefix in options.only):
+            continue
+        result = results[scenario.name] = run_scenario(bench, scenario, options.repeat, options.warmup)
+        print('%-32s %12.1f %8d %12.1f %12.1f' % (scenario.name, result['ops_per_sec'], result['queries'],
+                                                  result['peak_kib'], result['response_kib']))
+
+    if options.update_baseline:
+        baseline = {'dataset': dataset_options, 'scenarios': results}
+        if options.only and os.path.exists(options.baseline):
+            with open(options.baseline) as stored:
+                baseline['scenarios'] = dict(json.load(stored)['scenarios'], **results)
+        with open(options.baseline, 'w') as stored:
+            json.dump(baseline, stored, indent=2, sort_keys=True)
+            stored.write('\n')
+        print('Wrote %s' % options.baseline)
+        return 0
+
+    if not os.path.exists(options.baseline):
+        print('No baseline at %s; run with --update-baseline to create one' % options.baseline)
+        return 0
+
+    with open(options.baseline) as stored:
+        baseline = json.load(stored)
+    if baseline['dataset'] != dataset_options:
+        print('Baseline was recorded with a different dataset %s; not comparing' % baseline['dataset'])
+        return 0
+
+    for name, message in slower(results, baseline['scenarios']):
+        print('SLOWER %s: %s (not gated; ops/sec vary between machines)' % (name, message))
+    regressions = compare(results, baseline['scenarios'], options.tolerance)
+    for name, message in regressions:
+        print('REGRESSION %s: %s' % (name, message))
+    if regressions:
+        return 1
+    print('No regressions against %s' % options.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
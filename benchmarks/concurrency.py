@@ -0,0 +1,117 @@
+"""Concurrent stock writers: ``python -m benchmarks.concurrency [options]``
+
+Several threads, each with its own client and database connection, add
+one to the same item's quantity over and over. The final quantity shows
+how many increments were lost, and the elapsed time gives increments per
+second. The database uses the SQLite tuning in settings, WAL mode
+included. Three strategies are compared:
+
+    put       -- GET the item, then PUT the quantity plus one
+    adjust    -- POST /items/{id}/adjust with a delta of one
+    versioned -- GET the item, then adjust with its version, retrying on 409
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from .environment import setup_django
+
+
+def put(client, path, headers):
+    quantity = json.loads(client.get(path, **headers).content)['quantity']
+    response = client.put(path, json.dumps({'quantity': quantity + 1}), content_type='application/json', **headers)
+    return response.status_code == 204, 0
+
+
+def adjust(client, path, headers):
+    response = client.post(path + '/adjust', json.dumps({'delta': 1}), content_type='application/json', **headers)
+    return response.status_code == 200, 0
+
+
+def versioned(client, path, headers):
+    conflicts = 0
+    version = json.loads(client.get(path, **headers).content)['version']
+    while True:
+        response = client.post(path + '/adjust', json.dumps({'delta': 1, 'version': version}),
+                               content_type='application/json', **headers)
+        if response.status_code != 409:
+            return response.status_code == 200, conflicts
+        conflicts += 1
+        version = json.loads(response.content)['version']
+
+
+STRATEGIES = {'put': put, 'adjust': adjust, 'versioned': versioned}
+
+
+def run(strategy, organizer, token, writers, increments):
+    from django.db import connection
+    from django.test import Client
+    from founditapi.bulk import bulk_create_items
+    from founditapi.models import Category, Item
+
+    item = Item(organizer=organizer, name='contended', description='', quantity=0, location='Shed',
+                category=Category.objects.first())
+    bulk_create_items(organizer, [item])
+    path = '/items/%d' % item.pk
+    headers = {'HTTP_AUTHORIZATION': 'Token %s' % token}
+    totals = {'failed': 0, 'conflicts': 0}
+    lock = threading.Lock()
+
+    def writer():
+        client = Client()
+        failed = conflicts = 0
+        try:
+            for _ in range(increments):
+                ok, retried = STRATEGIES[strategy](client, path, headers)
+                failed += not ok
+                conflicts += retried
+        finally:
+            connection.close()
+        with lock:
+            totals['failed'] += failed
+            totals['conflicts'] += conflicts
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    expected = writers * increments
+    final = Item.objects.get(pk=item.pk).quantity
+    return {
+        'increments_per_sec': round(expected / elapsed, 1),
+        'expected': expected,
+        'final': final,
+        'lost': expected - final - totals['failed'],
+        'failed': totals['failed'],
+        'conflicts': totals['conflicts'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.concurrency', description=__doc__.split('\n')[0])
+    parser.add_argument('--writers', type=int, default=8, help='Concurrent writer threads')
+    parser.add_argument('--increments', type=int, default=100, help='Increments per writer')
+    parser.add_argument('--strategy', action='append', choices=sorted(STRATEGIES),
+                        help='Strategy to run; may be repeated, defaults to all')
+    options = parser.parse_args(argv)
+
+    setup_django()
+    from .data import Dataset
+    dataset = Dataset(organizers=1, categories=1, items=0).build()
+
+    print('%-10s %12s %9s %7s %7s %7s %10s' % ('strategy', 'incr/sec', 'expected', 'final', 'lost', 'failed', 'conflicts'))
+    for strategy in options.strategy or list(STRATEGIES):
+        result = run(strategy, dataset.organizers[0], dataset.tokens[0], options.writers, options.increments)
+        print('%-10s %12.1f %9d %7d %7d %7d %10d' % (
+            strategy, result['increments_per_sec'], result['expected'], result['final'],
+            result['lost'], result['failed'], result['conflicts']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Seeded synthetic dataset generator for the benchmarks"""
+import random
+from django.contrib.auth.models import User
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+from founditapi.bulk import bulk_create_items
+from founditapi.models import Category, CategoryItem, Item, Organizer
+
+
+WORDS = (
+    'cumin', 'sugar', 'flour', 'salt', 'pepper', 'basil', 'oregano', 'rice', 'beans', 'oats',
+    'hammer', 'wrench', 'drill', 'saw', 'tape', 'glue', 'nails', 'screws', 'bolts', 'pliers',
+    'aspirin', 'bandages', 'gauze', 'tent', 'lantern', 'rope', 'battery', 'charger', 'soap', 'bleach',
+)
+LOCATIONS = ('Pantry', 'Garage', 'Basement', 'Attic', 'Kitchen', 'Closet', 'Shed', 'Bathroom')
+
+PASSWORD = 'benchmark-password'
+
+
+def weights(count, skew):
+    """Zipf-like weights: with skew 0 every slot is equally likely"""
+    return [1.0 / (rank + 1) ** skew for rank in range(count)]
+
+
+def split(total, count, skew):
+    """Splits a total across `count` slots in proportion to weights(count, skew)"""
+    shares = weights(count, skew)
+    scale = total / sum(shares)
+    sizes = [int(share * scale) for share in shares]
+    sizes[0] += total - sum(sizes)
+    return sizes
+
+
+class Dataset:
+    """N organizers x M categories x K items, generated from a seed
+
+    Arguments:
+        organizers -- Number of organizers, each with a user and token
+        categories -- Number of global categories
+        items -- Total items, split across organizers and categories by `skew`
+        skew -- 0 spreads items evenly; larger values concentrate them on
+                the first organizers and categories
+        tags -- Further categories each item is tagged with, on top of its own
+        seed -- Seed for every random choice, so runs are repeatable
+    """
+
+    def __init__(self, organizers=10, categories=20, items=5000, skew=1.0, tags=2, seed=1):
+        self.organizer_count = organizers
+        self.category_count = categories
+        self.item_count = items
+        self.skew = skew
+        self.tag_count = min(tags, categories)
+        self.seed = seed
+        self.organizers = []
+        self.tokens = []
+        self.categories = []
+
+    def build(self):
+        """Creates the data and returns self"""
+        rng = random.Random(self.seed)
+        password = make_password(PASSWORD)
+
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username='bench%d' % index, email='bench%d@example.com' % index, password=password)
+                for index in range(self.organizer_count)
+            ])
+            users = list(User.objects.filter(username__startswith='bench').order_by('id'))
+            Organizer.objects.bulk_create([Organizer(user=user, phone_number='555-0100') for user in users])
+            Token.objects.bulk_create([Token(key='%040x' % rng.getrandbits(160), user=user) for user in users])
+            self.organizers = list(Organizer.objects.select_related('user').order_by('id'))
+            tokens = dict(Token.objects.values_list('user_id', 'key'))
+            self.tokens = [tokens[organizer.user_id] for organizer in self.organizers]
+
+            Category.objects.bulk_create([
+                Category(name='%s %d' % (rng.choice(WORDS).title(), index))
+                for index in range(self.category_count)
+            ])
+            self.categories = list(Category.objects.order_by('id').values_list('id', flat=True))
+
+            category_weights = weights(self.category_count, self.skew)
+            sizes = split(self.item_count, self.organizer_count, self.skew)
+            for organizer, size in zip(self.organizers, sizes):
+                items = [
+                    Item(
+                        organizer=organizer,
+                        name='%s %s' % (rng.choice(WORDS), rng.choice(WORDS)),
+                        description=' '.join(rng.choice(WORDS) for _ in range(8)),
+                        quantity=rng.randint(0, 10),
+                        location=rng.choice(LOCATIONS),
+                        category_id=rng.choices(self.categories, category_weights)[0],
+                    )
+                    for _ in range(size)
+                ]
+                bulk_create_items(organizer, items)
+                CategoryItem.objects.bulk_create([
+                    CategoryItem(organizer=organizer, item=item, category_id=category_id)
+                    for item in items for category_id in rng.sample(self.categories, self.tag_count)
+                ], ignore_conflicts=True)
+        return self
@@ -0,0 +1,18 @@
+"""Prepares Django and a fresh benchmark database"""
+import os
+
+
+def setup_django():
+    """Configures benchmarks.settings, clears the old database and version stamps, and migrates a new database"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    from django.conf import settings
+    name = settings.DATABASES['default']['NAME']
+    for path in (name, name + '-wal', name + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+    django.setup()
+    from django.core.management import call_command
+    from founditapi.caching import get_cache
+    get_cache().clear()
+    call_command('migrate', verbosity=0)
@@ -0,0 +1,144 @@
+"""Peak memory of a full inventory export
+
+``python -m benchmarks.exports [options]`` fills a fresh database with
+--items items for one organizer, then streams GET /items/export in each
+output format through the test client, each in a new process so that
+building the data doesn't count. The export's cost is how far the
+process's anonymous memory rises above where it was before the request,
+sampled after every chunk of the response. Anonymous memory leaves out
+the database pages SQLite maps in (FOUNDIT_SQLITE_PRAGMAS['mmap_size']),
+which count towards RSS but belong to the page cache. Without /proc the
+peak RSS is used instead. The run exits with status 1 if the growth
+passes --max-growth, since the export is meant to use the same memory
+whatever the inventory's size.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from .environment import setup_django
+
+
+BATCH_SIZE = 5000
+
+FORMATS = ('ndjson', 'csv')
+
+
+def peak_rss_kib():
+    """This process's peak resident set size so far, in KiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def memory_kib():
+    """This process's anonymous resident memory now, in KiB, where /proc has it, else its peak RSS"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('RssAnon:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return peak_rss_kib()
+
+
+def fill(items, seed=1):
+    """Creates one organizer and their items, inserted directly rather than through bulk_create_items
+
+    The receivers that index and summarize new items aren't needed to
+    export them and would take most of the time at a million rows.
+
+    Returns:
+        str -- The organizer's token
+    """
+    from django.db import transaction
+    from django.utils import timezone
+    from founditapi.models import Item
+    from .data import LOCATIONS, WORDS, Dataset
+
+    dataset = Dataset(organizers=1, items=0, tags=0, seed=seed).build()
+    organizer = dataset.organizers[0]
+    rng = random.Random(seed)
+    now = timezone.now()
+    for start in range(0, items, BATCH_SIZE):
+        with transaction.atomic():
+            Item.objects.bulk_create([
+                Item(organizer=organizer, name='%s %s' % (rng.choice(WORDS), rng.choice(WORDS)),
+                     description=' '.join(rng.choice(WORDS) for _ in range(8)), quantity=rng.randint(0, 10),
+                     location=rng.choice(LOCATIONS), category_id=rng.choice(dataset.categories),
+                     created_at=now, updated_at=now)
+                for _ in range(min(BATCH_SIZE, items - start))
+            ])
+    return dataset.tokens[0]
+
+
+def measure(output, token):
+    """Streams one export and returns its rows, bytes, seconds and peak memory growth"""
+    import django
+    django.setup()
+    from django.test import Client
+
+    client = Client()
+    before = peak = memory_kib()
+    started = time.perf_counter()
+    response = client.get('/items/export', {'output': output}, HTTP_AUTHORIZATION='Token %s' % token)
+    size = lines = 0
+    for chunk in response.streaming_content:
+        size += len(chunk)
+        lines += chunk.count(b'\n')
+        peak = max(peak, memory_kib())
+    elapsed = time.perf_counter() - started
+    response.close()
+    return {
+        'status': response.status_code,
+        'rows': lines - (1 if output == 'csv' else 0),
+        'mib': round(size / 1024 / 1024, 1),
+        'seconds': round(elapsed, 1),
+        'growth_mib': round((peak - before) / 1024, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.exports', description=__doc__.split('\n')[0])
+    parser.add_argument('--items', type=int, default=1000000, help='Items in the export')
+    parser.add_argument('--max-growth', type=float, default=32.0,
+                        help='Memory growth in MiB allowed while streaming an export')
+    parser.add_argument('--measure', choices=FORMATS, help=argparse.SUPPRESS)
+    parser.add_argument('--token', help=argparse.SUPPRESS)
+    options = parser.parse_args(argv)
+
+    if options.measure:
+        json.dump(measure(options.measure, options.token), sys.stdout)
+        return 0
+
+    os.environ.setdefault('FOUNDIT_BENCH_DB', os.path.join(tempfile.gettempdir(), 'foundit-bench-exports.sqlite3'))
+    setup_django()
+    started = time.perf_counter()
+    token = fill(options.items)
+    print('Inserted %d items in %.1f s' % (options.items, time.perf_counter() - started))
+
+    failed = False
+    print('%-8s %10s %10s %10s %11s' % ('output', 'rows', 'MiB', 'seconds', 'growth MiB'))
+    for output in FORMATS:
+        args = [sys.executable, '-m', 'benchmarks.exports', '--measure', output, '--token', token]
+        result = json.loads(subprocess.run(args, env=dict(os.environ), stdout=subprocess.PIPE, check=True).stdout)
+        print('%-8s %10d %10.1f %10.1f %11.1f' % (
+            output, result['rows'], result['mib'], result['seconds'], result['growth_mib']))
+        if result['status'] != 200 or result['rows'] != options.items:
+            print('FAILED %s: status %d, %d rows' % (output, result['status'], result['rows']))
+            failed = True
+        elif result['growth_mib'] > options.max_growth:
+            print('REGRESSION %s: memory grew %.1f MiB, more than %.1f' % (
+                output, result['growth_mib'], options.max_growth))
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Bytes on the wire and render time per response format
+
+``python -m benchmarks.formats [options]`` serializes --items of the
+benchmark organizer's items once, the way Items.list does, then renders
+that payload with each available renderer and compresses the result with
+each available coding at the levels in FOUNDIT_COMPRESSION. Times are the
+best of --repeat runs, so they reflect the encoders rather than noise.
+"""
+import argparse
+import sys
+import time
+from .environment import setup_django
+
+
+def best_of(repeat, function, *args):
+    """Returns (result, fastest seconds) over `repeat` calls"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def renderers():
+    """(name, renderer) for every format this environment can produce"""
+    from django.test import override_settings
+    from rest_framework.renderers import JSONRenderer as StdlibJSONRenderer
+    from founditapi import renderers as found
+
+    available = [('json (stdlib)', StdlibJSONRenderer())]
+    if found.orjson is not None:
+        with override_settings(FOUNDIT_JSON_ENCODER='orjson'):
+            available.append(('json (orjson)', found.JSONRenderer()))
+    if found.msgpack is not None:
+        available.append(('msgpack', found.MessagePackRenderer()))
+    return available
+
+
+def codings():
+    """(name, coding) for no compression and every coding the middleware can use"""
+    from founditapi.compression import CompressionMiddleware
+
+    middleware = CompressionMiddleware(lambda request: None)
+    return [('identity', None)] + [(coding.name, coding) for coding in reversed(middleware.codings)]
+
+
+def payload(items):
+    """Rows for `items` items as Items.list builds them, with categories expanded"""
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from founditapi.models import Item
+    from founditapi.views.rows import ItemRowSerializer
+    from .data import Dataset
+
+    dataset = Dataset(organizers=1, items=items).build()
+    request = Request(APIRequestFactory().get('/items', {'expand': 'category'}))
+    serializer = ItemRowSerializer(request)
+    return serializer.to_rows(Item.objects.filter(organizer=dataset.organizers[0]).order_by('created_at', 'id'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.formats', description=__doc__.split('\n')[0])
+    parser.add_argument('--items', type=int, default=10000, help='Items in the payload')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement; the fastest is kept')
+    options = parser.parse_args(argv)
+    setup_django()
+
+    from django.test import override_settings
+
+    rows = payload(options.items)
+    print('%d items' % len(rows))
+    print('%-14s %-9s %10s %11s %12s %10s' % ('format', 'coding', 'KiB', 'render ms', 'compress ms', 'total ms'))
+    for format_name, renderer in renderers():
+        with override_settings(FOUNDIT_JSON_ENCODER='orjson' if 'orjson' in format_name else 'stdlib'):
+            content, render_seconds = best_of(options.repeat, renderer.render, rows)
+        for coding_name, coding in codings():
+            body, compress_seconds = (content, 0.0) if coding is None else best_of(
+                options.repeat, coding.compress, content)
+            print('%-14s %-9s %10.1f %11.1f %12.1f %10.1f' % (
+                format_name, coding_name, len(body) / 1024, render_seconds * 1000, compress_seconds * 1000,
+                (render_seconds + compress_seconds) * 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
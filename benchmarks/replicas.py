@@ -0,0 +1,148 @@
+"""Read throughput against 0 or more read replicas
+
+``python -m benchmarks.replicas [options]`` runs the same workload once per
+--replicas count, each in a fresh process with its own database files.
+SQLite files refreshed from the primary by ``manage.py refresh_replicas``
+stand in for the replicas. --readers processes list items as different
+organizers while a writer process keeps adjusting one organizer's stock
+on the primary. Every read carries a distinct ``_`` parameter so it misses
+the response cache and reaches a database. Nothing is counted during
+--warmup, which outlasts the sticky window every reader starts with, since
+a version stamp it has not seen before might be a write the replicas lack.
+
+All the databases share this machine's disks and CPUs, so what the
+numbers show is where the reads went; throughput only scales with
+replicas that have hardware of their own.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from .environment import setup_django
+
+
+def counting(counts, alias):
+    def wrapper(execute, sql, params, many, context):
+        counts[alias] = counts.get(alias, 0) + 1
+        return execute(sql, params, many, context)
+    return wrapper
+
+
+def reader(token, categories, started, deadline, results):
+    from django.db import connections
+    from django.test import Client
+
+    client = Client()
+    headers = {'HTTP_AUTHORIZATION': 'Token %s' % token}
+    counts = {}
+    reads = 0
+    while time.time() < started:
+        client.get('/items?categories=%d&_=w%d' % (categories[reads % len(categories)], reads), **headers)
+        reads += 1
+    reads = 0
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(counting(counts, alias)))
+        while time.time() < deadline:
+            client.get('/items?categories=%d&_=%d' % (categories[reads % len(categories)], reads), **headers)
+            reads += 1
+    results.put({'reads': reads, 'queries': counts})
+
+
+def writer(token, item_id, started, deadline, results):
+    from django.test import Client
+
+    client = Client()
+    headers = {'HTTP_AUTHORIZATION': 'Token %s' % token}
+    writes = 0
+    while time.time() < deadline:
+        client.post('/items/%d/adjust' % item_id, json.dumps({'delta': 1}), content_type='application/json',
+                    **headers)
+        writes += time.time() >= started
+    results.put({'writes': writes})
+
+
+def run_profile(options):
+    """Runs the workload against the databases configured by the environment"""
+    setup_django()
+    from django.core.management import call_command
+    from django.db import connections
+    from founditapi.models import Item
+    from founditapi.routing import replicas
+    from .data import Dataset
+
+    dataset = Dataset(organizers=options.readers + 1, items=options.items).build()
+    if replicas():
+        call_command('refresh_replicas', stdout=open(os.devnull, 'w'))
+    item_id = Item.objects.filter(organizer=dataset.organizers[0]).values_list('id', flat=True).first()
+    # Forked children must open connections of their own
+    connections.close_all()
+
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    started = time.time() + options.warmup
+    deadline = started + options.seconds
+    processes = [context.Process(target=writer, args=(dataset.tokens[0], item_id, started, deadline, results))]
+    processes += [context.Process(target=reader, args=(token, dataset.categories, started, deadline, results))
+                  for token in dataset.tokens[1:]]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    queries = {}
+    for outcome in outcomes:
+        for alias, count in outcome.get('queries', {}).items():
+            queries[alias] = queries.get(alias, 0) + count
+    return {
+        'reads_per_sec': round(sum(outcome.get('reads', 0) for outcome in outcomes) / options.seconds, 1),
+        'writes_per_sec': round(sum(outcome.get('writes', 0) for outcome in outcomes) / options.seconds, 1),
+        # Of the readers' queries; the writer only uses the primary
+        'primary_share': round(queries.get('default', 0) / (sum(queries.values()) or 1), 3),
+        'queries': queries,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.replicas', description=__doc__.split('\n')[0])
+    parser.add_argument('--replicas', type=int, nargs='+', default=[0, 1, 2, 4], help='Replica counts to compare')
+    parser.add_argument('--readers', type=int, default=4, help='Reader processes, one organizer each')
+    parser.add_argument('--seconds', type=float, default=10, help='How long each run lasts')
+    parser.add_argument('--warmup', type=float, default=6, help='Seconds run before counting starts')
+    parser.add_argument('--items', type=int, default=20000, help='Items in the dataset')
+    parser.add_argument('--profile', action='store_true', help=argparse.SUPPRESS)
+    options = parser.parse_args(argv)
+
+    if options.profile:
+        json.dump(run_profile(options), sys.stdout)
+        return 0
+
+    directory = tempfile.gettempdir()
+    print('%-9s %11s %12s %20s' % ('replicas', 'reads/sec', 'writes/sec', 'reads on primary'))
+    base = None
+    for count in options.replicas:
+        paths = [os.path.join(directory, 'foundit-bench-replica%d.sqlite3' % index) for index in range(1, count + 1)]
+        for path in paths:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        environ = dict(os.environ, FOUNDIT_DB_REPLICAS=','.join(paths),
+                       FOUNDIT_BENCH_DB=os.path.join(directory, 'foundit-bench-primary.sqlite3'))
+        args = [sys.executable, '-m', 'benchmarks.replicas', '--profile', '--readers', str(options.readers),
+                '--seconds', str(options.seconds), '--warmup', str(options.warmup), '--items', str(options.items)]
+        result = json.loads(subprocess.run(args, env=environ, stdout=subprocess.PIPE, check=True).stdout)
+        base = base or result['reads_per_sec']
+        print('%-9d %11.1f %12.1f %20.3f   %.2fx reads' % (
+            count, result['reads_per_sec'], result['writes_per_sec'], result['primary_share'],
+            result['reads_per_sec'] / base))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
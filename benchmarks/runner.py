@@ -0,0 +1,163 @@
+"""Runs scenarios through Django's test client and compares them to a baseline"""
+import json
+import time
+import tracemalloc
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from founditapi.models import Item
+from .scenarios import admin_token
+
+
+class Bench:
+    """The dataset and an authenticated test client shared by every scenario
+
+    Arguments:
+        dataset -- A built benchmarks.data.Dataset
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.client = Client()
+        self.organizer = dataset.organizers[0]
+        self.token = dataset.tokens[0]
+        self.headers = {'HTTP_AUTHORIZATION': 'Token %s' % self.token}
+        self.categories = dataset.categories
+        self.category = dataset.categories[0]
+        self.admin_token = admin_token()
+        self.generation = 0
+
+    def item_ids(self, count):
+        """Ids of up to `count` of the benchmark organizer's items"""
+        return list(Item.objects.filter(organizer=self.organizer).order_by('id').values_list('id', flat=True)[:count])
+
+    def authorization(self, token, authenticated):
+        if token is not None:
+            return {'HTTP_AUTHORIZATION': 'Token %s' % token}
+        return self.headers if authenticated else {}
+
+    def get(self, path, token=None, authenticated=True, **extra):
+        return self.client.get(path, **self.authorization(token, authenticated), **extra)
+
+    def stream(self, path, **extra):
+        """GETs a streaming response and reads it to the end"""
+        response = self.get(path, **extra)
+        for _ in response.streaming_content:
+            pass
+        return response
+
+    def post(self, path, data, token=None, authenticated=True):
+        return self.client.post(path, json.dumps(data), content_type='application/json',
+                                **self.authorization(token, authenticated))
+
+    def put(self, path, data, token=None, authenticated=True):
+        return self.client.put(path, json.dumps(data), content_type='application/json',
+                               **self.authorization(token, authenticated))
+
+    def patch(self, path, data, token=None, authenticated=True):
+        return self.client.patch(path, json.dumps(data), content_type='application/json',
+                                 **self.authorization(token, authenticated))
+
+    def delete(self, path, data=None, token=None, authenticated=True):
+        body = json.dumps(data) if data is not None else ''
+        return self.client.delete(path, body, content_type='application/json',
+                                  **self.authorization(token, authenticated))
+
+    def json(self, response):
+        return json.loads(response.content.decode('utf-8'))
+
+
+class UnexpectedStatus(Exception):
+    pass
+
+
+def run_scenario(bench, scenario, repeat=20, warmup=3):
+    """Measures one scenario
+
+    A few warmup requests fill caches and connections. One request is then
+    made under CaptureQueriesContext and one under tracemalloc, so neither
+    instrument slows the timed loop that follows.
+
+    Returns:
+        dict -- ops_per_sec, queries, peak_kib and response_kib
+    """
+    repeat = scenario.repeat or repeat
+    state = scenario.prepare(bench, warmup + 2 + repeat)
+    index = 0
+
+    def call():
+        nonlocal index
+        response = scenario.request(bench, state, index)
+        index += 1
+        if response.status_code != scenario.status:
+            raise UnexpectedStatus('%s returned %d, expected %d: %s' % (
+                scenario.name, response.status_code, scenario.status,
+                b'' if getattr(response, 'streaming', False) else response.content[:200]))
+        return response
+
+    for _ in range(warmup):
+        call()
+
+    with CaptureQueriesContext(connection) as captured:
+        response = call()
+    queries = len(captured)
+    size = 0 if getattr(response, 'streaming', False) else len(response.content)
+
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'ops_per_sec': round(repeat / elapsed, 1),
+        'queries': queries,
+        'peak_kib': round(peak / 1024, 1),
+        'response_kib': round(size / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance, allocation_slack=64):
+    """Compares results with a stored baseline
+
+    Only what doesn't depend on the machine is gated: more queries than the
+    baseline is always a regression, and peak allocations may grow by
+    `tolerance` (a fraction) plus `allocation_slack` KiB of absolute slack
+    so tiny requests don't fail on noise. Throughput is left to slower().
+
+    Returns:
+        list -- (scenario name, message) for every regression
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['queries'] > expected['queries']:
+            regressions.append((name, 'queries %d -> %d' % (expected['queries'], result['queries'])))
+        if result['peak_kib'] > expected['peak_kib'] * (1 + tolerance) + allocation_slack:
+            regressions.append((name, 'peak KiB %.1f -> %.1f' % (expected['peak_kib'], result['peak_kib'])))
+    return regressions
+
+
+def slower(results, baseline, threshold=0.5):
+    """Lists scenarios whose ops/sec fell by more than `threshold` (a fraction)
+
+    The baseline's ops/sec were measured on whatever machine recorded it, so
+    these are reported for a person to look at rather than failing the run.
+
+    Returns:
+        list -- (scenario name, message) for every scenario that slowed down
+    """
+    changes = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is not None and result['ops_per_sec'] < expected['ops_per_sec'] * (1 - threshold):
+            changes.append((name, 'ops/sec %.1f -> %.1f' % (expected['ops_per_sec'], result['ops_per_sec'])))
+    return changes
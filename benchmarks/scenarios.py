@@ -0,0 +1,479 @@
+"""Benchmark scenarios, one or more for every route in foundit/urls.py
+
+A scenario is a setup function and a request function. Setup runs once,
+untimed, with the number of times the request will be made, and returns
+whatever state the request needs (ids to delete, payloads to post). The
+request function makes one request through the test client and returns
+the response, which must have the scenario's expected status code.
+"""
+import io
+import json
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from founditapi.bulk import bulk_create_items
+from founditapi.caching import bump
+from founditapi.jobs import enqueue
+from founditapi.models import Category, Item, Organizer
+from founditapi.sync import encode_token, latest_id
+from founditapi.tagging import tag_items
+from .data import PASSWORD
+
+
+SCENARIOS = []
+
+
+class Scenario:
+    """A named, repeatable request
+
+    Arguments:
+        name -- Dotted name used in reports and the baseline
+        request -- Function (bench, state, index) that makes one request
+        setup -- Function (bench, count) returning the request's state
+        status -- Expected status code of every response
+        repeat -- Timed iterations, overriding the runner's default
+    """
+
+    def __init__(self, name, request, setup=None, status=200, repeat=None):
+        self.name = name
+        self.request = request
+        self.setup = setup
+        self.status = status
+        self.repeat = repeat
+
+    def prepare(self, bench, count):
+        return self.setup(bench, count) if self.setup is not None else None
+
+
+def scenario(name, **options):
+    """Registers the decorated request function as a Scenario"""
+    def register(request):
+        SCENARIOS.append(Scenario(name, request, **options))
+        return request
+    return register
+
+
+def new_items(bench, count, organizer=None):
+    """Creates `count` throwaway items and returns their ids"""
+    organizer = organizer or bench.organizer
+    items = [
+        Item(organizer=organizer, name='bench item %d' % index, description='created for a benchmark',
+             quantity=1, location='Shed', category_id=bench.category)
+        for index in range(count)
+    ]
+    with transaction.atomic():
+        bulk_create_items(organizer, items)
+    return [item.pk for item in items]
+
+
+def tag_rows(bench, count, tagged=False):
+    """{item, category} rows for `count` throwaway items and the last category, optionally already tagged"""
+    rows = [{'item': pk, 'category': bench.categories[-1]} for pk in new_items(bench, count)]
+    if tagged:
+        tag_items(bench.organizer, [(row['item'], row['category']) for row in rows])
+    return rows
+
+
+def new_categories(bench, count):
+    Category.objects.bulk_create([Category(name='Bench category %d' % index) for index in range(count)])
+    return list(Category.objects.filter(name__startswith='Bench category').order_by('-id')
+                .values_list('id', flat=True)[:count])
+
+
+def new_organizers(bench, count):
+    """Creates `count` organizers that are safe to deactivate"""
+    users = User.objects.bulk_create([
+        User(username='bench-spare-%d-%d' % (bench.generation, index), password='!')
+        for index in range(count)
+    ])
+    users = User.objects.filter(username__startswith='bench-spare-%d-' % bench.generation)
+    Organizer.objects.bulk_create([Organizer(user=user, phone_number='555-0199') for user in users])
+    bench.generation += 1
+    return list(Organizer.objects.filter(user__in=users).values_list('id', flat=True))
+
+
+def item_payloads(bench, count):
+    return [
+        {'name': 'bench item %d' % index, 'description': 'posted by a benchmark', 'quantity': 3,
+         'location': 'Garage', 'category': bench.category}
+        for index in range(count)
+    ]
+
+
+def unique_users(bench, count):
+    bench.generation += 1
+    return ['bench-new-%d-%d' % (bench.generation, index) for index in range(count)]
+
+
+# Items
+
+@scenario('items.list')
+def items_list(bench, state, index):
+    return bench.get('/items')
+
+
+@scenario('items.list.sparse')
+def items_list_sparse(bench, state, index):
+    return bench.get('/items?fields=id,name,quantity')
+
+
+@scenario('items.list.large')
+def items_list_large(bench, state, index):
+    return bench.get('/items?limit=500&in_stock=0')
+
+
+@scenario('items.list.large.sparse')
+def items_list_large_sparse(bench, state, index):
+    return bench.get('/items?limit=500&in_stock=0&fields=id,name,quantity')
+
+
+@scenario('items.list.large.gzip')
+def items_list_large_gzip(bench, state, index):
+    return bench.get('/items?limit=500&in_stock=0', HTTP_ACCEPT_ENCODING='gzip')
+
+
+@scenario('items.list.large.br')
+def items_list_large_br(bench, state, index):
+    return bench.get('/items?limit=500&in_stock=0', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+
+
+@scenario('items.list.large.msgpack')
+def items_list_large_msgpack(bench, state, index):
+    return bench.get('/items?limit=500&in_stock=0', HTTP_ACCEPT='application/msgpack')
+
+
+@scenario('items.list.expanded')
+def items_list_expanded(bench, state, index):
+    return bench.get('/items?expand=category,organizer')
+
+
+@scenario('items.list.expanded.sparse')
+def items_list_expanded_sparse(bench, state, index):
+    return bench.get('/items?expand=category,organizer&fields=id,name,quantity,category')
+
+
+@scenario('items.list.page2', setup=lambda bench, count: bench.json(bench.get('/items?limit=50'))['next'])
+def items_list_page2(bench, state, index):
+    return bench.get(state)
+
+
+@scenario('items.list.filter')
+def items_list_filter(bench, state, index):
+    return bench.get('/items?category=%d&location=Pantry' % bench.category)
+
+
+@scenario('items.list.name_prefix')
+def items_list_name_prefix(bench, state, index):
+    return bench.get('/items?name_prefix=sa')
+
+
+@scenario('items.list.categories.any')
+def items_list_categories_any(bench, state, index):
+    return bench.get('/items?categories=%s' % ','.join(map(str, bench.categories[:5])))
+
+
+@scenario('items.list.categories.all')
+def items_list_categories_all(bench, state, index):
+    return bench.get('/items?categories=%s&match=all' % ','.join(map(str, bench.categories[:3])))
+
+
+@scenario('items.retrieve', setup=lambda bench, count: bench.item_ids(count))
+def items_retrieve(bench, state, index):
+    return bench.get('/items/%d' % state[index % len(state)])
+
+
+@scenario('items.create', setup=item_payloads)
+def items_create(bench, state, index):
+    payload = dict(state[index], created_at=timezone.now().isoformat())
+    return bench.post('/items', payload)
+
+
+@scenario('items.update', setup=lambda bench, count: bench.item_ids(count), status=204)
+def items_update(bench, state, index):
+    return bench.put('/items/%d' % state[index % len(state)], {'quantity': index % 10})
+
+
+@scenario('items.adjust', setup=lambda bench, count: bench.item_ids(count))
+def items_adjust(bench, state, index):
+    return bench.post('/items/%d/adjust' % state[index % len(state)], {'delta': 1 if index % 2 else -1})
+
+
+@scenario('items.destroy', setup=new_items, status=204)
+def items_destroy(bench, state, index):
+    return bench.delete('/items/%d' % state[index])
+
+
+@scenario('items.bulk.create', setup=lambda bench, count: item_payloads(bench, 100), status=201)
+def items_bulk_create(bench, state, index):
+    return bench.post('/items/bulk', state)
+
+
+@scenario('items.bulk.update', setup=lambda bench, count: bench.item_ids(100))
+def items_bulk_update(bench, state, index):
+    return bench.patch('/items/bulk', [{'id': pk, 'quantity': index % 10} for pk in state])
+
+
+@scenario('items.bulk.destroy', setup=lambda bench, count: [new_items(bench, 100) for _ in range(count)])
+def items_bulk_destroy(bench, state, index):
+    return bench.delete('/items/bulk', state[index])
+
+
+@scenario('items.tags.create', setup=lambda bench, count: [tag_rows(bench, 100) for _ in range(count)], status=201)
+def items_tags_create(bench, state, index):
+    return bench.post('/items/tags', state[index])
+
+
+@scenario('items.tags.destroy', setup=lambda bench, count: [tag_rows(bench, 100, tagged=True) for _ in range(count)])
+def items_tags_destroy(bench, state, index):
+    return bench.delete('/items/tags', state[index])
+
+
+@scenario('items.export.ndjson', repeat=5)
+def items_export_ndjson(bench, state, index):
+    return bench.stream('/items/export')
+
+
+@scenario('items.export.csv', repeat=5)
+def items_export_csv(bench, state, index):
+    return bench.stream('/items/export?output=csv')
+
+
+@scenario('items.export.queued', status=202)
+def items_export_queued(bench, state, index):
+    return bench.post('/items/export?output=csv', {})
+
+
+@scenario('items.import.ndjson', status=201, repeat=10)
+def items_import(bench, state, index):
+    lines = '\n'.join(json.dumps({
+        'name': 'imported %d' % row, 'description': 'imported by a benchmark', 'quantity': row % 5,
+        'location': 'Attic', 'category': 'Bench imports',
+    }) for row in range(500))
+    upload = io.BytesIO(lines.encode('utf-8'))
+    upload.name = 'inventory.ndjson'
+    return bench.client.post('/items/import', {'file': upload}, **bench.headers)
+
+
+@scenario('items.search.exact')
+def items_search_exact(bench, state, index):
+    return bench.get('/items/search?q=hammer')
+
+
+@scenario('items.search.typo')
+def items_search_typo(bench, state, index):
+    return bench.get('/items/search?q=hamer+lantren')
+
+
+@scenario('items.summary')
+def items_summary(bench, state, index):
+    bump(bench.organizer, 'organizer')
+    return bench.get('/items/summary')
+
+
+# Categories
+
+@scenario('categories.list.warm')
+def categories_list_warm(bench, state, index):
+    return bench.get('/categories')
+
+
+@scenario('categories.list.cold')
+def categories_list_cold(bench, state, index):
+    bump(bench.organizer, 'catalog')
+    return bench.get('/categories')
+
+
+@scenario('categories.list.sparse')
+def categories_list_sparse(bench, state, index):
+    bump(bench.organizer, 'catalog')
+    return bench.get('/categories?fields=id,name')
+
+
+@scenario('categories.list.items_changed')
+def categories_list_items_changed(bench, state, index):
+    # A miss in the response cache with the catalog itself unchanged, so
+    # only the organizer's items are read again
+    bump(bench.organizer, 'organizer')
+    return bench.get('/categories')
+
+
+@scenario('categories.list.not_modified', setup=lambda bench, count: bench.get('/categories')['ETag'], status=304)
+def categories_list_not_modified(bench, state, index):
+    return bench.get('/categories', HTTP_IF_NONE_MATCH=state)
+
+
+@scenario('categories.retrieve')
+def categories_retrieve(bench, state, index):
+    return bench.get('/categories/%d' % bench.categories[index % len(bench.categories)])
+
+
+@scenario('categories.create')
+def categories_create(bench, state, index):
+    return bench.post('/categories', {'name': 'Bench category %d' % index})
+
+
+@scenario('categories.update', setup=new_categories, status=204)
+def categories_update(bench, state, index):
+    return bench.put('/categories/%d' % state[index], {'name': 'Renamed category %d' % index})
+
+
+@scenario('categories.destroy', setup=new_categories, status=204)
+def categories_destroy(bench, state, index):
+    return bench.delete('/categories/%d' % state[index])
+
+
+# Organizers and users
+
+@scenario('organizers.list')
+def organizers_list(bench, state, index):
+    bump(None, 'organizers')
+    return bench.get('/organizers', token=bench.admin_token)
+
+
+@scenario('organizers.list.page2',
+          setup=lambda bench, count: bench.json(bench.get('/organizers?limit=5', token=bench.admin_token))['next'])
+def organizers_list_page2(bench, state, index):
+    bump(None, 'organizers')
+    return bench.get(state, token=bench.admin_token)
+
+
+@scenario('organizers.export')
+def organizers_export(bench, state, index):
+    return bench.stream('/organizers/export', token=bench.admin_token)
+
+
+@scenario('organizers.list.sparse')
+def organizers_list_sparse(bench, state, index):
+    bump(None, 'organizers')
+    return bench.get('/organizers?fields=id,user', token=bench.admin_token)
+
+
+@scenario('organizers.retrieve')
+def organizers_retrieve(bench, state, index):
+    return bench.get('/organizers/%d' % bench.organizer.pk)
+
+
+@scenario('organizers.update', setup=new_organizers, status=204)
+def organizers_update(bench, state, index):
+    return bench.put('/organizers/%d' % state[index], {})
+
+
+@scenario('users.list')
+def users_list(bench, state, index):
+    return bench.get('/users', token=bench.admin_token)
+
+
+@scenario('users.export')
+def users_export(bench, state, index):
+    return bench.stream('/users/export', token=bench.admin_token)
+
+
+@scenario('users.retrieve')
+def users_retrieve(bench, state, index):
+    return bench.get('/users/%d' % bench.organizer.user_id)
+
+
+# Authentication
+
+@scenario('auth.register', setup=unique_users, repeat=5)
+def auth_register(bench, state, index):
+    return bench.post('/register', {
+        'username': state[index], 'email': '%s@example.com' % state[index], 'password': PASSWORD,
+        'first_name': 'Bench', 'last_name': 'User', 'phone_number': '555-0100',
+    }, authenticated=False)
+
+
+@scenario('auth.login', repeat=5)
+def auth_login(bench, state, index):
+    return bench.post('/login', {'username': bench.organizer.user.username, 'password': PASSWORD},
+                      authenticated=False)
+
+
+def legacy_users(bench, count):
+    """Users whose passwords were stored with PBKDF2, so logging in rehashes them"""
+    password = make_password(PASSWORD, hasher='pbkdf2_sha256')
+    usernames = unique_users(bench, count)
+    User.objects.bulk_create([User(username=username, password=password) for username in usernames])
+    return usernames
+
+
+@scenario('auth.login.rehash', setup=legacy_users, repeat=5)
+def auth_login_rehash(bench, state, index):
+    return bench.post('/login', {'username': state[index], 'password': PASSWORD}, authenticated=False)
+
+
+def throttled_user(bench, count):
+    username = bench.dataset.organizers[1].user.username
+    for _ in range(settings.FOUNDIT_LOGIN_RATE_LIMIT['FAILURES']):
+        bench.post('/login', {'username': username, 'password': 'wrong'}, authenticated=False)
+    return username
+
+
+@scenario('auth.login.throttled', setup=throttled_user, status=429)
+def auth_login_throttled(bench, state, index):
+    return bench.post('/login', {'username': state, 'password': 'wrong'}, authenticated=False)
+
+
+@scenario('auth.api_token_auth', repeat=5)
+def auth_api_token_auth(bench, state, index):
+    return bench.post('/api-token-auth/', {'username': bench.organizer.user.username, 'password': PASSWORD},
+                      authenticated=False)
+
+
+@scenario('auth.browsable_login')
+def auth_browsable_login(bench, state, index):
+    return bench.client.get('/api-auth/login/')
+
+
+# Change feed
+
+def changed_since(bench, count):
+    """A sync token from before 100 new items"""
+    token = encode_token(latest_id())
+    new_items(bench, 100)
+    return token
+
+
+@scenario('sync.unchanged', setup=lambda bench, count: encode_token(latest_id()))
+def sync_unchanged(bench, state, index):
+    return bench.get('/sync?since=%s' % state)
+
+
+@scenario('sync.changes', setup=changed_since)
+def sync_changes(bench, state, index):
+    return bench.get('/sync?since=%s' % state)
+
+
+# Background jobs
+
+@scenario('jobs.retrieve', setup=lambda bench, count: enqueue(
+    'export_items', user=bench.organizer.user, organizer_id=bench.organizer.pk, output='csv').pk)
+def jobs_retrieve(bench, state, index):
+    return bench.get('/jobs/%d' % state)
+
+
+# Root and operations
+
+@scenario('root')
+def api_root(bench, state, index):
+    return bench.get('/')
+
+
+@scenario('ops.cache_stats')
+def ops_cache_stats(bench, state, index):
+    return bench.get('/cache-stats', token=bench.admin_token)
+
+
+@scenario('ops.metrics')
+def ops_metrics(bench, state, index):
+    return bench.get('/metrics', token=bench.admin_token)
+
+
+def admin_token():
+    """Returns the token of a staff user, creating one on first use"""
+    user, created = User.objects.get_or_create(username='bench-admin', defaults={'is_staff': True})
+    token, created = Token.objects.get_or_create(user=user)
+    return token.key
@@ -0,0 +1,77 @@
+"""Per-row cost of ItemSerializer against the flat ItemRowSerializer
+
+``python -m benchmarks.serializers [options]`` builds --items items for
+one organizer and serializes all of them with each serializer, the
+queries included, keeping the best of --repeat runs. ItemSerializer
+(depth=2) is given select_related for everything it nests, so its time
+is serialization rather than one query per row. ItemRowSerializer is
+timed with flat ids, as Items.list returns by default, and with
+?expand=category,organizer. The run exits with status 1 if either row
+serializer is less than --min-speedup times faster per row.
+"""
+import argparse
+import sys
+from .environment import setup_django
+from .formats import best_of
+
+
+def serializers(organizer):
+    """(name, function returning the rows) for each way of serializing the organizer's items"""
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from founditapi.models import Item
+    from founditapi.views.item import ItemSerializer
+    from founditapi.views.rows import ItemRowSerializer
+
+    factory = APIRequestFactory()
+    items = Item.objects.filter(organizer=organizer).order_by('created_at', 'id')
+
+    def nested():
+        request = Request(factory.get('/items'))
+        queryset = items.select_related('category', 'organizer__user')
+        return ItemSerializer(queryset, many=True, context={'request': request}).data
+
+    def rows(query):
+        def serialize():
+            return ItemRowSerializer(Request(factory.get('/items', query))).to_rows(items)
+        return serialize
+
+    return [
+        ('ItemSerializer depth=2', nested),
+        ('ItemRowSerializer', rows({})),
+        ('ItemRowSerializer expanded', rows({'expand': 'category,organizer'})),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.serializers', description=__doc__.split('\n')[0])
+    parser.add_argument('--items', type=int, default=10000, help='Items serialized')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per serializer; the fastest is kept')
+    parser.add_argument('--min-speedup', type=float, default=5.0,
+                        help='How many times cheaper per row ItemRowSerializer must be')
+    options = parser.parse_args(argv)
+    setup_django()
+
+    from .data import Dataset
+
+    dataset = Dataset(organizers=1, items=options.items, tags=0).build()
+    failed = False
+    reference = None
+    print('%-28s %8s %10s %12s %9s' % ('serializer', 'rows', 'ms', 'us per row', 'speedup'))
+    for index, (name, serialize) in enumerate(serializers(dataset.organizers[0])):
+        rows, seconds = best_of(options.repeat, serialize)
+        per_row = seconds / max(len(rows), 1)
+        reference = per_row if reference is None else reference
+        speedup = reference / per_row
+        print('%-28s %8d %10.1f %12.2f %8.1fx' % (name, len(rows), seconds * 1000, per_row * 1e6, speedup))
+        if len(rows) != options.items:
+            print('FAILED %s: %d rows' % (name, len(rows)))
+            failed = True
+        elif index and speedup < options.min_speedup:
+            print('REGRESSION %s: %.1fx faster per row, less than %.1fx' % (name, speedup, options.min_speedup))
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
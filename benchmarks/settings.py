@@ -0,0 +1,28 @@
+"""Django settings for running the benchmarks against a throwaway sqlite database"""
+import os
+import tempfile
+
+from foundit.settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['testserver']
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('FOUNDIT_BENCH_DB', os.path.join(tempfile.gettempdir(), 'foundit-bench.sqlite3')),
+        # Seconds a writer waits for SQLite's write lock before giving up
+        'OPTIONS': {'timeout': 30},
+    }
+}
+# Read replicas from FOUNDIT_DB_REPLICAS, as in foundit.settings
+DATABASES.update(replica_databases(DATABASES['default'], DB_REPLICAS))
+
+# Version stamps next to the database, emptied with it
+CACHES = dict(CACHES, shared=dict(CACHES['shared'], LOCATION=os.environ.get(
+    'FOUNDIT_BENCH_CACHE', os.path.join(tempfile.gettempdir(), 'foundit-bench-cache'))))
+
+FOUNDIT_PROFILING = {
+    'SAMPLE_RATE': 0.0,
+}
@@ -0,0 +1,158 @@
+"""Item write throughput with and without the SQLite tuning
+
+``python -m benchmarks.writes [options]`` runs the same workload twice, each
+in a fresh process with its own database file: once with SQLite's default
+settings (FOUNDIT_SQLITE_TUNING=off) and once with the pragmas from
+foundit/settings.py. Each item write endpoint is hammered by --writers
+threads while --readers threads keep listing items, as clients would.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from .environment import setup_django
+
+
+PROFILES = (('defaults', 'off'), ('tuned', 'on'))
+
+
+def endpoints(bench):
+    """(name, function(client, thread, index) -> response) for every item write"""
+    headers = bench.headers
+    payload = {'name': 'written', 'description': 'benchmark write', 'quantity': 2, 'location': 'Shed',
+               'category': bench.category}
+
+    def send(client, method, path, data):
+        return getattr(client, method)(path, json.dumps(data), content_type='application/json', **headers)
+
+    owned = {}
+
+    def own(thread, index):
+        return owned[thread][index % len(owned[thread])]
+
+    def create(client, thread, index):
+        response = send(client, 'post', '/items', dict(payload, created_at='2026-01-01T00:00:00Z'))
+        owned.setdefault(thread, []).append(json.loads(response.content)['id'])
+        return response
+
+    return (
+        ('items.create', create),
+        ('items.update', lambda client, thread, index: send(
+            client, 'put', '/items/%d' % own(thread, index), {'quantity': index % 10})),
+        ('items.adjust', lambda client, thread, index: send(
+            client, 'post', '/items/%d/adjust' % own(thread, index), {'delta': 1})),
+        ('items.bulk.create', lambda client, thread, index: send(client, 'post', '/items/bulk', [payload] * 50)),
+        ('items.destroy', lambda client, thread, index: send(
+            client, 'delete', '/items/%d' % owned[thread].pop(), {})),
+    )
+
+
+def hammer(function, bench, writers, operations, readers):
+    """Runs `operations` calls of `function` on each of `writers` threads
+
+    Returns:
+        dict -- writes_per_sec, failed writes and reads_per_sec
+    """
+    from django.db import connection
+    from django.test import Client
+
+    done = threading.Event()
+    counts = {'failed': 0, 'reads': 0}
+    lock = threading.Lock()
+
+    def writer(thread):
+        client = Client()
+        failed = 0
+        try:
+            for index in range(operations):
+                try:
+                    failed += function(client, thread, index).status_code >= 400
+                except Exception:
+                    failed += 1
+        finally:
+            connection.close()
+        with lock:
+            counts['failed'] += failed
+
+    def reader():
+        client = Client()
+        reads = 0
+        try:
+            while not done.is_set():
+                client.get('/items', **bench.headers)
+                reads += 1
+        finally:
+            connection.close()
+        with lock:
+            counts['reads'] += reads
+
+    reading = [threading.Thread(target=reader) for _ in range(readers)]
+    writing = [threading.Thread(target=writer, args=(thread,)) for thread in range(writers)]
+    for thread in reading:
+        thread.start()
+    started = time.perf_counter()
+    for thread in writing:
+        thread.start()
+    for thread in writing:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in reading:
+        thread.join()
+
+    return {
+        'writes_per_sec': round(writers * operations / elapsed, 1),
+        'failed': counts['failed'],
+        'reads_per_sec': round(counts['reads'] / elapsed, 1),
+    }
+
+
+def run_profile(options):
+    """Runs the workload against the database configured by the environment"""
+    setup_django()
+    from .data import Dataset
+    from .runner import Bench
+
+    bench = Bench(Dataset(items=options.items).build())
+    return {name: hammer(function, bench, options.writers, options.operations, options.readers)
+            for name, function in endpoints(bench)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.writes', description=__doc__.split('\n')[0])
+    parser.add_argument('--writers', type=int, default=4, help='Concurrent writer threads')
+    parser.add_argument('--readers', type=int, default=2, help='Threads listing items during the writes')
+    parser.add_argument('--operations', type=int, default=50, help='Requests per writer per endpoint')
+    parser.add_argument('--items', type=int, default=20000, help='Items in the dataset')
+    parser.add_argument('--profile', choices=[name for name, _ in PROFILES], help=argparse.SUPPRESS)
+    options = parser.parse_args(argv)
+
+    if options.profile:
+        json.dump(run_profile(options), sys.stdout)
+        return 0
+
+    results = {}
+    for name, tuning in PROFILES:
+        environ = dict(os.environ, FOUNDIT_SQLITE_TUNING=tuning,
+                       FOUNDIT_BENCH_DB=os.path.join(tempfile.gettempdir(), 'foundit-bench-%s.sqlite3' % name))
+        args = [sys.executable, '-m', 'benchmarks.writes', '--profile', name, '--writers', str(options.writers),
+                '--readers', str(options.readers), '--operations', str(options.operations),
+                '--items', str(options.items)]
+        output = subprocess.run(args, env=environ, stdout=subprocess.PIPE, check=True).stdout
+        results[name] = json.loads(output)
+
+    print('%-20s %24s %24s %9s' % ('endpoint', 'writes/sec (failed)', 'reads/sec during', 'speedup'))
+    for endpoint in results['defaults']:
+        default, tuned = results['defaults'][endpoint], results['tuned'][endpoint]
+        print('%-20s %10.1f (%d) -> %6.1f (%d) %10.1f -> %7.1f %8.2fx' % (
+            endpoint, default['writes_per_sec'], default['failed'], tuned['writes_per_sec'], tuned['failed'],
+            default['reads_per_sec'], tuned['reads_per_sec'], tuned['writes_per_sec'] / default['writes_per_sec']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,17 @@
+"""
+ASGI config for foundit project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with any ASGI server, for example ``uvicorn foundit.asgi:application``.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foundit.settings')
+django.setup(set_prefix=False)
+
+from founditapi.asgi import FoundItASGI  # noqa: E402
+
+application = FoundItASGI()
@@ -11,21 +11,36 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+from importlib.util import find_spec
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
+def env_flag(name, default):
+    value = os.environ.get(name)
+    return default if value is None else value.lower() in ('1', 'true', 'yes', 'on')
+
+
+# FOUNDIT_PROFILE=production turns off debug mode, which among other things
+# stops every query being recorded in memory, and requires a secret key
+# and allowed hosts from the environment.
+PRODUCTION = os.environ.get('FOUNDIT_PROFILE', 'development') == 'production'
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'a1hd!n^wf!4%&8fgu7)%+b4je&oa!d+lulx&rhu9j8@j3xspcm'
+if PRODUCTION:
+    SECRET_KEY = os.environ['FOUNDIT_SECRET_KEY']
+else:
+    SECRET_KEY = os.environ.get('FOUNDIT_SECRET_KEY', 'a1hd!n^wf!4%&8fgu7)%+b4je&oa!d+lulx&rhu9j8@j3xspcm')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = env_flag('FOUNDIT_DEBUG', not PRODUCTION)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get('FOUNDIT_ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
@@ -40,7 +55,7 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
-    'founditapi',
+    'founditapi.apps.FounditapiConfig',
 ]
 
 MIDDLEWARE = [
@@ -73,17 +88,100 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foundit.wsgi.application'
 
+# Thread pool used by foundit.asgi for ORM work and non-async routes
+FOUNDIT_ASGI = {
+    'THREADS': 32,
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# FOUNDIT_DB_ENGINE picks sqlite (the default) or postgresql, which needs psycopg2.
+#
+# Postgres connections persist for FOUNDIT_DB_CONN_MAX_AGE seconds and are
+# checked with a cheap query at the start of each request before being
+# reused (CONN_HEALTH_CHECKS, applied by founditapi.database). Behind a
+# transaction-pooling pgbouncer set FOUNDIT_DB_POOLER=pgbouncer, which
+# turns off server-side cursors since they can't outlive a transaction.
+
+DB_ENGINE = os.environ.get('FOUNDIT_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('FOUNDIT_DB_NAME', 'foundit'),
+            'USER': os.environ.get('FOUNDIT_DB_USER', ''),
+            'PASSWORD': os.environ.get('FOUNDIT_DB_PASSWORD', ''),
+            'HOST': os.environ.get('FOUNDIT_DB_HOST', ''),
+            'PORT': os.environ.get('FOUNDIT_DB_PORT', ''),
+            'CONN_MAX_AGE': int(os.environ.get('FOUNDIT_DB_CONN_MAX_AGE', 600 if PRODUCTION else 0)),
+            'CONN_HEALTH_CHECKS': env_flag('FOUNDIT_DB_HEALTH_CHECKS', True),
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('FOUNDIT_DB_POOLER') == 'pgbouncer',
+            'OPTIONS': {
+                'connect_timeout': int(os.environ.get('FOUNDIT_DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('FOUNDIT_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+            # Reusing a SQLite connection skips reopening the file and
+            # re-applying the pragmas below on every request
+            'CONN_MAX_AGE': int(os.environ.get('FOUNDIT_DB_CONN_MAX_AGE', 600 if PRODUCTION else 0)),
+        }
+    }
+
+# FOUNDIT_DB_REPLICAS is a comma separated list of read replicas of the
+# database above: hosts for postgresql, or database files for sqlite, which
+# are opened read-only and can be refreshed from the primary with
+# `manage.py refresh_replicas` to try replication out locally. They become
+# DATABASES aliases replica1, replica2 and so on, and founditapi.routing
+# sends request reads to them. An organizer's reads stay on the primary
+# for STICKY_SECONDS after it writes; a replica that can't be reached is
+# skipped for RETRY_SECONDS.
+DB_REPLICAS = [location for location in os.environ.get('FOUNDIT_DB_REPLICAS', '').split(',') if location]
+
+
+def replica_databases(primary, locations):
+    """DATABASES entries for read replicas of `primary`, at hosts or SQLite files"""
+    databases = {}
+    for index, location in enumerate(locations, 1):
+        replica = dict(primary, TEST={'MIRROR': 'default'})
+        if primary['ENGINE'] == 'django.db.backends.sqlite3':
+            replica['NAME'] = 'file:%s?mode=ro' % location
+            replica['OPTIONS'] = dict(primary.get('OPTIONS', {}), uri=True)
+        else:
+            replica['HOST'] = location
+        databases['replica%d' % index] = replica
+    return databases
+
+
+DATABASES.update(replica_databases(DATABASES['default'], DB_REPLICAS))
+
+DATABASE_ROUTERS = ['founditapi.routing.ReplicaRouter']
+
+FOUNDIT_DB_ROUTING = {
+    'REPLICAS': ['replica%d' % index for index in range(1, len(DB_REPLICAS) + 1)],
+    'STICKY_SECONDS': int(os.environ.get('FOUNDIT_DB_STICKY_SECONDS', 5)),
+    'RETRY_SECONDS': int(os.environ.get('FOUNDIT_DB_RETRY_SECONDS', 30)),
 }
 
+# Pragmas founditapi.database runs on every new SQLite connection. WAL lets
+# reads proceed while a write commits, synchronous=NORMAL is durable in WAL
+# mode while syncing far less often, mmap serves reads from the page cache
+# and busy_timeout (ms) makes writers wait for the lock instead of failing.
+# FOUNDIT_SQLITE_TUNING=off leaves SQLite's defaults in place.
+FOUNDIT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.environ.get('FOUNDIT_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'busy_timeout': int(os.environ.get('FOUNDIT_SQLITE_BUSY_TIMEOUT', 5000)),
+} if env_flag('FOUNDIT_SQLITE_TUNING', True) else {}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -103,6 +201,42 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# New passwords are hashed with FOUNDIT_PASSWORD_HASHER (scrypt, pbkdf2 or
+# argon2, which needs argon2-cffi). The others stay listed so existing
+# passwords still verify, and they are rehashed with the preferred one
+# the next time their owner logs in.
+PASSWORD_HASHER_CHOICES = {
+    'scrypt': 'founditapi.hashers.ScryptPasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+}
+PREFERRED_PASSWORD_HASHER = PASSWORD_HASHER_CHOICES[os.environ.get('FOUNDIT_PASSWORD_HASHER', 'scrypt')]
+PASSWORD_HASHERS = [PREFERRED_PASSWORD_HASHER] + [
+    hasher for hasher in (
+        'founditapi.hashers.ScryptPasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    ) if hasher != PREFERRED_PASSWORD_HASHER
+]
+
+# scrypt cost: N (CPU and memory, a power of two), R (block size) and P
+# (parallelism). Memory per hash is 128 * N * R bytes, 16MB by default.
+FOUNDIT_SCRYPT = {
+    'N': int(os.environ.get('FOUNDIT_SCRYPT_N', 2 ** 14)),
+    'R': 8,
+    'P': 1,
+}
+
+# Failed logins allowed per username, and per client address, within any
+# WINDOW seconds before /login answers 429 without checking the password.
+FOUNDIT_LOGIN_RATE_LIMIT = {
+    'FAILURES': 5,
+    'ADDRESS_FAILURES': 50,
+    'WINDOW': 300,
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
@@ -123,9 +257,25 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Responses are JSON by default, encoded with orjson when it is installed
+# unless FOUNDIT_JSON_ENCODER=stdlib. With msgpack installed clients can
+# also send and receive MessagePack (Accept / Content-Type
+# application/msgpack, or ?format=msgpack).
+FOUNDIT_JSON_ENCODER = os.environ.get('FOUNDIT_JSON_ENCODER', 'orjson')
+MSGPACK_AVAILABLE = find_spec('msgpack') is not None
+
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'founditapi.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ] + (['founditapi.renderers.MessagePackRenderer'] if MSGPACK_AVAILABLE else []),
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ] + (['founditapi.renderers.MessagePackParser'] if MSGPACK_AVAILABLE else []),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'founditapi.authentication.OrganizerTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -134,8 +284,94 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10
 }
 
+# Token -> user -> organizer lookups cached by OrganizerTokenAuthentication.
+# Set CACHE_ALIAS to one of CACHES to share entries between worker processes.
+FOUNDIT_AUTH_CACHE = {
+    'MAX_ENTRIES': 1024,
+    'TIMEOUT': 300,
+    'CACHE_ALIAS': None,
+}
+
+# "default" holds cached response bodies in each process. "shared" holds the
+# version stamps that invalidate them, the category catalog and tag bitmaps,
+# and replica stickiness, which every worker process must see: by default in
+# files under BASE_DIR/cache, shared by the processes of one host. For more
+# than one host set FOUNDIT_SHARED_CACHE_BACKEND to a memcached backend and
+# FOUNDIT_SHARED_CACHE_LOCATION to its servers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+    'shared': {
+        'BACKEND': os.environ.get('FOUNDIT_SHARED_CACHE_BACKEND', 'founditapi.caching.SharedFileCache'),
+        'LOCATION': os.environ.get('FOUNDIT_SHARED_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+    },
+}
+
+# Response cache and version stamps used by founditapi.caching. Responses
+# are cached in CACHE_ALIAS and stamps kept in VERSION_CACHE_ALIAS; when
+# that one is process-local, conditional responses are off and the caches
+# following stamps reload every LOCAL_TTL seconds instead.
+FOUNDIT_RESPONSE_CACHE = {
+    'CACHE_ALIAS': 'default',
+    'VERSION_CACHE_ALIAS': 'shared',
+    'TIMEOUT': 300,
+    'LOCAL_TTL': 5,
+}
+
+# Per-view metrics served at /metrics. Set SAMPLE_RATE above zero to run
+# that share of requests under cProfile and keep the stats of slow ones.
+FOUNDIT_PROFILING = {
+    'SAMPLE_RATE': 0.0,
+    'THRESHOLD_MS': 500,
+    'DIRECTORY': os.path.join(BASE_DIR, 'profiles'),
+}
+
+# Responses of at least MIN_SIZE bytes are compressed with brotli (when the
+# brotli package is installed) or gzip, whichever the client prefers.
+FOUNDIT_COMPRESSION = {
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 4,
+}
+
+# The /sync change log keeps changes for RETENTION_DAYS; compact it with
+# `manage.py compact_changes`. Clients polling with an older token are told
+# to reset and download the lists again. Changes younger than
+# SAFETY_LAG_SECONDS aren't handed out yet, since on PostgreSQL a
+# transaction still open may commit a lower id; it should be longer than
+# any transaction that writes items. SQLite commits ids in order.
+FOUNDIT_SYNC = {
+    'RETENTION_DAYS': int(os.environ.get('FOUNDIT_SYNC_RETENTION_DAYS', 30)),
+    'SAFETY_LAG_SECONDS': float(os.environ.get('FOUNDIT_SYNC_SAFETY_LAG_SECONDS',
+                                               5 if DB_ENGINE == 'postgresql' else 0)),
+}
+
+# Background jobs run by `manage.py run_workers`. A failed attempt is
+# retried after BACKOFF_SECONDS, doubling each time up to MAX_BACKOFF_SECONDS,
+# until MAX_ATTEMPTS. A running job whose worker sends no heartbeat for
+# LEASE_SECONDS is given to another worker. Imports over INLINE_IMPORT_BYTES
+# and deletions of organizers with over INLINE_DELETE_ITEMS items are
+# answered with 202 and a job. Export files are written to FILE_DIR, and
+# finished jobs and their files are removed after RETENTION_DAYS.
+FOUNDIT_JOBS = {
+    'FILE_DIR': os.environ.get('FOUNDIT_JOBS_DIR', os.path.join(BASE_DIR, 'jobs')),
+    'MAX_ATTEMPTS': 3,
+    'BACKOFF_SECONDS': 10,
+    'MAX_BACKOFF_SECONDS': 600,
+    'LEASE_SECONDS': 300,
+    'POLL_SECONDS': 1.0,
+    'INLINE_IMPORT_BYTES': int(os.environ.get('FOUNDIT_JOBS_INLINE_IMPORT_BYTES', 1024 * 1024)),
+    'INLINE_DELETE_ITEMS': int(os.environ.get('FOUNDIT_JOBS_INLINE_DELETE_ITEMS', 1000)),
+    'RETENTION_DAYS': 7,
+}
+
 # Replace existing list
 MIDDLEWARE = [
+    'founditapi.middleware.ProfilingMiddleware',
+    'founditapi.compression.CompressionMiddleware',
+    'founditapi.routing.RoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
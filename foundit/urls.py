@@ -9,6 +9,7 @@ router.register(r'items', Items, 'item')
 router.register(r'categories', Categories, 'category')
 router.register(r'organizers', Organizers, 'organizer')
 router.register(r'users', UserViewSet, 'user')
+router.register(r'jobs', Jobs, 'job')
 
 urlpatterns = [
     url(r'^', include(router.urls)),
@@ -16,4 +17,7 @@ urlpatterns = [
     url(r'^api-auth/', include('rest_framework.urls', namespace='rest_framework')),
     url(r'^register$', register_user),
     url(r'^login$', login_user),
+    url(r'^sync$', sync_changes),
+    url(r'^cache-stats$', cache_stats),
+    url(r'^metrics$', prometheus_metrics),
 ]
\ No newline at end of file
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class FounditapiConfig(AppConfig):
+    name = 'founditapi'
+
+    def ready(self):
+        # Connect the signal receivers that keep caches in sync with writes
+        # and that configure database connections
+        from founditapi import authentication, catalog, database, search, summaries, sync, tagging  # noqa: F401
@@ -0,0 +1,344 @@
+"""ASGI application with async handlers for the read-heavy endpoints
+
+Django 2.2 has no ASGI support, so this is a small ASGI application of its
+own. GET requests for Items.list, Items.retrieve and Categories.list are
+handled by coroutines. Their blocking ORM work runs on a bounded thread
+pool, and lookups that don't depend on each other are gathered
+concurrently. Every other request runs through Django's WSGI handler on
+the same pool, so the event loop can hold many more open connections than
+there are threads touching the database.
+
+Responses from the async handlers still pass through settings.MIDDLEWARE
+(CORS, security headers, compression and so on) before they are sent,
+and are rendered in whichever of the REST_FRAMEWORK formats the client
+asks for. Since the view runs first, the request carries a
+founditapi.middleware.RequestProfile from the start: every pool thread
+working for the view counts its queries into it, and ProfilingMiddleware
+records the whole request under the resolved view's name.
+"""
+import asyncio
+import contextvars
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from io import BytesIO
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIHandler, WSGIRequest
+from django.db import close_old_connections, connections
+from django.http import Http404, HttpResponse
+from django.urls import resolve
+from rest_framework import exceptions, status
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from founditapi import routing
+from founditapi.caching import stats
+from founditapi.catalog import get_catalog
+from founditapi.database import check_connections
+from founditapi.middleware import RequestProfile
+from founditapi.views import Categories, Items
+from founditapi.views.category import organizer_items, with_organizer_items
+from founditapi.views.rows import CategoryRowSerializer
+
+
+def build_environ(scope, body):
+    """Translates an ASGI HTTP scope into a WSGI environ"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope.get('http_version', '1.1'),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').lower()
+        value = value.decode('latin-1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    # The server has already de-chunked the body, so its length is known
+    environ.setdefault('CONTENT_LENGTH', str(len(body)))
+    return environ
+
+
+def response_headers(response):
+    """Returns a Django response's headers, cookies included, as ASGI byte pairs"""
+    headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in response.items()]
+    for cookie in response.cookies.values():
+        headers.append((b'set-cookie', cookie.output(header='').strip().encode('latin-1')))
+    return headers
+
+
+# The profile of the request whose view is running, for the pool threads working on it
+view_profile = contextvars.ContextVar('view_profile', default=None)
+
+
+def call_with_connections(function, *args):
+    """Runs blocking work on a pool thread, releasing connections past CONN_MAX_AGE"""
+    close_old_connections()
+    check_connections()
+    profile = view_profile.get()
+    try:
+        with ExitStack() as stack:
+            if profile is not None:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.counter))
+            return function(*args)
+    finally:
+        close_old_connections()
+
+
+class MiddlewareHandler(BaseHandler):
+    """Runs settings.MIDDLEWARE around a response that was built elsewhere"""
+
+    def __init__(self):
+        super().__init__()
+        self.load_middleware()
+
+    def _get_response(self, request):
+        return request.precomputed_response
+
+
+class FoundItASGI:
+    """The ASGI application callable
+
+    Arguments:
+        threads -- Size of the pool that runs ORM and WSGI work, from
+                   FOUNDIT_ASGI['THREADS'] by default
+    """
+
+    routes = (
+        (re.compile(r'^/items$'), 'items_list'),
+        (re.compile(r'^/items/(?P<pk>\d+)$'), 'items_retrieve'),
+        (re.compile(r'^/categories$'), 'categories_list'),
+    )
+
+    def __init__(self, threads=None):
+        if threads is None:
+            threads = getattr(settings, 'FOUNDIT_ASGI', {}).get('THREADS', 32)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='foundit-asgi')
+        self.wsgi = WSGIHandler()
+        self.middleware = MiddlewareHandler()
+        self.renderers = [renderer() for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+                          if renderer.format != 'api']
+        self.negotiator = DefaultContentNegotiation()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def run(self, function, *args):
+        """Schedules blocking work on the bounded pool, in a copy of the request's context"""
+        loop = asyncio.get_event_loop()
+        context = contextvars.copy_context()
+        return loop.run_in_executor(self.executor, context.run, call_with_connections, function, *args)
+
+    async def http(self, scope, receive, send):
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        environ = build_environ(scope, b''.join(body))
+
+        if scope['method'] == 'GET':
+            for pattern, handler in self.routes:
+                match = pattern.match(scope['path'])
+                if match is not None:
+                    request = WSGIRequest(environ)
+                    request.profile = RequestProfile()
+                    # Metrics are labelled as they are when Django resolves the URL
+                    request.resolver_match = resolve(request.path_info)
+                    request.asgi_renderer = self.select_renderer(request)
+                    route = routing.begin(request.method)
+                    profiled = view_profile.set(request.profile)
+                    try:
+                        response = await getattr(self, handler)(request, **match.groupdict())
+                    finally:
+                        view_profile.reset(profiled)
+                        routing.end(route)
+                    request.precomputed_response = response
+                    response = await self.run(self.middleware.get_response, request)
+                    await self.send_response(send, response.status_code, response_headers(response), [response.content])
+                    await self.run(response.close)
+                    return
+
+        await self.call_wsgi(environ, send)
+
+    async def send_response(self, send, status_code, headers, chunks):
+        await send({'type': 'http.response.start', 'status': status_code, 'headers': headers})
+        for chunk in chunks:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def call_wsgi(self, environ, send):
+        """Runs any other request through Django's WSGI handler on the pool"""
+        started = {}
+
+        def start_response(status_line, headers, exc_info=None):
+            started['status'] = int(status_line.split(' ', 1)[0])
+            started['headers'] = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+        def begin():
+            response = self.wsgi(environ, start_response)
+            if getattr(response, 'streaming', False):
+                return response, None
+            content = b''.join(response)
+            response.close()
+            return None, content
+
+        response, content = await self.run(begin)
+        await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+        if response is None:
+            await send({'type': 'http.response.body', 'body': content})
+            return
+
+        # Streaming responses such as /items/export are pulled a chunk at a time
+        chunks = iter(response)
+        try:
+            while True:
+                chunk = await self.run(next, chunks, None)
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await self.run(response.close)
+
+    async def authenticate(self, request):
+        """Wraps the request for DRF and resolves its token and organizer
+
+        Returns:
+            tuple -- (DRF request, None) or (None, error response)
+        """
+        drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+        try:
+            await self.run(lambda: drf_request.user)
+        except exceptions.AuthenticationFailed as ex:
+            return None, self.render(request, {'detail': ex.detail}, status.HTTP_401_UNAUTHORIZED)
+        if getattr(drf_request, 'organizer', None) is None:
+            return None, self.render(request, {'detail': 'Authentication credentials were not provided.'},
+                                     status.HTTP_401_UNAUTHORIZED)
+        return drf_request, None
+
+    def select_renderer(self, request):
+        """Negotiates the renderer from Accept or ?format= as DRF would, falling back to JSON"""
+        try:
+            renderer, media_type = self.negotiator.select_renderer(Request(request), self.renderers)
+        except (exceptions.NotAcceptable, Http404):
+            renderer = self.renderers[0]
+        return renderer
+
+    def render(self, request, data, status_code, headers=()):
+        renderer = request.asgi_renderer
+        started = time.perf_counter()
+        content = b'' if status_code == status.HTTP_304_NOT_MODIFIED else renderer.render(data)
+        request.profile.render_seconds += time.perf_counter() - started
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += '; charset=%s' % renderer.charset
+        response = HttpResponse(content, status=status_code, content_type=content_type)
+        for name, value in headers:
+            response[name] = value
+        return response
+
+    def render_view(self, request, view_response):
+        """Renders what a DRF view method returned outside of the DRF view machinery"""
+        if not hasattr(view_response, 'data'):
+            return view_response
+        # An unrendered Response still carries HttpResponse's default Content-Type
+        headers = [(name, value) for name, value in view_response.items() if name.lower() != 'content-type']
+        return self.render(request, view_response.data, view_response.status_code, headers)
+
+    async def call_view(self, viewset, action, request, **kwargs):
+        """Calls a view method, turning what it raises into a response as DRF's dispatch would"""
+        def call():
+            view = viewset()
+            view.request = request
+            view.args = ()
+            view.kwargs = kwargs
+            view.action = action
+            view.format_kwarg = None
+            view.headers = view.default_response_headers
+            try:
+                return getattr(view, action)(request, **kwargs)
+            except Exception as ex:
+                # APIException and Http404 become their usual responses, such as
+                # 404 for an invalid ?cursor=; anything else is raised again
+                return view.handle_exception(ex)
+
+        return self.render_view(request, await self.run(call))
+
+    async def items_list(self, request):
+        drf_request, error = await self.authenticate(request)
+        if error is not None:
+            return error
+        return await self.call_view(Items, 'list', drf_request)
+
+    async def items_retrieve(self, request, pk):
+        drf_request, error = await self.authenticate(request)
+        if error is not None:
+            return error
+        return await self.call_view(Items, 'retrieve', drf_request, pk=pk)
+
+    async def categories_list(self, request):
+        """Categories.list, with the category and item queries run concurrently"""
+        drf_request, error = await self.authenticate(request)
+        if error is not None:
+            return error
+
+        endpoint = Categories.list.conditional
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        validators, outcome, data = await self.run(endpoint.lookup, drf_request)
+
+        if outcome == 'miss':
+            serializer = CategoryRowSerializer(drf_request)
+            if serializer.wants('organizer_items'):
+                categories, grouped = await asyncio.gather(
+                    self.run(lambda: get_catalog().rows(serializer)),
+                    self.run(organizer_items, drf_request.organizer),
+                )
+                data = with_organizer_items(categories, grouped)
+            else:
+                data = await self.run(lambda: get_catalog().rows(serializer))
+            await self.run(endpoint.store, validators, data)
+
+        status_code = status.HTTP_304_NOT_MODIFIED if outcome == 'not_modified' else status.HTTP_200_OK
+        response = endpoint.add_headers(self.render(drf_request, data, status_code), validators)
+        stats.record(endpoint.endpoint, outcome, loop.time() - started)
+        return response
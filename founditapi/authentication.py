@@ -0,0 +1,168 @@
+"""Token authentication that resolves the request's organizer in one query"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from founditapi import routing
+from founditapi.models import Organizer
+
+
+class LRUCache:
+    """A bounded, thread-safe, in-process cache with per-entry expiry
+
+    Arguments:
+        max_entries -- Least recently used entries are evicted past this size
+        timeout -- Seconds an entry stays valid after it was stored
+    """
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SharedCache:
+    """Adapter that stores credentials in one of Django's configured caches"""
+
+    key_prefix = 'foundit-auth:'
+
+    def __init__(self, alias, timeout):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(self.key_prefix + key)
+
+    def set(self, key, value):
+        self.cache.set(self.key_prefix + key, value, self.timeout)
+
+    def delete(self, key):
+        self.cache.delete(self.key_prefix + key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+_credentials_cache = None
+
+
+def get_credentials_cache():
+    """Returns the process-wide credentials cache described by FOUNDIT_AUTH_CACHE
+
+    With a CACHE_ALIAS the entries live in that Django cache so every worker
+    sees an invalidation at once; otherwise each process keeps its own LRU.
+    """
+    global _credentials_cache
+    if _credentials_cache is None:
+        options = getattr(settings, 'FOUNDIT_AUTH_CACHE', {})
+        timeout = options.get('TIMEOUT', 300)
+        if options.get('CACHE_ALIAS'):
+            _credentials_cache = SharedCache(options['CACHE_ALIAS'], timeout)
+        else:
+            _credentials_cache = LRUCache(options.get('MAX_ENTRIES', 1024), timeout)
+    return _credentials_cache
+
+
+def invalidate_token(key):
+    """Drops a cached token so its next use goes back to the database"""
+    get_credentials_cache().delete(key)
+
+
+def invalidate_user(user_id):
+    """Drops the cached token of a user whose account changed"""
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        invalidate_token(key)
+
+
+class OrganizerTokenAuthentication(TokenAuthentication):
+    """Token authentication that also exposes `request.organizer`
+
+    The token, its user and the user's organizer are read with a single
+    joined query and kept in the credentials cache, so the views no longer
+    look the organizer up again on every request.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            user, token = result
+            organizer = getattr(token, 'cached_organizer', None)
+            request.organizer = organizer
+            request._request.organizer = organizer
+            routing.set_organizer(organizer.pk if organizer is not None else None)
+        return result
+
+    def authenticate_credentials(self, key):
+        cache = get_credentials_cache()
+        credentials = cache.get(key)
+
+        if credentials is None:
+            tokens = Token.objects.select_related('user', 'user__organizer')
+            try:
+                token = tokens.get(key=key)
+            except Token.DoesNotExist:
+                # A token made moments ago may not have reached the replica yet
+                with routing.primary():
+                    try:
+                        token = tokens.get(key=key)
+                    except Token.DoesNotExist:
+                        raise exceptions.AuthenticationFailed('Invalid token.')
+
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+            try:
+                token.cached_organizer = token.user.organizer
+            except Organizer.DoesNotExist:
+                token.cached_organizer = None
+
+            credentials = (token.user, token)
+            cache.set(key, credentials)
+
+        return credentials
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_user(instance.pk)
@@ -0,0 +1,52 @@
+"""Bulk write helpers that keep derived item data in step"""
+from django.dispatch import Signal
+from django.utils import timezone
+from founditapi.models import Item
+
+
+# Sent after Item.objects.bulk_create and bulk_update, which don't send post_save
+items_bulk_created = Signal(providing_args=['items'])
+items_bulk_updated = Signal(providing_args=['items', 'fields'])
+
+
+def assign_bulk_ids(organizer, items):
+    """Fills in primary keys after bulk_create on backends that don't return them
+
+    Must run in the same transaction as the insert. The insert holds the
+    database's write lock until commit and ids are assigned in increasing
+    order, so the newest ids for this organizer are exactly the new rows.
+    """
+    if not items or items[0].pk is not None:
+        return
+    ids = Item.objects.filter(organizer=organizer).order_by('-id').values_list('id', flat=True)[:len(items)]
+    for item, pk in zip(items, reversed(list(ids))):
+        item.pk = pk
+
+
+def bulk_create_items(organizer, items):
+    """Inserts an organizer's new items and announces them with items_bulk_created
+
+    Call inside a transaction so the ids read back belong to this insert.
+
+    Returns:
+        list -- The items, with primary keys set
+    """
+    Item.objects.bulk_create(items)
+    assign_bulk_ids(organizer, items)
+    items_bulk_created.send(sender=Item, items=items)
+    return items
+
+
+def bulk_update_items(items, fields):
+    """Writes changed fields of loaded items and announces them with items_bulk_updated
+
+    The items must have been loaded from the database with all their
+    fields, so receivers can compare the old values with the new ones.
+    updated_at is set and written too, as save() would.
+    """
+    now = timezone.now()
+    for item in items:
+        item.updated_at = now
+    Item.objects.bulk_update(items, list(fields) + ['updated_at'])
+    items_bulk_updated.send(sender=Item, items=items, fields=fields)
+    return items
@@ -0,0 +1,288 @@
+"""Conditional GET and server-side response caching for read endpoints
+
+Cached responses are keyed by version stamps kept in a Django cache. Each
+stamp names a scope of data: one organizer's items ("organizer"), the
+global category catalog ("catalog") or the organizer list ("organizers").
+A stamp is the time of the last write to its scope. It goes into the ETag
+and Last-Modified headers and into the response cache key, so a write that
+bumps the stamp invalidates every cached response depending on it.
+
+Stamps only invalidate anything if every worker process sees them, so they
+live in a cache the processes share (FOUNDIT_RESPONSE_CACHE's
+VERSION_CACHE_ALIAS), while the response bodies, whose keys include the
+stamps, may stay in each process. When the stamp cache is process-local
+anyway, conditional responses are turned off and the caches that follow
+stamps reload every LOCAL_TTL seconds; see expiry().
+"""
+import functools
+import hashlib
+import pickle
+import threading
+import time
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+from founditapi import routing
+
+
+class CacheStats:
+    """Hit, miss and 304 counts with the time spent on each, per endpoint"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = dict()
+
+    def record(self, endpoint, outcome, seconds):
+        with self.lock:
+            counts = self.endpoints.setdefault(endpoint, {
+                'hit': [0, 0.0], 'miss': [0, 0.0], 'not_modified': [0, 0.0]})
+            counts[outcome][0] += 1
+            counts[outcome][1] += seconds
+
+    def snapshot(self):
+        """Returns counts, hit ratio and mean latency in milliseconds per endpoint"""
+        with self.lock:
+            report = dict()
+            for endpoint, counts in self.endpoints.items():
+                total = sum(count for count, _ in counts.values())
+                served = counts['hit'][0] + counts['not_modified'][0]
+                report[endpoint] = {
+                    'requests': total,
+                    'hit_ratio': round(served / total, 4) if total else None,
+                }
+                for outcome, (count, seconds) in counts.items():
+                    report[endpoint][outcome] = count
+                    report[endpoint]['%s_ms' % outcome] = round(seconds * 1000 / count, 3) if count else None
+            return report
+
+    def reset(self):
+        with self.lock:
+            self.endpoints.clear()
+
+
+stats = CacheStats()
+
+
+# Backends whose entries only the process that wrote them can see
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+class SharedFileCache(FileBasedCache):
+    """File-based cache shared by the worker processes of one host
+
+    Holds version stamps and replica stickiness: a few small keys per
+    organizer, rewritten by every write. FileBasedCache counts its files
+    before each set to decide whether to cull, which takes milliseconds
+    once there are a thousand of them; these keys are bounded by the
+    number of organizers, so this cache never culls. Its values are a few
+    bytes, so they are pickled without zlib, whose compressor state alone
+    is a quarter of a megabyte per write.
+    """
+
+    def _cull(self):
+        pass
+
+    def _write_content(self, file, timeout, value):
+        file.write(pickle.dumps(self.get_backend_timeout(timeout), self.pickle_protocol))
+        file.write(pickle.dumps(value, self.pickle_protocol))
+
+    def get(self, key, default=None, version=None):
+        try:
+            with open(self._key_to_file(key, version), 'rb') as file:
+                if not self._is_expired(file):
+                    return pickle.load(file)
+        except FileNotFoundError:
+            pass
+        return default
+
+
+def get_options():
+    return getattr(settings, 'FOUNDIT_RESPONSE_CACHE', {})
+
+
+def get_cache():
+    """The cache holding version stamps, which every worker process should share"""
+    return caches[get_options().get('VERSION_CACHE_ALIAS', 'default')]
+
+
+def get_response_cache():
+    return caches[get_options().get('CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return get_options().get('TIMEOUT', 300)
+
+
+def is_shared():
+    """Whether version stamps written by one process are seen by the others"""
+    alias = get_options().get('VERSION_CACHE_ALIAS', 'default')
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+def expiry():
+    """Returns None, or when stamps are process-local a value that changes every LOCAL_TTL seconds
+
+    A process-local stamp doesn't move when another process writes, so the
+    in-process caches that follow stamps add this to their version to
+    reload at least that often.
+    """
+    if is_shared():
+        return None
+    return int(time.monotonic() // get_options().get('LOCAL_TTL', 5))
+
+
+@checks.register(checks.Tags.caches)
+def check_version_cache(app_configs, **kwargs):
+    if is_shared():
+        return []
+    return [checks.Warning(
+        'Version stamps are kept in a process-local cache',
+        hint="Point FOUNDIT_RESPONSE_CACHE['VERSION_CACHE_ALIAS'] at a cache every worker process shares. "
+             'Until then conditional responses are off, the category catalog and tag bitmaps are reloaded '
+             "every LOCAL_TTL seconds and reads stick to the primary only in the process that wrote.",
+        id='founditapi.W001',
+    )]
+
+
+def scope_keys(organizer, scopes):
+    """Expands scope names into version keys, "organizer" meaning the given one"""
+    keys = []
+    for scope in scopes:
+        if scope == 'organizer':
+            keys.append('foundit-version:organizer:%s' % (organizer.pk if organizer else None))
+        else:
+            keys.append('foundit-version:%s' % scope)
+    return keys
+
+
+def get_versions(keys):
+    """Returns the stamp for each key, starting unseen scopes at the current time"""
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump(organizer, *scopes):
+    """Marks the scopes as changed, invalidating responses cached for them"""
+    now = time.time_ns()
+    get_cache().set_many({key: now for key in scope_keys(organizer, scopes)}, None)
+
+
+def etag_matches(header, etag):
+    if header is None:
+        return False
+    candidates = [tag.strip() for tag in header.split(',')]
+    return '*' in candidates or etag in candidates or 'W/' + etag in candidates
+
+
+class Conditional:
+    """Validators and cache lookups for one endpoint that depends on some scopes
+
+    Used through the @conditional decorator by the DRF views, and directly
+    by the async handlers in founditapi.asgi.
+    """
+
+    def __init__(self, endpoint, scopes):
+        self.endpoint = endpoint
+        self.scopes = scopes
+
+    def lookup(self, request):
+        """Works out the request's validators and whatever can be served without the view
+
+        Returns:
+            tuple -- (validators, outcome, data) where outcome is 'not_modified',
+                     'hit' with the cached data, or 'miss'; validators are None
+                     when stamps are process-local, as they can't be trusted
+        """
+        if not is_shared():
+            return None, 'miss', None
+        organizer = getattr(request, 'organizer', None)
+        user = getattr(request, 'user', None)
+        versions = get_versions(scope_keys(organizer, self.scopes))
+        routing.check_versions(versions)
+        # Staff users can see more than the organizer they belong to
+        fingerprint = '%s|%s|%s|%s|%s' % (
+            self.endpoint, organizer.pk if organizer else None, getattr(user, 'is_staff', False),
+            request.get_full_path(), versions)
+        digest = hashlib.md5(fingerprint.encode('utf-8')).hexdigest()
+        validators = {'digest': digest, 'etag': '"%s"' % digest, 'last_modified': max(versions) // 10 ** 9}
+
+        modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        if etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), validators['etag']) or (
+                'HTTP_IF_NONE_MATCH' not in request.META
+                and modified_since is not None and validators['last_modified'] <= modified_since):
+            return validators, 'not_modified', None
+
+        data = get_response_cache().get('foundit-response:' + digest)
+        if data is not None:
+            return validators, 'hit', data
+        return validators, 'miss', None
+
+    def store(self, validators, data):
+        if validators is not None:
+            get_response_cache().set('foundit-response:' + validators['digest'], data, get_timeout())
+
+    def add_headers(self, response, validators):
+        if validators is not None and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = validators['etag']
+            response['Last-Modified'] = http_date(validators['last_modified'])
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ('Authorization', 'Accept'))
+        return response
+
+
+def conditional(*scopes):
+    """Adds ETag / Last-Modified handling and a response cache to a GET view method
+
+    The response is rebuilt only when one of the scopes has been written to
+    since it was cached. A client whose validators still match gets a 304
+    without the payload being built or sent.
+    """
+    def decorator(view_method):
+        endpoint = Conditional(view_method.__qualname__, scopes)
+
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            started = time.perf_counter()
+            validators, outcome, data = endpoint.lookup(request)
+            if outcome == 'not_modified':
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            elif outcome == 'hit':
+                response = Response(data)
+            else:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code == status.HTTP_200_OK:
+                    endpoint.store(validators, response.data)
+
+            endpoint.add_headers(response, validators)
+            stats.record(endpoint.endpoint, outcome, time.perf_counter() - started)
+            return response
+
+        wrapper.conditional = endpoint
+        return wrapper
+    return decorator
+
+
+def invalidates(*scopes):
+    """Bumps the scopes after a view method that writes to them succeeds"""
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            response = view_method(self, request, *args, **kwargs)
+            if getattr(response, 'status_code', 500) < 400:
+                bump(getattr(request, 'organizer', None), *scopes)
+            return response
+        return wrapper
+    return decorator
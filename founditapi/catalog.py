@@ -0,0 +1,109 @@
+"""Process-local copy of the global category catalog
+
+Categories are few, shared by every organizer and rarely written, yet
+item writes validate against them and the category endpoints list them
+on every cache miss. Each process keeps them all in memory, loaded with
+one query, and reloads them when the "catalog" version stamp that
+founditapi.caching keeps in the shared cache has moved on. Every saved
+or deleted Category bumps that stamp once committed, through the
+receivers here, as do the importer's bulk inserts, so checking it costs
+one cache read and no query. When the stamps are process-local they
+only last FOUNDIT_RESPONSE_CACHE['LOCAL_TTL'] seconds.
+
+A category created elsewhere moments ago may still be missing, until
+the bump lands or the stamp expires. Writes validating category ids ask
+for them with get_catalog(ids), which reads the catalog again from the
+primary before taking a missing id as invalid.
+"""
+import threading
+from collections import namedtuple
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from founditapi import routing
+from founditapi.caching import bump, expiry, get_versions, scope_keys
+from founditapi.models import Category
+
+
+CategoryRecord = namedtuple('CategoryRecord', ('id', 'name', 'updated_at'))
+
+
+class Catalog:
+    """Every category by id, and the id for each name, at one catalog version
+
+    Names aren't unique; a name maps to the lowest id that has it, as the
+    importer has always resolved them.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.records = dict()
+        for record in Category.objects.order_by('id').values_list(*CategoryRecord._fields):
+            self.records[record[0]] = CategoryRecord(*record)
+        self.ids_by_name = dict()
+        for record in self.records.values():
+            self.ids_by_name.setdefault(record.name, record.id)
+
+    def __contains__(self, pk):
+        return pk in self.records
+
+    def record(self, pk):
+        """Returns the CategoryRecord for `pk`
+
+        Raises:
+            Category.DoesNotExist -- When there is no such category
+        """
+        record = self.records.get(pk)
+        if record is None:
+            raise Category.DoesNotExist('Category matching query does not exist.')
+        return record
+
+    def category(self, pk):
+        """Returns a Category instance for `pk` without a query"""
+        category = Category(**self.record(pk)._asdict())
+        category._state.adding = False
+        return category
+
+    def row(self, serializer, pk):
+        """Builds a founditapi.views.rows.CategoryRowSerializer's row for `pk`"""
+        record = self.record(pk)
+        return serializer.to_row(tuple(getattr(record, column) for column in serializer.columns))
+
+    def rows(self, serializer):
+        """Builds the serializer's rows for every category, in id order"""
+        return [self.row(serializer, pk) for pk in self.records]
+
+
+_catalog = None
+_lock = threading.Lock()
+
+
+def get_catalog(ids=()):
+    """Returns the current catalog, reloading it if categories changed in any process
+
+    Arguments:
+        ids -- Category ids about to be validated; if any is missing the
+               catalog is read again from the primary
+    """
+    global _catalog
+    stamp = get_versions(scope_keys(None, ('catalog',)))[0]
+    # A replica may not have the write that moved the version on yet
+    routing.check_versions([stamp])
+    version = (stamp, expiry())
+    catalog = _catalog
+    if catalog is not None and catalog.version == version and all(pk in catalog for pk in ids):
+        return catalog
+    with _lock:
+        if _catalog is None or _catalog.version != version:
+            _catalog = Catalog(version)
+        if any(pk not in _catalog for pk in ids):
+            # Categories are few, so a request with a bad id costs one small query
+            with routing.primary():
+                _catalog = Catalog(version)
+        return _catalog
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_written(sender, **kwargs):
+    transaction.on_commit(lambda: bump(None, 'catalog'))
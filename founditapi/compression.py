@@ -0,0 +1,130 @@
+"""Response compression negotiated from Accept-Encoding
+
+Django's GZipMiddleware compresses anything over 200 bytes at a fixed
+level and knows nothing of brotli. This middleware picks brotli (when the
+brotli package is installed) or gzip by the client's q-values, leaves
+responses under FOUNDIT_COMPRESSION['MIN_SIZE'] alone, since they'd save
+less than the work costs, and takes its levels from the same setting.
+"""
+import gzip
+import zlib
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def accepted_encodings(header):
+    """Parses Accept-Encoding into {coding: q}"""
+    accepted = dict()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class Gzip:
+    name = 'gzip'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, content):
+        return gzip.compress(content, compresslevel=self.level, mtime=0)
+
+    def compress_sequence(self, chunks):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class Brotli:
+    name = 'br'
+
+    def __init__(self, quality):
+        self.quality = quality
+
+    def compress(self, content):
+        return brotli.compress(content, quality=self.quality)
+
+    def compress_sequence(self, chunks):
+        compressor = brotli.Compressor(quality=self.quality)
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compresses response bodies with the best coding the client accepts
+
+    Streaming responses are always compressed since their size isn't
+    known up front. Strong ETags are weakened, as GZipMiddleware does,
+    because the compressed body is a different representation; the
+    conditional GET handling in founditapi.caching matches weak ETags.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = getattr(settings, 'FOUNDIT_COMPRESSION', {})
+        self.min_size = options.get('MIN_SIZE', 1024)
+        self.codings = []
+        if brotli is not None:
+            self.codings.append(Brotli(options.get('BROTLI_QUALITY', 4)))
+        self.codings.append(Gzip(options.get('GZIP_LEVEL', 6)))
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = self.choose(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = coding.compress_sequence(response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = coding.compress(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding.name
+        return response
+
+    def choose(self, header):
+        """Returns the accepted coding with the highest q, preferring brotli on ties"""
+        accepted = accepted_encodings(header)
+        best, best_q = None, 0.0
+        for coding in self.codings:
+            q = accepted.get(coding.name, accepted.get('*', 0.0))
+            if q > best_q:
+                best, best_q = coding, q
+        return best
@@ -0,0 +1,47 @@
+"""Database connection setup and health checks driven by settings
+
+New SQLite connections get settings.FOUNDIT_SQLITE_PRAGMAS. Persistent
+connections whose DATABASES entry sets CONN_HEALTH_CHECKS are tested at
+the start of each request, at most once per HEALTH_CHECK_INTERVAL, and
+closed if the server went away, so the request opens a fresh connection
+instead of failing on a dead one.
+"""
+import time
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+# Seconds a connection that passed a check is trusted without another
+HEALTH_CHECK_INTERVAL = 1.0
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'FOUNDIT_SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+
+
+def check_connections():
+    """Closes persistent connections that no longer answer a trivial query"""
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or not connection.settings_dict.get('CONN_HEALTH_CHECKS'):
+            continue
+        if connection.in_atomic_block or now - getattr(connection, 'health_checked_at', 0) < HEALTH_CHECK_INTERVAL:
+            continue
+        if connection.is_usable():
+            connection.health_checked_at = now
+        else:
+            connection.close()
+
+
+@receiver(request_started)
+def request_started_check(sender, **kwargs):
+    check_connections()
@@ -0,0 +1,74 @@
+"""Streaming writers for exporting an organizer's inventory and other listings"""
+import csv
+import json
+from rest_framework.utils.encoders import JSONEncoder
+
+
+EXPORT_COLUMNS = ('id', 'name', 'description', 'quantity', 'location',
+                  'created_at', 'category', 'category_name')
+
+QUERY_COLUMNS = ('id', 'name', 'description', 'quantity', 'location',
+                 'created_at', 'category_id', 'category__name')
+
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose write() hands the line straight back to csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(items, chunk_size=CHUNK_SIZE):
+    """Walks an item queryset in chunks without caching the results
+
+    Yields:
+        tuple -- One row of EXPORT_COLUMNS per item, with created_at in ISO format
+    """
+    rows = items.order_by('id').values_list(*QUERY_COLUMNS).iterator(chunk_size=chunk_size)
+    for row in rows:
+        created_at = row[5]
+        if created_at is not None:
+            created_at = created_at.isoformat()
+        yield row[:5] + (created_at,) + row[6:]
+
+
+def batched(lines, chunk_size=CHUNK_SIZE):
+    """Joins lines into larger strings so the response isn't written a row at a time"""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= chunk_size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def ndjson_lines(items, chunk_size=CHUNK_SIZE):
+    """Yields the items as newline-delimited JSON objects"""
+    dumps = json.dumps
+    for row in export_rows(items, chunk_size):
+        yield dumps(dict(zip(EXPORT_COLUMNS, row))) + '\n'
+
+
+def ndjson_rows(rows):
+    """Yields already built row dicts as newline-delimited JSON"""
+    dumps = json.dumps
+    for row in rows:
+        yield dumps(row, cls=JSONEncoder) + '\n'
+
+
+def csv_lines(items, chunk_size=CHUNK_SIZE):
+    """Yields the items as CSV lines, starting with a header row"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in export_rows(items, chunk_size):
+        yield writer.writerow(row)
+
+
+EXPORT_FORMATS = {
+    'ndjson': (ndjson_lines, 'application/x-ndjson', 'ndjson'),
+    'csv': (csv_lines, 'text/csv', 'csv'),
+}
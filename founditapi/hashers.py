@@ -0,0 +1,62 @@
+"""Password hashers not shipped with Django 2.2"""
+import base64
+import hashlib
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth.hashers import BasePasswordHasher, mask_hash
+from django.utils.crypto import constant_time_compare
+from django.utils.translation import gettext_noop as _
+
+
+class ScryptPasswordHasher(BasePasswordHasher):
+    """
+    Secure password hashing using the memory-hard scrypt algorithm
+
+    Encodes hashes the way Django 4.0's hasher of the same name does, so
+    stored passwords keep working after an upgrade. The cost parameters
+    come from settings.FOUNDIT_SCRYPT; passwords hashed with other
+    parameters are rehashed the next time their owner logs in.
+    """
+    algorithm = 'scrypt'
+
+    def parameters(self):
+        options = getattr(settings, 'FOUNDIT_SCRYPT', {})
+        return options.get('N', 2 ** 14), options.get('R', 8), options.get('P', 1)
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        assert password is not None
+        assert salt and '$' not in salt
+        default_n, default_r, default_p = self.parameters()
+        n, r, p = n or default_n, r or default_r, p or default_p
+        hash = hashlib.scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+                              maxmem=256 * n * r * p, dklen=64)
+        hash = base64.b64encode(hash).decode('ascii').strip()
+        return '%s$%d$%s$%d$%d$%s' % (self.algorithm, n, salt, r, p, hash)
+
+    def decode(self, encoded):
+        algorithm, n, salt, r, p, hash = encoded.split('$', 5)
+        assert algorithm == self.algorithm
+        return int(n), salt, int(r), int(p), hash
+
+    def verify(self, password, encoded):
+        n, salt, r, p, hash = self.decode(encoded)
+        return constant_time_compare(encoded, self.encode(password, salt, n, r, p))
+
+    def safe_summary(self, encoded):
+        n, salt, r, p, hash = self.decode(encoded)
+        return OrderedDict([
+            (_('algorithm'), self.algorithm),
+            (_('work factor'), n),
+            (_('block size'), r),
+            (_('parallelism'), p),
+            (_('salt'), mask_hash(salt)),
+            (_('hash'), mask_hash(hash)),
+        ])
+
+    def must_update(self, encoded):
+        n, salt, r, p, hash = self.decode(encoded)
+        return (n, r, p) != self.parameters()
+
+    def harden_runtime(self, password, encoded):
+        # scrypt's cost can't be topped up the way PBKDF2 iterations can
+        pass
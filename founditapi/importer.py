@@ -0,0 +1,292 @@
+"""Streaming import of inventory files into an organizer's items"""
+import csv
+import json
+import time
+from django.db import transaction
+from django.db.models import Q
+from founditapi import sync
+from founditapi.bulk import bulk_create_items
+from founditapi.caching import bump
+from founditapi.catalog import get_catalog
+from founditapi.models import Category, Change, Item
+
+
+BATCH_SIZE = 1000
+READ_SIZE = 64 * 1024
+
+
+class InventoryImportError(Exception):
+    """Raised for a row that can't be imported
+
+    Arguments:
+        row -- Zero-based position of the row in the input
+        message -- What was wrong with it
+    """
+
+    def __init__(self, row, message):
+        super().__init__('Row %d: %s' % (row, message))
+        self.row = row
+        self.message = message
+
+
+def iter_json_array(stream):
+    """Yields the elements of a top-level JSON array without reading it all in"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+
+    while True:
+        # Skip whitespace and the array punctuation between elements
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[':
+            if buffer[position] == '[':
+                started = True
+            position += 1
+
+        if position < len(buffer) and buffer[position] == ']':
+            return
+
+        if position < len(buffer) and started:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if eof:
+                    raise
+            else:
+                yield value
+                position = end
+                continue
+
+        if eof:
+            if started:
+                raise ValueError('Unterminated JSON array')
+            return
+
+        chunk = stream.read(READ_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def iter_fixture(stream):
+    """Yields import rows from a Django fixture such as fixtures/item.json
+
+    Category records become category rows so that items later in the same
+    file can refer to them; records for other models are skipped. Item
+    records name their category by its pk in the fixture, which means
+    nothing in this database, so it is resolved to the name of the
+    category record with that pk.
+
+    Raises:
+        ValueError -- When an item refers to a category the fixture hasn't defined before it
+    """
+    category_names = dict()
+    for record in iter_json_array(stream):
+        fields = record.get('fields', {})
+        if record.get('model') == 'founditapi.category':
+            category_names[record.get('pk')] = fields.get('name')
+            yield {'category': fields.get('name')}
+        elif record.get('model') == 'founditapi.item':
+            category = fields.get('category_id', fields.get('category'))
+            if category not in category_names:
+                raise ValueError('Item %s refers to category %s, which the fixture does not define'
+                                 % (record.get('pk'), category))
+            yield {
+                'name': fields.get('name'),
+                'description': fields.get('description', ''),
+                'quantity': fields.get('quantity'),
+                'location': fields.get('location', ''),
+                'category': category_names[category],
+            }
+
+
+def iter_ndjson(stream):
+    """Yields one import row per non-blank line of newline-delimited JSON"""
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(stream):
+    """Yields one import row per CSV line, keyed by the header row"""
+    for row in csv.DictReader(stream):
+        yield row
+
+
+INPUT_FORMATS = {
+    'fixture': iter_fixture,
+    'ndjson': iter_ndjson,
+    'csv': iter_csv,
+}
+
+
+def guess_format(filename):
+    """Picks an input format from a file extension"""
+    if filename.endswith('.csv'):
+        return 'csv'
+    if filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'fixture'
+
+
+# Text columns an import row fills, with the model field that bounds each
+LENGTH_LIMITS = (
+    ('name', Item._meta.get_field('name')),
+    ('description', Item._meta.get_field('description')),
+    ('location', Item._meta.get_field('location')),
+    ('category', Category._meta.get_field('name')),
+)
+
+
+def check_lengths(index, row):
+    """Raises InventoryImportError for a value longer than its column allows
+
+    Postgres refuses such a value with a DataError for the whole batch,
+    and SQLite stores it untruncated, so rows are checked before writing.
+    """
+    for key, field in LENGTH_LIMITS:
+        value = row.get(key)
+        if value and field.max_length is not None and len(str(value)) > field.max_length:
+            raise InventoryImportError(index, '%s is longer than %d characters' % (key, field.max_length))
+
+
+def parse_category_id(row):
+    """Returns a row's category_id as an int, or None when it has none"""
+    try:
+        return int(row.get('category_id'))
+    except (TypeError, ValueError):
+        return None
+
+
+class InventoryImporter:
+    """Inserts import rows for one organizer in batches
+
+    Rows name their category with `category` (a name) or `category_id`.
+    Category names are resolved against an in-memory map loaded once.
+    Names and ids not in it are looked up with the batch that needs them,
+    since another process may have created them since, and names that
+    still aren't found are created. Each batch is written in its own transaction, and `on_batch` is
+    called with the number of rows committed so far so callers can record
+    a checkpoint and resume with `skip` after a failure.
+
+    Arguments:
+        organizer -- Organizer the items are created for
+        batch_size -- Rows written per transaction
+        skip -- Rows at the start of the input already imported by an earlier run
+        on_batch -- Optional callable taking the committed row count
+    """
+
+    def __init__(self, organizer, batch_size=BATCH_SIZE, skip=0, on_batch=None):
+        self.organizer = organizer
+        self.batch_size = batch_size
+        self.skip = skip
+        self.on_batch = on_batch
+        catalog = get_catalog()
+        self.category_names = dict(catalog.ids_by_name)
+        self.category_ids = set(catalog.records)
+        self.committed = skip
+        self.imported = 0
+
+    def run(self, rows):
+        """Imports every row after `skip`
+
+        Returns:
+            dict -- Rows imported by this run, rows committed in total and rows per second
+        """
+        started = time.monotonic()
+        batch = []
+        for index, row in enumerate(rows):
+            if index < self.skip:
+                continue
+            batch.append((index, row))
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = []
+        if batch:
+            self.write(batch)
+
+        elapsed = time.monotonic() - started
+        return {
+            'imported': self.imported,
+            'committed': self.committed,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(self.imported / elapsed, 1) if elapsed else None,
+        }
+
+    def write(self, batch):
+        for index, row in batch:
+            if isinstance(row, dict):
+                check_lengths(index, row)
+        rows = [row for index, row in batch if isinstance(row, dict)]
+        missing = {row['category'] for row in rows if row.get('category')} - set(self.category_names)
+        unknown_ids = {parse_category_id(row) for row in rows if not row.get('category')} - self.category_ids - {None}
+
+        with transaction.atomic():
+            if missing or unknown_ids:
+                missing = self.find_categories(missing, unknown_ids)
+            if missing:
+                self.create_categories(missing)
+            items = [self.build_item(index, row) for index, row in batch]
+            bulk_create_items(self.organizer, [item for item in items if item is not None])
+
+        bump(self.organizer, 'organizer', *(['catalog'] if missing else []))
+
+        self.imported += sum(1 for item in items if item is not None)
+        self.committed += len(batch)
+        if self.on_batch is not None:
+            self.on_batch(self.committed)
+
+    def find_categories(self, names, ids):
+        """Adds categories created since the catalog was read to the maps
+
+        Returns:
+            set -- The names that still don't exist
+        """
+        found = Category.objects.filter(Q(name__in=names) | Q(pk__in=ids)).order_by('-id').values_list('id', 'name')
+        for pk, name in found:
+            # Descending, so a name ends up with its lowest id
+            self.category_names[name] = pk
+            self.category_ids.add(pk)
+        return {name for name in names if name not in self.category_names}
+
+    def create_categories(self, names):
+        Category.objects.bulk_create([Category(name=name) for name in names])
+        created = list(Category.objects.filter(name__in=names).order_by('-id').values_list('id', 'name'))
+        for pk, name in created:
+            self.category_names[name] = pk
+            self.category_ids.add(pk)
+        sync.changed(Change.CATEGORY, None, [pk for pk, name in created])
+
+    def build_item(self, index, row):
+        """Returns an unsaved Item for a row, or None for category-only rows"""
+        if not isinstance(row, dict):
+            raise InventoryImportError(index, 'Expected an object')
+
+        if not row.get('name'):
+            if row.get('category') and len(row) == 1:
+                return None
+            raise InventoryImportError(index, 'Missing name')
+
+        if row.get('category'):
+            category_id = self.category_names[row['category']]
+        else:
+            category_id = parse_category_id(row)
+            if category_id is None:
+                raise InventoryImportError(index, 'Missing category')
+            if category_id not in self.category_ids:
+                raise InventoryImportError(index, 'Unknown category %s' % category_id)
+
+        try:
+            quantity = int(row.get('quantity'))
+        except (TypeError, ValueError):
+            raise InventoryImportError(index, 'Invalid quantity')
+
+        return Item(
+            organizer=self.organizer,
+            name=row['name'],
+            description=row.get('description') or '',
+            quantity=quantity,
+            location=row.get('location') or '',
+            category_id=category_id,
+        )
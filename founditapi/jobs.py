@@ -0,0 +1,318 @@
+"""Background jobs for work too long to finish inside a request
+
+A view queues a Job with enqueue() and answers 202 with the job, whose
+status, progress and result the client polls at /jobs/{id}. Workers
+started by `manage.py run_workers` claim due jobs with a conditional
+UPDATE, so any number of threads and processes can share the table
+without row locks, and run the function registered for the job's kind
+with @task. Workers send heartbeats while a job runs; a job whose worker
+died is claimed again once FOUNDIT_JOBS['LEASE_SECONDS'] pass without one.
+
+A task that raises is retried with exponential backoff until MAX_ATTEMPTS,
+except for JobError, which says retrying can't help. Tasks that work in
+committed steps record their progress with report() and resume from
+job.progress when retried.
+"""
+import datetime
+import json
+import os
+import signal
+import socket
+import threading
+import traceback
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from founditapi import search, summaries, sync
+from founditapi.caching import bump
+from founditapi.export import EXPORT_FORMATS, batched
+from founditapi.importer import INPUT_FORMATS, InventoryImportError, InventoryImporter
+from founditapi.models import Item, Job, Organizer
+
+
+DELETE_BATCH_SIZE = 1000
+
+_tasks = dict()
+
+
+class JobError(Exception):
+    """Raised by a task for a failure that retrying won't fix"""
+
+
+class JobLost(Exception):
+    """Raised when another worker has taken over a job whose lease ran out"""
+
+
+def get_options():
+    return getattr(settings, 'FOUNDIT_JOBS', {})
+
+
+def task(kind):
+    """Registers a function(job, **arguments) as the runner for jobs of `kind`
+
+    The function's return value, which must be JSON serializable, becomes
+    the job's result.
+    """
+    def decorator(function):
+        _tasks[kind] = function
+        return function
+    return decorator
+
+
+def job_path(job_id, extension):
+    """Where files belonging to a job, such as an upload or an export, are kept"""
+    return os.path.join(get_options().get('FILE_DIR', 'jobs'), 'job-%d.%s' % (job_id, extension))
+
+
+def save_upload(job, upload):
+    """Keeps an uploaded file on disk for a job to read"""
+    path = job_path(job.pk, 'upload')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as stream:
+        for chunk in upload.chunks():
+            stream.write(chunk)
+
+
+def enqueue(kind, user=None, total=None, **arguments):
+    """Queues a job to run as soon as a worker is free
+
+    Inside a transaction, workers only see the job once it commits.
+    """
+    job = Job(kind=kind, user=user, arguments=json.dumps(arguments), total=total, run_after=timezone.now())
+    job.save(force_insert=True)
+    return job
+
+
+def report(job, progress, total=None):
+    """Records a running job's progress, which also serves as a heartbeat
+
+    Raises:
+        JobLost -- When the job's lease ran out and another worker claimed it
+    """
+    fields = {'progress': progress, 'heartbeat_at': timezone.now()}
+    if total is not None:
+        fields['total'] = total
+    if not Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(**fields):
+        raise JobLost(job.pk)
+    job.progress = progress
+    if total is not None:
+        job.total = total
+
+
+def claimable(now):
+    lease = datetime.timedelta(seconds=get_options().get('LEASE_SECONDS', 300))
+    return Q(status=Job.QUEUED, run_after__lte=now) | Q(status=Job.RUNNING, heartbeat_at__lt=now - lease)
+
+
+def claim(worker):
+    """Takes the oldest due job for `worker`, or returns None when there is none"""
+    now = timezone.now()
+    for pk in Job.objects.filter(claimable(now)).order_by('id').values_list('id', flat=True)[:10]:
+        # Another worker may have claimed it since; the update only wins once
+        claimed = Job.objects.filter(claimable(now), pk=pk).update(
+            status=Job.RUNNING, worker=worker, heartbeat_at=now, started_at=now, attempts=F('attempts') + 1)
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def finish(job, **fields):
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(
+        finished_at=timezone.now(), **fields)
+
+
+def backoff(attempts):
+    options = get_options()
+    seconds = options.get('BACKOFF_SECONDS', 10) * 2 ** max(attempts - 1, 0)
+    return min(seconds, options.get('MAX_BACKOFF_SECONDS', 600))
+
+
+def run(job):
+    """Runs a claimed job and records its result, a retry or its failure"""
+    function = _tasks.get(job.kind)
+    try:
+        if function is None:
+            raise JobError('Unknown job kind %s' % job.kind)
+        if job.attempts > get_options().get('MAX_ATTEMPTS', 3):
+            raise JobError('Worker stopped while running the job')
+        result = function(job, **json.loads(job.arguments))
+    except JobLost:
+        return
+    except JobError as ex:
+        finish(job, status=Job.FAILED, error=str(ex))
+    except Exception:
+        error = traceback.format_exc(limit=5)
+        if job.attempts >= get_options().get('MAX_ATTEMPTS', 3):
+            finish(job, status=Job.FAILED, error=error)
+        else:
+            Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(
+                status=Job.QUEUED, error=error, worker='',
+                run_after=timezone.now() + datetime.timedelta(seconds=backoff(job.attempts)))
+    else:
+        finish(job, status=Job.SUCCEEDED, result=json.dumps(result), error='')
+
+
+def purge(now=None):
+    """Deletes finished jobs older than RETENTION_DAYS and their files
+
+    Returns:
+        int -- Number of jobs deleted
+    """
+    cutoff = (now or timezone.now()) - datetime.timedelta(days=get_options().get('RETENTION_DAYS', 7))
+    finished = list(Job.objects.filter(status__in=(Job.SUCCEEDED, Job.FAILED), finished_at__lt=cutoff)
+                    .values_list('id', flat=True))
+    directory = get_options().get('FILE_DIR', 'jobs')
+    prefixes = tuple('job-%d.' % pk for pk in finished)
+    if prefixes and os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.startswith(prefixes):
+                os.remove(os.path.join(directory, name))
+    for start in range(0, len(finished), 500):
+        Job.objects.filter(id__in=finished[start:start + 500]).delete()
+    return len(finished)
+
+
+class Worker:
+    """Runs jobs on a pool of threads until stopped
+
+    Each thread claims and runs one job at a time under its own worker
+    name, host:pid:thread. A separate thread sends the heartbeats for
+    every job the pool is running and purges old jobs once an hour.
+
+    Arguments:
+        threads -- Jobs run at once
+        once -- Stop once no job is due, rather than waiting for more
+        log -- Optional callable taking a line about each finished job
+    """
+
+    def __init__(self, threads=1, once=False, log=None):
+        self.name = '%s:%d' % (socket.gethostname(), os.getpid())
+        self.threads = threads
+        self.once = once
+        self.log = log
+        self.stopping = threading.Event()
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def work(self, index):
+        worker = '%s:%d' % (self.name, index)
+        poll = get_options().get('POLL_SECONDS', 1.0)
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                job = claim(worker)
+                if job is None:
+                    if self.once:
+                        return
+                    self.stopping.wait(poll)
+                    continue
+                run(job)
+                if self.log is not None:
+                    job.refresh_from_db()
+                    self.log('Job %d (%s) %s after %d attempts' % (job.pk, job.kind, job.status, job.attempts))
+        finally:
+            close_old_connections()
+
+    def beat(self):
+        interval = get_options().get('LEASE_SECONDS', 300) / 3
+        purged_at = None
+        while not self.stopping.wait(interval):
+            close_old_connections()
+            now = timezone.now()
+            Job.objects.filter(status=Job.RUNNING, worker__startswith=self.name + ':').update(heartbeat_at=now)
+            if purged_at is None or now - purged_at > datetime.timedelta(hours=1):
+                purge(now)
+                purged_at = now
+
+    def run(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+        heartbeat = threading.Thread(target=self.beat, daemon=True)
+        heartbeat.start()
+        pool = [threading.Thread(target=self.work, args=(index,)) for index in range(self.threads)]
+        for thread in pool:
+            thread.start()
+        try:
+            for thread in pool:
+                thread.join()
+        except KeyboardInterrupt:
+            self.stop()
+            for thread in pool:
+                thread.join()
+        self.stop()
+
+
+@task('export_items')
+def export_items(job, organizer_id, output):
+    """Writes an organizer's inventory to a file, downloadable from /jobs/{id}/file"""
+    lines, content_type, extension = EXPORT_FORMATS[output]
+    items = Item.objects.filter(organizer_id=organizer_id)
+    total = items.count()
+    report(job, 0, total)
+
+    path = job_path(job.pk, extension)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    written = 0
+    # The header row of a CSV export isn't an item
+    header = 1 if output == 'csv' else 0
+    with open(path + '.part', 'w', encoding='utf-8', newline='') as stream:
+        for chunk in batched(lines(items)):
+            stream.write(chunk)
+            written += chunk.count('\n')
+            report(job, min(written - header, total))
+    os.replace(path + '.part', path)
+    return {'file': os.path.basename(path), 'content_type': content_type, 'rows': written - header}
+
+
+@task('import_items')
+def import_items(job, organizer_id, input_format, batch_size, skip=0):
+    """Imports an uploaded inventory file, resuming after the rows already committed"""
+    organizer = Organizer.objects.get(pk=organizer_id)
+    path = job_path(job.pk, 'upload')
+    # Progress counts committed rows, including those skipped at the start
+    importer = InventoryImporter(organizer, batch_size=batch_size, skip=max(skip, job.progress),
+                                 on_batch=lambda committed: report(job, committed))
+    with open(path, encoding='utf-8', newline='') as stream:
+        try:
+            stats = importer.run(INPUT_FORMATS[input_format](stream))
+        except (InventoryImportError, ValueError) as ex:
+            raise JobError('%s (%d rows committed)' % (ex, importer.committed))
+    os.remove(path)
+    return stats
+
+
+@task('delete_organizer')
+def delete_organizer(job, user_id):
+    """Deletes a user, and their organizer's items a batch at a time"""
+    organizer = Organizer.objects.filter(user_id=user_id).first()
+    if organizer is not None:
+        items = Item.objects.filter(organizer=organizer)
+        report(job, job.progress, job.progress + items.count())
+        while True:
+            ids = list(items.order_by('id').values_list('id', flat=True)[:DELETE_BATCH_SIZE])
+            if not ids:
+                break
+            with transaction.atomic(), summaries.batch(), sync.batch(), search.batch():
+                Item.objects.filter(pk__in=ids).delete()
+            report(job, job.progress + len(ids))
+
+    user = User.objects.filter(pk=user_id).first()
+    if user is not None:
+        user.delete()
+    if organizer is not None:
+        bump(organizer, 'organizer')
+    bump(None, 'organizers')
+    return {'deleted_items': job.progress}
+
+
+@task('rebuild_summaries')
+def rebuild_summaries(job, organizer_id=None):
+    """Recomputes the inventory summary tables, for everyone or one organizer"""
+    organizer = Organizer.objects.get(pk=organizer_id) if organizer_id is not None else None
+    categories, locations = summaries.rebuild(organizer)
+    for pk in [organizer_id] if organizer else Organizer.objects.values_list('pk', flat=True):
+        bump(Organizer(pk=pk), 'organizer')
+    return {'category_summaries': categories, 'location_summaries': locations}
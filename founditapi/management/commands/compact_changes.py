@@ -0,0 +1,22 @@
+"""Management command that compacts the change log behind /sync"""
+import time
+from django.core.management.base import BaseCommand
+from founditapi.sync import compact
+
+
+class Command(BaseCommand):
+    """Compacts the Change table
+
+    Run periodically, from cron or a scheduler. Only the latest change to
+    each item and category is needed by clients, and changes older than
+    FOUNDIT_SYNC['RETENTION_DAYS'] can go because tokens that old are
+    answered with a reset.
+    """
+
+    help = 'Delete superseded and expired rows from the /sync change log'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        superseded, expired = compact()
+        self.stdout.write('Deleted %d superseded and %d expired changes in %.2fs' % (
+            superseded, expired, time.perf_counter() - started))
@@ -0,0 +1,87 @@
+"""Management command that prints query plans for the API endpoints"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from rest_framework.authtoken.models import Token
+from founditapi.models import Item, Organizer
+
+
+ENDPOINTS = (
+    ('Items.list', '/items', ()),
+    ('Items.list by category', '/items?category={category}', ('category',)),
+    ('Items.list by name', '/items?name={name}', ('name',)),
+    ('Items.list by name prefix', '/items?name_prefix={prefix}', ('prefix',)),
+    ('Items.retrieve', '/items/{item}', ('item',)),
+    ('Categories.list', '/categories', ()),
+    ('Organizers.retrieve', '/organizers/{organizer}', ('organizer',)),
+)
+
+
+def is_full_scan(line):
+    """True for plan lines that read a whole table instead of an index"""
+    if 'Seq Scan' in line:
+        return True
+    return 'SCAN' in line and 'USING' not in line
+
+
+class Command(BaseCommand):
+    """Runs each endpoint as an organizer and EXPLAINs every SELECT it issues
+
+    Plan lines that walk a whole table are highlighted so that a missing or
+    unused index shows up before it shows up as latency.
+    """
+
+    help = 'Print EXPLAIN plans for the queries issued by each API endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User whose organizer data the endpoints are run against')
+        parser.add_argument('--host', default='localhost', help='Host header sent with each request')
+
+    def handle(self, *args, **options):
+        try:
+            organizer = Organizer.objects.select_related('user').get(user__username=options['username'])
+        except Organizer.DoesNotExist:
+            raise CommandError('No organizer for user "%s"' % options['username'])
+
+        token, _ = Token.objects.get_or_create(user=organizer.user)
+        client = Client(HTTP_HOST=options['host'], HTTP_AUTHORIZATION='Token ' + token.key)
+
+        sample = Item.objects.filter(organizer=organizer).order_by('id').first()
+        values = {'organizer': organizer.id}
+        if sample is not None:
+            values.update(category=sample.category_id, name=sample.name,
+                          prefix=sample.name[:3], item=sample.id)
+
+        full_scans = 0
+        for label, path, needs in ENDPOINTS:
+            if any(name not in values for name in needs):
+                self.stdout.write(self.style.NOTICE('%s: skipped, organizer has no items' % label))
+                continue
+
+            path = path.format(**values)
+            queries = []
+
+            def capture(execute, sql, params, many, context):
+                queries.append((sql, params))
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(capture):
+                client.get(path)
+
+            self.stdout.write(self.style.MIGRATE_HEADING('%s  GET %s' % (label, path)))
+            for sql, params in queries:
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                self.stdout.write('  ' + sql)
+                with connection.cursor() as cursor:
+                    cursor.execute('%s %s' % (connection.ops.explain_query_prefix(), sql), params)
+                    plan = [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+                for line in plan:
+                    if is_full_scan(line):
+                        full_scans += 1
+                        self.stdout.write(self.style.WARNING('    ' + line))
+                    else:
+                        self.stdout.write('    ' + line)
+
+        if full_scans:
+            self.stdout.write(self.style.WARNING('%d full table scan(s) found' % full_scans))
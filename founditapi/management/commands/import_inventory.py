@@ -0,0 +1,62 @@
+"""Management command that imports an inventory file for one organizer"""
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from founditapi.importer import BATCH_SIZE, INPUT_FORMATS, InventoryImporter, InventoryImportError, guess_format
+from founditapi.models import Organizer
+
+
+class Command(BaseCommand):
+    """Streams a fixture, NDJSON or CSV file into an organizer's items
+
+    With --checkpoint the number of committed rows is written to a file
+    after every batch, and --resume skips that many rows on the next run.
+    """
+
+    help = 'Import items from a fixture, NDJSON or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('username', help='User whose organizer receives the items')
+        parser.add_argument('--format', choices=sorted(INPUT_FORMATS), help='Input format, guessed from the extension by default')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows written per transaction')
+        parser.add_argument('--checkpoint', help='File recording how many rows have been committed')
+        parser.add_argument('--resume', action='store_true', help='Skip the rows recorded in --checkpoint')
+
+    def handle(self, *args, **options):
+        try:
+            organizer = Organizer.objects.get(user__username=options['username'])
+        except Organizer.DoesNotExist:
+            raise CommandError('No organizer for user "%s"' % options['username'])
+
+        path = options['path']
+        checkpoint = options['checkpoint']
+        skip = 0
+        if options['resume']:
+            if not checkpoint:
+                raise CommandError('--resume needs --checkpoint')
+            if os.path.exists(checkpoint):
+                with open(checkpoint) as checkpoint_file:
+                    skip = json.load(checkpoint_file)['committed']
+
+        def save_checkpoint(committed):
+            with open(checkpoint, 'w') as checkpoint_file:
+                json.dump({'path': path, 'committed': committed}, checkpoint_file)
+            self.stdout.write('  %d rows committed' % committed)
+
+        importer = InventoryImporter(
+            organizer,
+            batch_size=options['batch_size'],
+            skip=skip,
+            on_batch=save_checkpoint if checkpoint else None,
+        )
+        rows = INPUT_FORMATS[options['format'] or guess_format(path)]
+
+        with open(path, newline='', encoding='utf-8') as stream:
+            try:
+                stats = importer.run(rows(stream))
+            except (InventoryImportError, ValueError) as ex:
+                raise CommandError('%s (%d rows committed, rerun with --resume to continue)' % (ex, importer.committed))
+
+        self.stdout.write(self.style.SUCCESS(
+            'Imported %(imported)d items in %(seconds)ss (%(rows_per_second)s rows/sec)' % stats))
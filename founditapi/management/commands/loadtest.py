@@ -0,0 +1,128 @@
+"""Management command that load tests running API servers"""
+import asyncio
+import time
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def read_response(reader):
+    """Reads one HTTP/1.1 response, returning its status code"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed')
+    status_code = int(status_line.split(b' ', 2)[1])
+    length = 0
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value.strip())
+        elif name == b'transfer-encoding' and b'chunked' in value.lower():
+            chunked = True
+
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status_code
+
+
+class LoadTest:
+    """Keeps `concurrency` keep-alive connections busy until `total` requests are done"""
+
+    def __init__(self, url, path, token, concurrency, total):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.request = (
+            'GET %s HTTP/1.1\r\nHost: %s\r\nAccept: application/json\r\n%s\r\n' % (
+                path, parts.netloc, 'Authorization: Token %s\r\n' % token if token else '')
+        ).encode('latin-1')
+        self.concurrency = concurrency
+        self.total = total
+        self.issued = 0
+        self.latencies = []
+        self.errors = 0
+
+    async def client(self):
+        reader = writer = None
+        while self.issued < self.total:
+            self.issued += 1
+            started = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(self.host, self.port)
+                writer.write(self.request)
+                status_code = await read_response(reader)
+            except (OSError, ConnectionError, ValueError, asyncio.IncompleteReadError):
+                self.errors += 1
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+                continue
+            if status_code >= 400:
+                self.errors += 1
+            self.latencies.append(time.perf_counter() - started)
+        if writer is not None:
+            writer.close()
+
+    async def run(self):
+        started = time.perf_counter()
+        await asyncio.gather(*[self.client() for _ in range(self.concurrency)])
+        elapsed = time.perf_counter() - started
+        latencies = sorted(self.latencies)
+        return {
+            'requests': len(latencies),
+            'errors': self.errors,
+            'rps': len(latencies) / elapsed if elapsed else 0.0,
+            'p50_ms': (percentile(latencies, 0.50) or 0) * 1000,
+            'p99_ms': (percentile(latencies, 0.99) or 0) * 1000,
+        }
+
+
+class Command(BaseCommand):
+    """Compares latency and throughput of servers started separately
+
+    Start the same project under the WSGI entry point (foundit.wsgi) and the
+    ASGI one (foundit.asgi), then pass both base urls to compare them under
+    the same number of concurrent clients.
+    """
+
+    help = 'Measure p50/p99 latency and requests/sec of running API servers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='Base url of each server, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--path', default='/categories', help='Path requested by every client')
+        parser.add_argument('--token', help='API token sent as the Authorization header')
+        parser.add_argument('--concurrency', type=int, default=500, help='Concurrent keep-alive clients')
+        parser.add_argument('--requests', type=int, default=10000, help='Requests per server')
+
+    def handle(self, *args, **options):
+        loop = asyncio.new_event_loop()
+        try:
+            for url in options['urls']:
+                if not url.startswith('http://'):
+                    raise CommandError('Only http:// urls are supported: %s' % url)
+                test = LoadTest(url, options['path'], options['token'], options['concurrency'], options['requests'])
+                result = loop.run_until_complete(test.run())
+                self.stdout.write(
+                    '%s%s  %d requests  %d errors  %.1f req/s  p50 %.1f ms  p99 %.1f ms' % (
+                        url, options['path'], result['requests'], result['errors'],
+                        result['rps'], result['p50_ms'], result['p99_ms']))
+        finally:
+            loop.close()
@@ -0,0 +1,43 @@
+"""Management command that recomputes the inventory summary tables"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from founditapi import jobs
+from founditapi.caching import bump
+from founditapi.models import Organizer
+from founditapi.summaries import rebuild
+
+
+class Command(BaseCommand):
+    """Rebuilds CategorySummary and LocationSummary from the items
+
+    The summaries are kept up to date as items change, so this is only
+    needed after writes that bypass the model (raw SQL, QuerySet.update)
+    or to check for drift.
+    """
+
+    help = 'Recompute per-organizer inventory summaries from the items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', nargs='?', help='Only rebuild this user\'s organizer')
+        parser.add_argument('--background', action='store_true', help='Queue a job for run_workers instead')
+
+    def handle(self, *args, **options):
+        organizer = None
+        if options['username']:
+            try:
+                organizer = Organizer.objects.get(user__username=options['username'])
+            except Organizer.DoesNotExist:
+                raise CommandError('No organizer for user "%s"' % options['username'])
+
+        if options['background']:
+            job = jobs.enqueue('rebuild_summaries', organizer_id=organizer.pk if organizer else None)
+            self.stdout.write('Queued job %d' % job.pk)
+            return
+
+        started = time.perf_counter()
+        categories, locations = rebuild(organizer)
+        for pk in [organizer.pk] if organizer else Organizer.objects.values_list('pk', flat=True):
+            bump(Organizer(pk=pk), 'organizer')
+
+        self.stdout.write('Wrote %d category and %d location summaries in %.2fs' % (
+            categories, locations, time.perf_counter() - started))
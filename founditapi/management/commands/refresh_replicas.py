@@ -0,0 +1,51 @@
+"""Management command that copies the SQLite primary into its replica files"""
+import sqlite3
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from founditapi.routing import replicas
+
+
+def replica_path(alias):
+    """The file behind a replica alias, whose NAME is a read-only `file:` URI"""
+    name = settings.DATABASES[alias]['NAME']
+    return name[len('file:'):].split('?')[0] if name.startswith('file:') else name
+
+
+class Command(BaseCommand):
+    """Refreshes the SQLite files standing in for read replicas
+
+    SQLite has no replication, so to try FOUNDIT_DB_REPLICAS out locally
+    each replica file is a copy of the primary taken with SQLite's backup
+    API, which is safe while the primary is being written to and while
+    replicas are being read. Run it again, or in a loop, to bring the
+    replicas up to date; the time between runs is their lag.
+    """
+
+    help = 'Copy the SQLite database into the replica files named by FOUNDIT_DB_REPLICAS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, default=0,
+                            help='Keep refreshing, this many seconds apart')
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Replicas can only be refreshed from a SQLite primary')
+        if not replicas():
+            raise CommandError('FOUNDIT_DB_REPLICAS names no replicas')
+
+        while True:
+            started = time.perf_counter()
+            primary.ensure_connection()
+            for alias in replicas():
+                target = sqlite3.connect(replica_path(alias))
+                try:
+                    primary.connection.backup(target)
+                finally:
+                    target.close()
+            self.stdout.write('Refreshed %d replicas in %.2fs' % (len(replicas()), time.perf_counter() - started))
+            if options['every'] <= 0:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,42 @@
+"""Management command that runs background jobs"""
+import multiprocessing
+from django.core.management.base import BaseCommand
+from django.db import connections
+from founditapi.jobs import Worker
+
+
+class Command(BaseCommand):
+    """Runs queued jobs until stopped
+
+    Each process runs --threads jobs at once. Threads suit jobs that wait
+    on the database; more processes help with CPU bound ones such as
+    exports. Any number of these commands can run against one database.
+    """
+
+    help = 'Run queued background jobs on a pool of threads and processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=2, help='Jobs run at once by each process')
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            self.work(options)
+            return
+
+        # Forked processes must open database connections of their own
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=self.work, args=(options,)) for _ in range(options['processes'])]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.join()
+
+    def work(self, options):
+        Worker(threads=max(options['threads'], 1), once=options['once'], log=self.stdout.write).run()
@@ -0,0 +1,101 @@
+"""In-memory request metrics rendered in the Prometheus text format"""
+import threading
+from bisect import bisect_left
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+
+class Histogram:
+    """A Prometheus histogram with one series per label set
+
+    Arguments:
+        name -- Metric name
+        documentation -- HELP text
+        buckets -- Upper bounds of the buckets, ascending
+    """
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.series = dict()
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation), '# TYPE %s histogram' % self.name]
+        with self.lock:
+            for labels, (counts, total, count) in sorted(self.series.items()):
+                label_text = format_labels(labels)
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append('%s_bucket{%s} %d' % (self.name, join_labels(label_text, 'le="%s"' % bound), cumulative))
+                lines.append('%s_bucket{%s} %d' % (self.name, join_labels(label_text, 'le="+Inf"'), count))
+                lines.append('%s_sum{%s} %r' % (self.name, label_text, total))
+                lines.append('%s_count{%s} %d' % (self.name, label_text, count))
+        return lines
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels):
+    """Formats a tuple of (name, value) pairs as a Prometheus label list"""
+    return ','.join('%s="%s"' % (name, escape(value)) for name, value in labels)
+
+
+def join_labels(*parts):
+    return ','.join(part for part in parts if part)
+
+
+request_duration = Histogram(
+    'foundit_request_duration_seconds', 'Wall time spent handling a request.', LATENCY_BUCKETS)
+db_queries = Histogram(
+    'foundit_db_queries', 'Database queries issued while handling a request.', QUERY_BUCKETS)
+db_duration = Histogram(
+    'foundit_db_duration_seconds', 'Time spent waiting on the database while handling a request.', LATENCY_BUCKETS)
+render_duration = Histogram(
+    'foundit_render_duration_seconds', 'Time spent rendering the response body.', LATENCY_BUCKETS)
+
+HISTOGRAMS = (request_duration, db_queries, db_duration, render_duration)
+
+
+def render_cache_stats(snapshot):
+    """Renders founditapi.caching stats as Prometheus counters"""
+    lines = [
+        '# HELP foundit_response_cache_requests_total Conditional endpoint requests by outcome.',
+        '# TYPE foundit_response_cache_requests_total counter',
+    ]
+    for endpoint, report in sorted(snapshot.items()):
+        for outcome in ('hit', 'miss', 'not_modified'):
+            lines.append('foundit_response_cache_requests_total{%s} %d' % (
+                format_labels((('endpoint', endpoint), ('outcome', outcome))), report[outcome]))
+    return lines
+
+
+def render(cache_snapshot=None):
+    """Returns every metric in the Prometheus text exposition format"""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    if cache_snapshot is not None:
+        lines.extend(render_cache_stats(cache_snapshot))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,124 @@
+"""Middleware for Found It! request profiling"""
+import cProfile
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from founditapi import metrics
+
+
+class QueryCounter:
+    """execute_wrapper hook that counts queries and the time spent in them
+
+    One counter may be installed on several threads' connections at once,
+    as the ASGI handlers do when they gather lookups.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.count += 1
+                self.seconds += elapsed
+
+
+class RequestProfile:
+    """When a request started, its queries and the time spent rendering it
+
+    ProfilingMiddleware creates one per request. founditapi.asgi creates
+    it before running a view outside the middleware chain, so the view's
+    time, queries and rendering are recorded with the rest of the request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.counter = QueryCounter()
+        self.render_seconds = 0.0
+
+
+class ProfilingMiddleware:
+    """Records wall time, DB queries, DB time and render time for every view
+
+    Observations go into the histograms in founditapi.metrics, labelled by
+    the resolved view name and HTTP method, and are served at /metrics.
+    Requests the ASGI handlers answer arrive with `request.profile`
+    already holding their view's share.
+
+    With FOUNDIT_PROFILING['SAMPLE_RATE'] above zero, that share of requests
+    also runs under cProfile. Requests slower than THRESHOLD_MS have their
+    stats dumped to DIRECTORY for inspection with pstats or snakeviz.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        options = getattr(settings, 'FOUNDIT_PROFILING', {})
+        self.sample_rate = options.get('SAMPLE_RATE', 0.0)
+        self.threshold = options.get('THRESHOLD_MS', 500) / 1000
+        self.directory = options.get('DIRECTORY', os.path.join(settings.BASE_DIR, 'profiles'))
+
+    def __call__(self, request):
+        profile = getattr(request, 'profile', None)
+        if profile is None:
+            profile = request.profile = RequestProfile()
+        counter = profile.counter
+        profiler = cProfile.Profile() if self.sample_rate and random.random() < self.sample_rate else None
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        elapsed = time.perf_counter() - profile.started
+
+        labels = (('view', self.view_name(request)), ('method', request.method))
+        metrics.request_duration.observe(labels, elapsed)
+        metrics.db_queries.observe(labels, counter.count)
+        metrics.db_duration.observe(labels, counter.seconds)
+        metrics.render_duration.observe(labels, profile.render_seconds)
+
+        if profiler is not None and elapsed >= self.threshold:
+            self.dump(profiler, labels[0][1], elapsed)
+
+        return response
+
+    def process_template_response(self, request, response):
+        """Times DRF's rendering of the response body, which happens after the view returns"""
+        render = response.render
+
+        def timed_render():
+            started = time.perf_counter()
+            try:
+                return render()
+            finally:
+                request.profile.render_seconds += time.perf_counter() - started
+
+        response.render = timed_render
+        return response
+
+    def view_name(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unresolved'
+        return match.view_name or match._func_path
+
+    def dump(self, profiler, view_name, elapsed):
+        os.makedirs(self.directory, exist_ok=True)
+        filename = '%s-%s-%dms.prof' % (
+            time.strftime('%Y%m%d-%H%M%S'), view_name.replace('/', '_'), elapsed * 1000)
+        profiler.dump_stats(os.path.join(self.directory, filename))
@@ -0,0 +1,36 @@
+from django.db import migrations, OperationalError
+
+
+def create_search_table(apps, schema_editor):
+    """Creates the FTS5 search table on SQLite builds that have the trigram tokenizer
+
+    Other databases use the in-process index in founditapi.search instead.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE founditapi_item_search "
+                "USING fts5(name, description, location, organizer, tokenize='trigram')")
+        except OperationalError:
+            return
+        cursor.execute(
+            "INSERT INTO founditapi_item_search (rowid, name, description, location, organizer) "
+            "SELECT id, name, description, location, '<' || organizer_id || '>' FROM founditapi_item")
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS founditapi_item_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('founditapi', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
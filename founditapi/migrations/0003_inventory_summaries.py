@@ -0,0 +1,61 @@
+# Generated by Django 2.2.6 on 2026-10-18 12:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_summaries(apps, schema_editor):
+    """Totals the existing items into the new summary tables"""
+    Item = apps.get_model('founditapi', 'Item')
+    for model_name, field in (('CategorySummary', 'category_id'), ('LocationSummary', 'location')):
+        model = apps.get_model('founditapi', model_name)
+        rows = Item.objects.values('organizer_id', field).annotate(
+            total_items=models.Count('id'),
+            total_quantity=models.Sum('quantity'),
+            total_out_of_stock=models.Count('id', filter=models.Q(quantity__lte=0)),
+        ).order_by()
+        model.objects.bulk_create([
+            model(organizer_id=row['organizer_id'], item_count=row['total_items'],
+                  quantity=row['total_quantity'] or 0, out_of_stock=row['total_out_of_stock'],
+                  **{field: row[field]})
+            for row in rows
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('founditapi', '0002_item_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location', models.CharField(max_length=100)),
+                ('item_count', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('out_of_stock', models.IntegerField(default=0)),
+                ('organizer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='location_summaries', to='founditapi.Organizer')),
+            ],
+            options={
+                'unique_together': {('organizer', 'location')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CategorySummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_count', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('out_of_stock', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='summaries', to='founditapi.Category')),
+                ('organizer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_summaries', to='founditapi.Organizer')),
+            ],
+            options={
+                'unique_together': {('organizer', 'category')},
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('founditapi', '0003_inventory_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 2.2.6 on 2026-10-18 12:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_organizers(apps, schema_editor):
+    """Copies each existing tag's organizer from its item and drops duplicate tags"""
+    CategoryItem = apps.get_model('founditapi', 'CategoryItem')
+    seen = set()
+    duplicates = []
+    for pk, item_id, category_id, organizer_id in CategoryItem.objects.order_by('id').values_list(
+            'id', 'item_id', 'category_id', 'item__organizer_id'):
+        if (item_id, category_id) in seen:
+            duplicates.append(pk)
+            continue
+        seen.add((item_id, category_id))
+        CategoryItem.objects.filter(pk=pk).update(organizer_id=organizer_id)
+    CategoryItem.objects.filter(pk__in=duplicates).delete()
+
+
+def tag_own_categories(apps, schema_editor):
+    """Tags every existing item with its own category"""
+    Item = apps.get_model('founditapi', 'Item')
+    CategoryItem = apps.get_model('founditapi', 'CategoryItem')
+    rows = Item.objects.order_by('id').values_list('organizer_id', 'id', 'category_id').iterator(chunk_size=2000)
+    batch = []
+    for organizer_id, item_id, category_id in rows:
+        batch.append(CategoryItem(organizer_id=organizer_id, item_id=item_id, category_id=category_id))
+        if len(batch) >= 2000:
+            CategoryItem.objects.bulk_create(batch, batch_size=300, ignore_conflicts=True)
+            batch = []
+    CategoryItem.objects.bulk_create(batch, batch_size=300, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('founditapi', '0004_item_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoryitem',
+            name='organizer',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tags', to='founditapi.Organizer'),
+        ),
+        migrations.RunPython(fill_organizers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='categoryitem',
+            name='organizer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tags', to='founditapi.Organizer'),
+        ),
+        migrations.AlterField(
+            model_name='categoryitem',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tags', to='founditapi.Category'),
+        ),
+        migrations.AlterField(
+            model_name='categoryitem',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tags', to='founditapi.Item'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='categoryitem',
+            unique_together={('item', 'category')},
+        ),
+        migrations.AddIndex(
+            model_name='categoryitem',
+            index=models.Index(fields=['organizer', 'category', 'item'], name='tag_organizer_category_idx'),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='categories',
+            field=models.ManyToManyField(related_name='tagged_items', through='founditapi.CategoryItem', to='founditapi.Category'),
+        ),
+        migrations.RunPython(tag_own_categories, migrations.RunPython.noop),
+    ]
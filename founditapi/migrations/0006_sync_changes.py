@@ -0,0 +1,49 @@
+# Generated by Django 2.2.6 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+def fill_updated_at(apps, schema_editor):
+    """Starts existing items' updated_at at their created_at where they have one"""
+    Item = apps.get_model('founditapi', 'Item')
+    Item.objects.filter(created_at__isnull=False).update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('founditapi', '0005_item_tags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('organizer_id', models.IntegerField(null=True)),
+                ('kind', models.CharField(choices=[('item', 'Item'), ('category', 'Category')], max_length=10)),
+                ('object_id', models.IntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['organizer_id', 'id'], name='change_organizer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['kind', 'object_id', 'id'], name='change_object_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+
+def create_word_tables(apps, schema_editor):
+    """Creates the vocabulary founditapi.search corrects typos against
+
+    Only where migration 0002 created the FTS5 search table; the in-process
+    index keeps its own vocabulary.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or 'founditapi_item_search' not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TABLE founditapi_item_word ("
+            "id integer NOT NULL PRIMARY KEY, organizer text NOT NULL, word text NOT NULL, "
+            "UNIQUE (organizer, word))")
+        cursor.execute(
+            "CREATE VIRTUAL TABLE founditapi_item_word_search "
+            "USING fts5(word, organizer, content='founditapi_item_word', content_rowid='id', tokenize='trigram')")
+        cursor.execute(
+            "CREATE TRIGGER founditapi_item_word_added AFTER INSERT ON founditapi_item_word BEGIN "
+            "INSERT INTO founditapi_item_word_search (rowid, word, organizer) "
+            "VALUES (new.id, new.word, new.organizer); END")
+
+        Item = apps.get_model('founditapi', 'Item')
+        words = set()
+        for organizer_id, name, description, location in Item.objects.values_list(
+                'organizer_id', 'name', 'description', 'location').iterator():
+            organizer = '<%d>' % organizer_id
+            words.update((organizer, word) for word in ' '.join((name, description, location)).lower().split())
+        cursor.executemany(
+            'INSERT INTO founditapi_item_word (organizer, word) VALUES (%s, %s)', sorted(words))
+
+
+def drop_word_tables(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS founditapi_item_word_search')
+        schema_editor.execute('DROP TABLE IF EXISTS founditapi_item_word')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('founditapi', '0007_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_word_tables, drop_word_tables),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.6 on 2026-10-18 13:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('founditapi', '0008_item_words'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='categoryitem',
+            index=models.Index(fields=['organizer', 'id'], name='tag_organizer_id_idx'),
+        ),
+    ]
@@ -1,4 +1,7 @@
 from .category import Category
 from .item import Item
 from .categoryitem import CategoryItem
-from .organizer import Organizer
\ No newline at end of file
+from .organizer import Organizer
+from .summary import CategorySummary, LocationSummary
+from .change import Change
+from .job import Job
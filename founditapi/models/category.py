@@ -11,12 +11,12 @@ from django.db import models
 class Category(models.Model):
 
     name = models.CharField(max_length=50)
-    __organizer_items = list()
+    updated_at = models.DateTimeField(auto_now=True)
 
     @property
     def organizer_items(self):
-        return self.__organizer_items
+        return getattr(self, '_organizer_items', [])
 
     @organizer_items.setter
     def organizer_items(self, value):
-        self.__organizer_items = value
\ No newline at end of file
+        self._organizer_items = value
\ No newline at end of file
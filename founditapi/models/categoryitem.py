@@ -10,6 +10,23 @@ Method: None
 
 """
 class CategoryItem(models.Model):
+    """Tags an item with a category
 
-    item = models.ForeignKey("Item", on_delete=models.CASCADE)
-    category = models.ForeignKey(Category, on_delete=models.CASCADE)
\ No newline at end of file
+    Every item is also tagged with its own category, kept in step by
+    founditapi.tagging, so category filters only need to read this table.
+    The organizer is copied from the item so those reads stay within one
+    organizer's part of the index.
+    """
+
+    organizer = models.ForeignKey("Organizer", on_delete=models.CASCADE, related_name='tags')
+    item = models.ForeignKey("Item", on_delete=models.CASCADE, related_name='tags')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='tags')
+
+    class Meta:
+        unique_together = (('item', 'category'),)
+        # Category filters read an organizer's tags in a category, and
+        # founditapi.tagging reads their tags newer than the last it applied
+        indexes = [
+            models.Index(fields=['organizer', 'category', 'item'], name='tag_organizer_category_idx'),
+            models.Index(fields=['organizer', 'id'], name='tag_organizer_id_idx'),
+        ]
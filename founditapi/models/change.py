@@ -0,0 +1,32 @@
+from django.db import models
+
+"""
+Purpose: One write to an item or category, recorded by founditapi.sync
+so clients can ask what changed since their last poll. Rows are compacted
+to the latest change per object. This model maps to the Change table.
+Method: None
+
+"""
+
+class Change(models.Model):
+
+    ITEM = 'item'
+    CATEGORY = 'category'
+    KINDS = ((ITEM, 'Item'), (CATEGORY, 'Category'))
+
+    # None for categories, which every organizer sees. Not a foreign key,
+    # since deleting an organizer deletes its items, which records changes
+    # for it; those rows are dropped by compaction like any other.
+    organizer_id = models.IntegerField(null=True)
+    kind = models.CharField(max_length=10, choices=KINDS)
+    object_id = models.IntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # The feed reads an organizer's changes after an id; compaction
+        # looks for later changes to the same object.
+        indexes = [
+            models.Index(fields=['organizer_id', 'id'], name='change_organizer_idx'),
+            models.Index(fields=['kind', 'object_id', 'id'], name='change_object_idx'),
+        ]
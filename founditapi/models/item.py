@@ -19,4 +19,20 @@ class Item(models.Model):
     quantity = models.IntegerField()
     location = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True, blank=True, null=True)
-    category = models.ForeignKey(Category, on_delete=models.DO_NOTHING, related_name='items')
\ No newline at end of file
+    updated_at = models.DateTimeField(auto_now=True)
+    category = models.ForeignKey(Category, on_delete=models.DO_NOTHING, related_name='items')
+    # Incremented by every quantity change, for optimistic concurrency
+    version = models.IntegerField(default=0)
+    # The item's own category and any it is tagged with
+    categories = models.ManyToManyField(Category, through='CategoryItem', related_name='tagged_items')
+
+    class Meta:
+        # Every item query is scoped to one organizer, so each index leads
+        # with organizer and follows the filter or ordering the views use.
+        indexes = [
+            models.Index(fields=['organizer', 'category'], name='item_organizer_category_idx'),
+            models.Index(fields=['organizer', 'name'], name='item_organizer_name_idx'),
+            models.Index(fields=['organizer', 'created_at', 'id'], name='item_organizer_created_idx'),
+            models.Index(fields=['organizer', 'category'], name='item_in_stock_idx',
+                         condition=models.Q(quantity__gt=0)),
+        ]
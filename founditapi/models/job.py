@@ -0,0 +1,43 @@
+from django.db import models
+from django.contrib.auth.models import User
+
+"""
+Purpose: One unit of background work, such as an inventory export or an
+organizer deletion, queued by a request and run by `manage.py run_workers`.
+This model maps to the Job table.
+Method: None
+
+"""
+
+class Job(models.Model):
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUSES = ((QUEUED, 'Queued'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed'))
+
+    kind = models.CharField(max_length=50)
+    # Who queued the job, and so may see it
+    user = models.ForeignKey(User, null=True, on_delete=models.SET_NULL, related_name='jobs')
+    # JSON, like result
+    arguments = models.TextField(default='{}')
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    run_after = models.DateTimeField()
+    progress = models.IntegerField(default=0)
+    total = models.IntegerField(null=True)
+    result = models.TextField(null=True)
+    error = models.TextField(blank=True, default='')
+    worker = models.CharField(max_length=100, blank=True, default='')
+    heartbeat_at = models.DateTimeField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        # Workers look for the oldest due job; the status filter also
+        # finds running jobs whose worker stopped sending heartbeats.
+        indexes = [
+            models.Index(fields=['status', 'run_after', 'id'], name='job_due_idx'),
+        ]
@@ -0,0 +1,34 @@
+from django.db import models
+from .category import Category
+from .organizer import Organizer
+
+"""
+Purpose: Running totals of an organizer's items, kept up to date by
+founditapi.summaries so inventory questions don't walk Item rows.
+These models map to the CategorySummary and LocationSummary tables.
+Method: None
+
+"""
+
+class CategorySummary(models.Model):
+
+    organizer = models.ForeignKey(Organizer, on_delete=models.CASCADE, related_name='category_summaries')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='summaries')
+    item_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    out_of_stock = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (('organizer', 'category'),)
+
+
+class LocationSummary(models.Model):
+
+    organizer = models.ForeignKey(Organizer, on_delete=models.CASCADE, related_name='location_summaries')
+    location = models.CharField(max_length=100)
+    item_count = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    out_of_stock = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (('organizer', 'location'),)
@@ -0,0 +1,126 @@
+"""Pagination classes for Found It! list endpoints"""
+import base64
+import json
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Forward-only keyset pagination ordered by (created_at, id)
+
+    The cursor is the position of the last row on the previous page, so each
+    page is a range scan on the ordering columns instead of an OFFSET that
+    grows with the page number. Rows with no created_at sort where the
+    database puts NULLs, and the cursor predicate follows the same rule.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 1000
+    ordering = ('created_at', 'id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Returns the ordered queryset for one page, plus one lookahead row"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.position = self.decode_cursor(request)
+        self.nulls_largest = connections[queryset.db].features.nulls_order_largest
+
+        if self.position is not None:
+            queryset = queryset.filter(self.after_position(*self.position))
+
+        return queryset.order_by(*self.ordering)[:self.page_size + 1]
+
+    def get_paginated_response(self, data):
+        """Trims the lookahead row and links to the next page if there is one"""
+        data = list(data)
+        next_url = None
+        if len(data) > self.page_size:
+            data = data[:self.page_size]
+            last = data[-1]
+            next_url = self.encode_cursor(*(last[field] for field in self.ordering))
+
+        return Response({'next': next_url, 'results': data})
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def after_position(self, created_at, pk):
+        """Builds the predicate for rows sorting strictly after a cursor"""
+        if created_at is None:
+            after = Q(created_at__isnull=True, id__gt=pk)
+            if not self.nulls_largest:
+                after |= Q(created_at__isnull=False)
+            return after
+
+        after = Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+        if self.nulls_largest:
+            after |= Q(created_at__isnull=True)
+        return after
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            created_at, pk = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+            pk = int(pk)
+            if created_at is not None:
+                created_at = parse_datetime(created_at)
+                if created_at is None:
+                    raise ValueError(created_at)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return created_at, pk
+
+    def encode_cursor(self, created_at, pk):
+        if created_at is not None:
+            created_at = created_at.isoformat()
+        position = json.dumps([created_at, pk]).encode('ascii')
+        encoded = base64.urlsafe_b64encode(position).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+
+class IdKeysetPagination(KeysetPagination):
+    """Forward-only keyset pagination ordered by id, for tables without created_at
+
+    Each page is a primary key range scan, so fetching it costs the same
+    however many rows come before it, and no COUNT(*) is run.
+    """
+
+    ordering = ('id',)
+
+    def after_position(self, pk):
+        return Q(id__gt=pk)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            pk = int(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return (pk,)
+
+    def encode_cursor(self, pk):
+        encoded = base64.urlsafe_b64encode(str(pk).encode('ascii')).decode('ascii')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
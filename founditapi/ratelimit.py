@@ -0,0 +1,88 @@
+"""In-memory sliding-window counters for throttling repeated failures"""
+import threading
+import time
+from collections import OrderedDict, deque
+from django.conf import settings
+
+
+class SlidingWindow:
+    """Counts events per key over the last `window` seconds
+
+    Each key keeps the timestamps of its recent events, so the limit
+    applies to any `window`-long span rather than to fixed buckets. Keys
+    are evicted least recently used first beyond `max_keys`, which bounds
+    memory when many different keys fail once.
+
+    Arguments:
+        limit -- Events allowed per key within the window
+        window -- Window length in seconds
+        max_keys -- Keys tracked at once
+    """
+
+    def __init__(self, limit, window, max_keys=10000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.keys = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _events(self, key, now):
+        events = self.keys.get(key)
+        if events is None:
+            return None
+        while events and events[0] <= now - self.window:
+            events.popleft()
+        if not events:
+            del self.keys[key]
+            return None
+        return events
+
+    def retry_after(self, key):
+        """Seconds until `key` is under its limit again, or 0 if it is now"""
+        now = time.monotonic()
+        with self.lock:
+            events = self._events(key, now)
+            if events is None or len(events) < self.limit:
+                return 0
+            return max(events[-self.limit] + self.window - now, 0)
+
+    def hit(self, key):
+        """Records one event for `key`"""
+        now = time.monotonic()
+        with self.lock:
+            events = self._events(key, now)
+            if events is None:
+                events = self.keys[key] = deque()
+            else:
+                self.keys.move_to_end(key)
+            events.append(now)
+            while len(self.keys) > self.max_keys:
+                self.keys.popitem(last=False)
+
+    def reset(self, key):
+        with self.lock:
+            self.keys.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+
+
+_login_limiters = None
+
+
+def get_login_limiters():
+    """Returns the process-wide (per username, per address) failed login windows
+
+    Sized by FOUNDIT_LOGIN_RATE_LIMIT. Each process counts on its own, so
+    with several workers an attacker gets up to that many times the limit.
+    """
+    global _login_limiters
+    if _login_limiters is None:
+        options = getattr(settings, 'FOUNDIT_LOGIN_RATE_LIMIT', {})
+        window = options.get('WINDOW', 300)
+        _login_limiters = (
+            SlidingWindow(options.get('FAILURES', 5), window),
+            SlidingWindow(options.get('ADDRESS_FAILURES', 50), window),
+        )
+    return _login_limiters
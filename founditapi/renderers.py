@@ -0,0 +1,75 @@
+"""Response renderers and request parsers beyond DRF's JSON
+
+orjson and msgpack are in requirements.txt but optional at runtime.
+Without orjson the JSON renderer falls back to DRF's encoder, and the
+MessagePack classes are only listed in REST_FRAMEWORK when msgpack is
+installed.
+"""
+from django.conf import settings
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def use_orjson():
+    return orjson is not None and getattr(settings, 'FOUNDIT_JSON_ENCODER', 'orjson') == 'orjson'
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """DRF's JSON renderer, encoding with orjson when it is available
+
+    The output matches DRF's compact, unescaped UTF-8 JSON, UTC datetimes
+    ending in Z included. Types orjson doesn't know (Decimal, lazy
+    strings and so on) go through DRF's encoder, and indented output,
+    which orjson only does at two spaces, is left to DRF altogether.
+    """
+
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not use_orjson() or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=self.encoder.default,
+                            option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """Renders MessagePack for `Accept: application/msgpack` or `?format=msgpack`
+
+    Datetimes and other types msgpack doesn't know are encoded as DRF's
+    JSON encoder would, so both formats carry the same values.
+    """
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self.encoder.default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    """Parses MessagePack request bodies sent as application/msgpack"""
+
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, strict_map_key=False)
+        except ValueError as ex:
+            raise ParseError('MessagePack parse error - %s' % (str(ex) or type(ex).__name__))
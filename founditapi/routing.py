@@ -0,0 +1,178 @@
+"""Sends reads to database replicas and writes to the primary
+
+FOUNDIT_DB_ROUTING['REPLICAS'] names DATABASES aliases that replicate
+'default'. During a request ReplicaRouter sends reads to one of them,
+chosen in turn and kept for the whole request, and everything else to
+'default'. Reads stay on the primary:
+
+- outside requests (management commands, the shell, signal receivers run
+  by them), where nothing says a replica's lag is acceptable;
+- for the whole of requests that write, so a read-modify-write sees its
+  own rows;
+- for STICKY_SECONDS after an organizer's write succeeded, so its next
+  requests see the write while the replicas catch up. The window lives
+  in the cache holding version stamps (see founditapi.caching), so it
+  holds across worker processes;
+- for STICKY_SECONDS after a write to any version scope the request
+  depends on, so a response built from a lagging replica is never cached
+  or given an ETag under the version that should already include it.
+
+A replica that can't be connected to is skipped for RETRY_SECONDS, and
+when none is left reads fall back to the primary.
+
+The route is kept in a context variable rather than a thread local, so
+founditapi.asgi can carry it onto its pool threads.
+"""
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from founditapi import caching
+
+
+_route = contextvars.ContextVar('foundit_route', default=None)
+_turns = itertools.count()
+_down = dict()
+_down_lock = threading.Lock()
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def get_options():
+    return getattr(settings, 'FOUNDIT_DB_ROUTING', {})
+
+
+def replicas():
+    return get_options().get('REPLICAS', ())
+
+
+class Route:
+    """Where the current request's reads go"""
+
+    def __init__(self, primary):
+        self.primary = primary
+        self.replica = None
+        self.organizer_id = None
+
+
+def begin(method):
+    """Starts routing a request's reads; returns a token for end()"""
+    if not replicas():
+        return None
+    return _route.set(Route(primary=method not in SAFE_METHODS))
+
+
+def end(token):
+    if token is not None:
+        _route.reset(token)
+
+
+def sticky_key(organizer_id):
+    return 'foundit-sticky:organizer:%s' % organizer_id
+
+
+def set_organizer(organizer_id):
+    """Pins the request's reads to the primary if the organizer wrote recently"""
+    route = _route.get()
+    if route is None or organizer_id is None:
+        return
+    route.organizer_id = organizer_id
+    if not route.primary and caching.get_cache().get(sticky_key(organizer_id)) is not None:
+        route.primary = True
+
+
+def stick(organizer_id):
+    """Keeps the organizer's reads on the primary for STICKY_SECONDS"""
+    seconds = get_options().get('STICKY_SECONDS', 5)
+    if organizer_id is not None and seconds > 0:
+        caching.get_cache().set(sticky_key(organizer_id), True, seconds)
+
+
+def check_versions(versions):
+    """Pins the request's reads to the primary if any version stamp is younger than STICKY_SECONDS"""
+    route = _route.get()
+    if route is None or route.primary or not versions:
+        return
+    if time.time_ns() - max(versions) < get_options().get('STICKY_SECONDS', 5) * 10 ** 9:
+        route.primary = True
+
+
+@contextmanager
+def primary():
+    """Reads from the primary inside the block, e.g. to retry a lookup a replica may lack"""
+    route = _route.get()
+    if route is None:
+        yield
+        return
+    previous, route.primary = route.primary, True
+    try:
+        yield
+    finally:
+        route.primary = previous
+
+
+def mark_down(alias):
+    with _down_lock:
+        _down[alias] = time.monotonic() + get_options().get('RETRY_SECONDS', 30)
+
+
+def choose_replica():
+    """Returns the next replica that accepts a connection, or the primary when none does"""
+    now = time.monotonic()
+    available = [alias for alias in replicas() if _down.get(alias, 0) <= now]
+    if not available:
+        return DEFAULT_DB_ALIAS
+    start = next(_turns)
+    for offset in range(len(available)):
+        alias = available[(start + offset) % len(available)]
+        try:
+            connections[alias].ensure_connection()
+            return alias
+        except DatabaseError:
+            mark_down(alias)
+    return DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    """Database router for a primary ('default') and its read replicas"""
+
+    def db_for_read(self, model, **hints):
+        route = _route.get()
+        if route is None or route.primary:
+            return DEFAULT_DB_ALIAS
+        if route.replica is None:
+            route.replica = choose_replica()
+        return route.replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema from the primary
+        return db == DEFAULT_DB_ALIAS
+
+
+class RoutingMiddleware:
+    """Routes each request's reads and starts the sticky window after a successful write"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = begin(request.method)
+        try:
+            response = self.get_response(request)
+            route = _route.get()
+            if route is not None and request.method not in SAFE_METHODS and response.status_code < 400:
+                organizer = getattr(request, 'organizer', None)
+                stick(organizer.pk if organizer is not None else route.organizer_id)
+            return response
+        finally:
+            end(token)
@@ -0,0 +1,436 @@
+"""Ranked, typo-tolerant search over item names, descriptions and locations
+
+Candidates come from a per-organizer index: an SQLite FTS5 table using
+the trigram tokenizer when the database supports it, otherwise an
+in-process inverted index built lazily for each organizer. Both keep the
+organizer's vocabulary, the distinct words of its items, and look up a
+query word's spellings there by trigram overlap, so typos are corrected
+against a few thousand words rather than matched against every item.
+Candidates are then scored by trigram overlap with the query, so prefixes
+("cumi") and small typos ("cumni") still find "Cumin".
+"""
+import heapq
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from founditapi.bulk import items_bulk_created
+from founditapi.models import Item
+
+
+SEARCH_TABLE = 'founditapi_item_search'
+# The vocabulary: distinct (organizer, word) pairs, and an FTS5 trigram index over them
+WORD_TABLE = 'founditapi_item_word'
+WORD_SEARCH_TABLE = 'founditapi_item_word_search'
+
+# How much a match in each field counts towards an item's score, in the
+# order the fields are stored and fetched in
+FIELD_WEIGHTS = (('name', 1.0), ('description', 0.6), ('location', 0.8))
+
+MIN_SCORE = 0.35
+CANDIDATES = 200
+# Vocabulary words a query word may stand for
+SPELLINGS = 16
+
+_local = threading.local()
+
+
+def word_trigrams(text):
+    """Returns the trigrams of each word padded with spaces, so word starts and ends count"""
+    grams = set()
+    for word in text.lower().split():
+        padded = ' %s ' % word
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def item_words(name, description, location):
+    """Returns the distinct words of an item's searchable text"""
+    return set(' '.join((name or '', description or '', location or '')).lower().split())
+
+
+def spellings(word, words):
+    """Picks the words that share enough of `word`'s trigrams to stand for it, best first
+
+    Arguments:
+        word -- A query word
+        words -- Counter of vocabulary words by the number of trigrams they share with it
+    """
+    grams = len(word_trigrams(word))
+    return [spelling for spelling, shared in words.most_common(SPELLINGS) if shared / grams >= MIN_SCORE]
+
+
+def score(query_grams, fields, hits):
+    """Scores an item by the share of query trigrams found in its best field
+
+    Arguments:
+        query_grams -- word_trigrams() of the query
+        fields -- The item's name, description and location
+        hits -- Dict caching each word's trigrams in common with the query,
+                shared by every item ranked for one query
+    """
+    best = 0.0
+    for (field, weight), text in zip(FIELD_WEIGHTS, fields):
+        found = set()
+        for word in (text or '').lower().split():
+            word_hits = hits.get(word)
+            if word_hits is None:
+                word_hits = hits[word] = query_grams & word_trigrams(word)
+            found |= word_hits
+        best = max(best, weight * len(found) / len(query_grams))
+    return best
+
+
+def rank(query, documents, limit):
+    """Scores candidate (id, name, description, location) rows and keeps the best
+
+    Returns:
+        list -- (item id, score) pairs, best first
+    """
+    query_grams = word_trigrams(query)
+    if not query_grams:
+        return []
+    hits = dict()
+    scored = []
+    for pk, *fields in documents:
+        item_score = score(query_grams, fields, hits)
+        if item_score >= MIN_SCORE:
+            scored.append((pk, round(item_score, 3)))
+    scored.sort(key=lambda result: (-result[1], result[0]))
+    return scored[:limit]
+
+
+def quote(term):
+    """Quotes a term as an FTS5 string, which the trigram tokenizer matches as a substring"""
+    return '"%s"' % term.replace('"', '""')
+
+
+def merge(results, more, limit):
+    """Adds results not already present, keeping the best first"""
+    seen = {pk for pk, _ in results}
+    merged = results + [result for result in more if result[0] not in seen]
+    merged.sort(key=lambda result: (-result[1], result[0]))
+    return merged[:limit]
+
+
+class FTSIndex:
+    """Search index stored in SQLite FTS5 trigram tables
+
+    The tables are created by migrations 0002 and 0008. The item table
+    holds each item's text columns plus an `organizer` column of the form
+    "<id>", which lets the MATCH expression restrict candidates to one
+    organizer; the word tables hold each organizer's vocabulary the same
+    way. Words are never removed from the vocabulary, as a word no item
+    uses any more only costs a spelling that matches nothing.
+    """
+
+    def search(self, organizer_id, query, limit):
+        words = [word for word in query.lower().split() if len(word) >= 3]
+        if not words:
+            return self.search_short(organizer_id, query, limit)
+
+        # Items containing every word as a substring are found without ranking
+        # the whole table; spellings are only looked up for typos, and items
+        # with only some of the words only when those are still too few.
+        strict = ' AND '.join(quote(word) for word in words)
+        results = rank(query, self.candidates(organizer_id, strict), limit)
+        if len(results) < limit:
+            corrected = [self.spellings(organizer_id, word) for word in words]
+            corrected = ['(%s)' % ' OR '.join(quote(spelling) for spelling in spelled)
+                         for spelled in corrected if spelled]
+            expressions = [' AND '.join(corrected)] if corrected else []
+            if len(corrected) > 1:
+                expressions.append(' OR '.join(corrected))
+            for expression in expressions:
+                if len(results) < limit:
+                    results = merge(results, rank(query, self.candidates(organizer_id, expression), limit), limit)
+        return results
+
+    def candidates(self, organizer_id, expression):
+        match = 'organizer : "<%d>" AND {name description location} : (%s)' % (organizer_id, expression)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid, name, description, location FROM %s WHERE %s MATCH %%s LIMIT %d'
+                % (SEARCH_TABLE, SEARCH_TABLE, CANDIDATES),
+                [match])
+            return cursor.fetchall()
+
+    def spellings(self, organizer_id, word):
+        """Looks up the organizer's words that `word` may be a prefix, part or misspelling of"""
+        grams = {word[i:i + 3] for i in range(len(word) - 2)}
+        match = 'organizer : "<%d>" AND word : (%s)' % (organizer_id, ' OR '.join(quote(gram) for gram in grams))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT word FROM %s WHERE %s MATCH %%s ORDER BY rank LIMIT %d'
+                % (WORD_SEARCH_TABLE, WORD_SEARCH_TABLE, CANDIDATES),
+                [match])
+            vocabulary = [row[0] for row in cursor.fetchall()]
+        query_grams = word_trigrams(word)
+        return spellings(word, Counter({
+            spelling: len(query_grams & word_trigrams(spelling)) for spelling in vocabulary}))
+
+    def search_short(self, organizer_id, query, limit):
+        """Trigrams can't match words under three letters, so those use a name prefix"""
+        items = Item.objects.filter(organizer_id=organizer_id, name__istartswith=query.strip())
+        documents = items.values_list('id', 'name', 'description', 'location')[:CANDIDATES]
+        return [(pk, 1.0) for pk, *text in documents][:limit]
+
+    def add(self, items):
+        rows = [(item.pk, item.name, item.description, item.location, '<%d>' % item.organizer_id)
+                for item in items]
+        words = {
+            ('<%d>' % item.organizer_id, word)
+            for item in items for word in item_words(item.name, item.description, item.location)
+        }
+        with connection.cursor() as cursor:
+            cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % SEARCH_TABLE, [row[:1] for row in rows])
+            cursor.executemany(
+                'INSERT INTO %s (rowid, name, description, location, organizer) '
+                'VALUES (%%s, %%s, %%s, %%s, %%s)' % SEARCH_TABLE, rows)
+            # A trigger adds new words to the word search table
+            cursor.executemany(
+                'INSERT OR IGNORE INTO %s (organizer, word) VALUES (%%s, %%s)' % WORD_TABLE, sorted(words))
+
+    def remove(self, items):
+        ids = [item.pk for item in items]
+        with connection.cursor() as cursor:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                cursor.execute('DELETE FROM %s WHERE rowid IN (%s)' % (SEARCH_TABLE, ', '.join(['%s'] * len(chunk))),
+                               chunk)
+
+
+class OrganizerIndex:
+    """In-memory word postings and vocabulary for one organizer's items
+
+    Arguments:
+        rows -- (id, name, description, location) of every item
+    """
+
+    def __init__(self, rows):
+        self.built = time.monotonic()
+        self.lock = threading.Lock()
+        self.documents = dict()
+        # Word -> ids of the items using it in any field, and in their name
+        self.postings = dict()
+        self.names = dict()
+        # Trigram -> the words containing it
+        self.vocabulary = dict()
+        for row in rows:
+            self.add(*row)
+
+    def add(self, pk, name, description, location):
+        if pk in self.documents:
+            self.remove(pk)
+        self.documents[pk] = (name, description, location)
+        for word in item_words(name, description, location):
+            postings = self.postings.get(word)
+            if postings is None:
+                postings = self.postings[word] = set()
+                for gram in word_trigrams(word):
+                    self.vocabulary.setdefault(gram, set()).add(word)
+            postings.add(pk)
+        for word in item_words(name, '', ''):
+            self.names.setdefault(word, set()).add(pk)
+
+    def remove(self, pk):
+        document = self.documents.pop(pk, None)
+        if document is None:
+            return
+        for word in item_words(document[0], '', ''):
+            postings = self.names[word]
+            postings.discard(pk)
+            if not postings:
+                del self.names[word]
+        for word in item_words(*document):
+            postings = self.postings[word]
+            postings.discard(pk)
+            if not postings:
+                del self.postings[word]
+                for gram in word_trigrams(word):
+                    words = self.vocabulary[gram]
+                    words.discard(word)
+                    if not words:
+                        del self.vocabulary[gram]
+
+    def spellings(self, word):
+        words = Counter()
+        for gram in word_trigrams(word):
+            words.update(self.vocabulary.get(gram, ()))
+        return spellings(word, words)
+
+    def rank(self, query, ids, limit):
+        return rank(query, [(pk,) + self.documents[pk] for pk in heapq.nsmallest(CANDIDATES, ids)], limit)
+
+    def search(self, query, limit):
+        spelled = [self.spellings(word) for word in set(query.lower().split())]
+        spelled = [words for words in spelled if words]
+        if not spelled:
+            return []
+        # Items with every word, or a spelling of it, are checked first, those
+        # with all of them in their name before the rest as names score highest;
+        # items with only some of the words are only needed when those are too few.
+        results = []
+        seen = set()
+        for postings in (self.names, self.postings):
+            matches = sorted((matching(postings, words) for words in spelled), key=len)
+            strict = matches[0]
+            for items in matches[1:]:
+                strict = strict & items
+            results = merge(results, self.rank(query, strict - seen, limit), limit)
+            if len(results) >= limit:
+                return results
+            seen = strict
+        if len(matches) > 1:
+            results = merge(results, self.rank(query, set().union(*matches) - seen, limit), limit)
+        return results
+
+
+def matching(postings, words):
+    """Returns the ids of items using any of `words`"""
+    found = [postings[word] for word in words if word in postings]
+    if len(found) == 1:
+        return found[0]
+    return set().union(*found)
+
+
+class MemoryIndex:
+    """Search index kept in this process, for databases without FTS5
+
+    Each organizer's postings are built from one query on first search and
+    then updated from model signals. Writes made by other processes aren't
+    seen here, so an organizer's postings are rebuilt after `max_age` seconds.
+    Builds happen outside the lock shared by every organizer, so they only
+    hold up searches of the organizer being built; writes that arrive
+    during a build are replayed on the new postings before they are used.
+    """
+
+    max_age = 60
+
+    def __init__(self):
+        self.organizers = dict()
+        # Organizer id -> lock held while its postings are built
+        self.building = dict()
+        # Organizer id -> (pk, document or None) writes seen during its build
+        self.pending = dict()
+        self.lock = threading.Lock()
+
+    def fresh(self, index):
+        return index is not None and time.monotonic() - index.built <= self.max_age
+
+    def organizer_index(self, organizer_id):
+        index = self.organizers.get(organizer_id)
+        if self.fresh(index):
+            return index
+        with self.lock:
+            building = self.building.setdefault(organizer_id, threading.Lock())
+        with building:
+            index = self.organizers.get(organizer_id)
+            if self.fresh(index):
+                return index
+            with self.lock:
+                self.pending[organizer_id] = []
+            try:
+                items = Item.objects.filter(organizer_id=organizer_id)
+                index = OrganizerIndex(items.values_list('id', 'name', 'description', 'location'))
+            except Exception:
+                with self.lock:
+                    del self.pending[organizer_id]
+                raise
+            with self.lock:
+                for pk, document in self.pending.pop(organizer_id):
+                    if document is None:
+                        index.remove(pk)
+                    else:
+                        index.add(pk, *document)
+                self.organizers[organizer_id] = index
+        return index
+
+    def search(self, organizer_id, query, limit):
+        index = self.organizer_index(organizer_id)
+        with index.lock:
+            return index.search(query, limit)
+
+    def write(self, organizer_id, pk, document):
+        with self.lock:
+            pending = self.pending.get(organizer_id)
+            if pending is not None:
+                pending.append((pk, document))
+            index = self.organizers.get(organizer_id)
+            if index is not None:
+                with index.lock:
+                    if document is None:
+                        index.remove(pk)
+                    else:
+                        index.add(pk, *document)
+
+    def add(self, items):
+        for item in items:
+            self.write(item.organizer_id, item.pk, (item.name, item.description, item.location))
+
+    def remove(self, items):
+        for item in items:
+            self.write(item.organizer_id, item.pk, None)
+
+
+_index = None
+
+
+def get_index():
+    """Returns the FTS5 index when its table exists, otherwise the in-process one"""
+    global _index
+    if _index is None:
+        if connection.vendor == 'sqlite' and SEARCH_TABLE in connection.introspection.table_names():
+            _index = FTSIndex()
+        else:
+            _index = MemoryIndex()
+    return _index
+
+
+def search_items(organizer, query, limit=20):
+    """Searches one organizer's items
+
+    Returns:
+        list -- (item id, score) pairs, best first
+    """
+    if organizer is None or not query.strip():
+        return []
+    return get_index().search(organizer.pk, query, limit)
+
+
+@contextmanager
+def batch():
+    """Collects deleted items and removes them from the index together when the block exits"""
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = []
+    try:
+        yield
+        pending = _local.pending
+    finally:
+        _local.pending = None
+    if pending:
+        get_index().remove(pending)
+
+
+@receiver(post_save, sender=Item)
+def item_saved(sender, instance, **kwargs):
+    get_index().add([instance])
+
+
+@receiver(items_bulk_created, sender=Item)
+def items_created(sender, items, **kwargs):
+    get_index().add(items)
+
+
+@receiver(post_delete, sender=Item)
+def item_deleted(sender, instance, **kwargs):
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        get_index().remove([instance])
+    else:
+        pending.append(instance)
@@ -0,0 +1,75 @@
+"""Concurrency-safe changes to item quantities
+
+A change reads the item's state, then writes the new quantity and bumps
+the version in one UPDATE guarded by the version it read, deltas with
+F() and floored at zero. The read is needed for the summary tables,
+which record the quantity the item moved from; RETURNING can only give
+the new one. Outside a transaction, the read doesn't hold a snapshot
+that SQLite would refuse to upgrade to a write. If the guard finds the
+row already changed, a concurrent adjustment won and the change is
+retried against the new state, so neither is lost; a client whose
+version is out of date gets StaleVersion rather than silently replacing
+a newer value.
+"""
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from founditapi import sync
+from founditapi.models import Change, Item
+from founditapi.summaries import item_changed
+
+
+class StaleVersion(Exception):
+    """The item changed since the version the client expected"""
+
+    def __init__(self, version):
+        super().__init__('Item is at version %d' % version)
+        self.version = version
+
+
+def change_quantity(organizer, pk, delta=None, quantity=None, version=None):
+    """Adds `delta` to an item's quantity, or sets it to `quantity`
+
+    Call it outside a transaction, so that each retry reads the latest state.
+
+    Arguments:
+        organizer -- Owner of the item
+        pk -- Item id
+        delta -- Amount to add, may be negative; the result is floored at zero
+        quantity -- Absolute quantity, used when delta is None
+        version -- Version the client last saw, or None to apply regardless
+
+    Returns:
+        tuple -- The new (quantity, version)
+
+    Raises:
+        Item.DoesNotExist -- No such item for this organizer
+        StaleVersion -- The item is no longer at `version`
+    """
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        raise Item.DoesNotExist('Item matching query does not exist.')
+    items = Item.objects.filter(organizer=organizer, pk=pk)
+
+    while True:
+        stored = items.values_list('organizer_id', 'category_id', 'location', 'quantity', 'version').first()
+        if stored is None:
+            raise Item.DoesNotExist('Item matching query does not exist.')
+        state, stored_version = stored[:4], stored[4]
+        if version is not None and stored_version != version:
+            raise StaleVersion(stored_version)
+
+        if delta is None:
+            new_quantity, expression = quantity, Value(quantity)
+        else:
+            new_quantity, expression = max(state[3] + delta, 0), Greatest(F('quantity') + delta, 0)
+
+        with transaction.atomic():
+            changed = items.filter(version=stored_version).update(
+                quantity=expression, version=F('version') + 1, updated_at=timezone.now())
+            if changed:
+                item_changed(state, state[:3] + (new_quantity,))
+                sync.changed(Change.ITEM, state[0], [pk])
+                return new_quantity, stored_version + 1
@@ -0,0 +1,194 @@
+"""Per-organizer inventory totals maintained incrementally from Item writes
+
+CategorySummary and LocationSummary hold item counts, summed quantities
+and out-of-stock counts per (organizer, category) and (organizer,
+location). Every Item save, delete, bulk create and bulk update turns
+into a delta that is applied with F() expressions, so totals never need
+a recount and concurrent writers don't overwrite each other.
+
+Item instances remember the values they were loaded with, so a save can
+move an item's contribution from its old groups to its new ones. Inside
+batch() deltas are collected and applied once on exit, which turns a
+queryset delete of many items into one UPDATE per affected group.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from founditapi.bulk import items_bulk_created, items_bulk_updated
+from founditapi.models import CategorySummary, Item, LocationSummary
+
+
+STATE_FIELDS = ('organizer_id', 'category_id', 'location', 'quantity')
+
+_local = threading.local()
+
+
+def item_state(item):
+    """The values an item contributes to its summaries, or None if any are deferred"""
+    values = item.__dict__
+    if any(name not in values for name in STATE_FIELDS):
+        return None
+    return tuple(values[name] for name in STATE_FIELDS)
+
+
+def add_state(deltas, state, sign):
+    """Adds (sign=1) or removes (sign=-1) one item's contribution to `deltas`"""
+    organizer_id, category_id, location, quantity = state
+    quantity = int(quantity or 0)
+    change = (sign, sign * quantity, sign if quantity <= 0 else 0)
+    for key in (('category', organizer_id, category_id), ('location', organizer_id, location)):
+        delta = deltas[key]
+        for index, value in enumerate(change):
+            delta[index] += value
+
+
+def new_deltas():
+    return defaultdict(lambda: [0, 0, 0])
+
+
+def item_changed(old, new):
+    """Records one item moving from state `old` to `new`, either may be None
+
+    For writes that bypass Item.save(), such as QuerySet.update().
+    """
+    deltas = new_deltas()
+    if old is not None:
+        add_state(deltas, old, -1)
+    if new is not None:
+        add_state(deltas, new, 1)
+    record(deltas)
+
+
+def apply(deltas):
+    """Applies collected deltas, one UPDATE per group
+
+    A group without a row gets one inserted when items were added to it.
+    Groups without a row that only lose items belong to an organizer or
+    category that is being deleted, so they are skipped.
+    """
+    for (kind, organizer_id, value), (items, quantity, out_of_stock) in deltas.items():
+        if not (items or quantity or out_of_stock):
+            continue
+        model, field = (CategorySummary, 'category_id') if kind == 'category' else (LocationSummary, 'location')
+        rows = model.objects.filter(organizer_id=organizer_id, **{field: value})
+        changes = {
+            'item_count': F('item_count') + items,
+            'quantity': F('quantity') + quantity,
+            'out_of_stock': F('out_of_stock') + out_of_stock,
+        }
+        if rows.update(**changes) or items <= 0:
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(organizer_id=organizer_id, item_count=items, quantity=quantity,
+                                     out_of_stock=out_of_stock, **{field: value})
+        except IntegrityError:
+            # Another writer inserted the row first
+            rows.update(**changes)
+
+
+def record(deltas):
+    """Applies deltas now, or adds them to the enclosing batch()"""
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        apply(deltas)
+        return
+    for key, change in deltas.items():
+        for index, value in enumerate(change):
+            pending[key][index] += value
+
+
+@contextmanager
+def batch():
+    """Collects summary deltas and applies them once when the block exits"""
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = new_deltas()
+    try:
+        yield
+        pending = _local.pending
+    finally:
+        _local.pending = None
+    apply(pending)
+
+
+def aggregate(items, field):
+    return items.values('organizer_id', field).annotate(
+        total_items=Count('id'),
+        total_quantity=Sum('quantity'),
+        total_out_of_stock=Count('id', filter=Q(quantity__lte=0)),
+    ).order_by()
+
+
+def rebuild(organizer=None):
+    """Recomputes every summary, or one organizer's, from grouped Item aggregates
+
+    Returns:
+        tuple -- Number of category and location summary rows written
+    """
+    items = Item.objects.all() if organizer is None else Item.objects.filter(organizer=organizer)
+    written = []
+    with transaction.atomic():
+        for model, field in ((CategorySummary, 'category_id'), (LocationSummary, 'location')):
+            existing = model.objects.all() if organizer is None else model.objects.filter(organizer=organizer)
+            existing.delete()
+            rows = [
+                model(organizer_id=row['organizer_id'], item_count=row['total_items'],
+                      quantity=row['total_quantity'] or 0, out_of_stock=row['total_out_of_stock'],
+                      **{field: row[field]})
+                for row in aggregate(items, field).iterator()
+            ]
+            model.objects.bulk_create(rows, batch_size=1000)
+            written.append(len(rows))
+    return tuple(written)
+
+
+@receiver(post_init, sender=Item)
+def item_loaded(sender, instance, **kwargs):
+    instance._summary_state = item_state(instance) if instance.pk is not None else None
+
+
+@receiver(pre_save, sender=Item)
+def item_saving(sender, instance, **kwargs):
+    # Items loaded with deferred fields fetch their stored values once
+    if instance.pk is not None and getattr(instance, '_summary_state', None) is None:
+        instance._summary_state = Item.objects.filter(pk=instance.pk).values_list(*STATE_FIELDS).first()
+
+
+@receiver(post_save, sender=Item)
+def item_saved(sender, instance, **kwargs):
+    old, instance._summary_state = instance._summary_state, item_state(instance)
+    item_changed(old, instance._summary_state)
+
+
+@receiver(post_delete, sender=Item)
+def item_deleted(sender, instance, **kwargs):
+    state = getattr(instance, '_summary_state', None) or item_state(instance)
+    if state is not None:
+        item_changed(state, None)
+
+
+@receiver(items_bulk_created, sender=Item)
+def items_created(sender, items, **kwargs):
+    deltas = new_deltas()
+    for item in items:
+        item._summary_state = item_state(item)
+        add_state(deltas, item._summary_state, 1)
+    record(deltas)
+
+
+@receiver(items_bulk_updated, sender=Item)
+def items_updated(sender, items, **kwargs):
+    # bulk_update_items takes items loaded with every STATE_FIELDS value
+    deltas = new_deltas()
+    for item in items:
+        if item._summary_state is not None:
+            add_state(deltas, item._summary_state, -1)
+        item._summary_state = item_state(item)
+        add_state(deltas, item._summary_state, 1)
+    record(deltas)
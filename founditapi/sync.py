@@ -0,0 +1,175 @@
+"""Change log behind the /sync feed
+
+Every write to an item or category adds a Change row: item changes
+belong to the item's organizer, category changes to everyone. A client
+keeps the token from its last poll, which holds the last Change id it
+saw, and asks for the rows after it, so a poll with nothing new is one
+range read of the (organizer, id) index. Writes that bypass Item.save()
+call changed() themselves, as they do summaries.item_changed. Ids are
+taken in commit order because SQLite serializes writers; on PostgreSQL a
+slow transaction can commit an id below one a client has already seen.
+So the feed stops at the first change younger than
+FOUNDIT_SYNC['SAFETY_LAG_SECONDS'], and hands it out on a later poll
+once every transaction that started before it has had that long to
+commit.
+
+compact() keeps only the latest change per object and drops changes
+older than FOUNDIT_SYNC['RETENTION_DAYS']. Tokens older than that are
+refused with a reset, so no client misses a change that was dropped.
+"""
+import base64
+import datetime
+import json
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from founditapi.bulk import items_bulk_created, items_bulk_updated
+from founditapi.models import Category, Change, Item
+
+
+_local = threading.local()
+
+
+def get_retention():
+    return datetime.timedelta(days=getattr(settings, 'FOUNDIT_SYNC', {}).get('RETENTION_DAYS', 30))
+
+
+def get_lag():
+    return datetime.timedelta(seconds=getattr(settings, 'FOUNDIT_SYNC', {}).get('SAFETY_LAG_SECONDS', 0))
+
+
+def apply(changes):
+    if len(changes) == 1:
+        changes[0].save(force_insert=True)
+    elif changes:
+        Change.objects.bulk_create(changes)
+
+
+def record(changes):
+    """Writes Change rows now, or adds them to the enclosing batch()"""
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        apply(changes)
+    else:
+        pending.extend(changes)
+
+
+@contextmanager
+def batch():
+    """Collects Change rows and writes them with one insert when the block exits"""
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = []
+    try:
+        yield
+        pending = _local.pending
+    finally:
+        _local.pending = None
+    apply(pending)
+
+
+def changed(kind, organizer_id, object_ids, deleted=False):
+    """Records writes to objects of one kind, for writes that bypass the model's signals"""
+    record([Change(kind=kind, organizer_id=organizer_id, object_id=pk, deleted=deleted) for pk in object_ids])
+
+
+def encode_token(last_id, issued=None):
+    issued = int((issued or timezone.now()).timestamp())
+    return base64.urlsafe_b64encode(json.dumps([last_id, issued]).encode('ascii')).decode('ascii')
+
+
+def decode_token(token):
+    """Returns (last Change id, issued datetime)
+
+    Raises:
+        ValueError -- When the token is malformed
+    """
+    try:
+        last_id, issued = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('ascii'))
+        return int(last_id), datetime.datetime.fromtimestamp(int(issued), tz=datetime.timezone.utc)
+    except (TypeError, ValueError, UnicodeError, OverflowError, OSError):
+        raise ValueError('Invalid since')
+
+
+def expired(issued):
+    return issued < timezone.now() - get_retention()
+
+
+def latest_id():
+    """The id of the newest change older than the safety lag"""
+    changes = Change.objects.order_by('-id')
+    lag = get_lag()
+    if lag:
+        # Walks back from the newest id only over the last few seconds' rows
+        changes = changes.filter(changed_at__lte=timezone.now() - lag)
+    return changes.values_list('id', flat=True).first() or 0
+
+
+def changes_after(organizer, last_id, limit):
+    """Returns up to `limit` (id, kind, object id, deleted) rows the organizer sees after `last_id`
+
+    The rows end before the first one younger than the safety lag, so a
+    lower id that is still to commit can't be skipped.
+    """
+    changes = Change.objects.filter(Q(organizer_id=organizer.pk) | Q(organizer_id__isnull=True), id__gt=last_id)
+    lag = get_lag()
+    if not lag:
+        return list(changes.order_by('id').values_list('id', 'kind', 'object_id', 'deleted')[:limit])
+    horizon = timezone.now() - lag
+    settled = []
+    for row in changes.order_by('id').values_list('id', 'kind', 'object_id', 'deleted', 'changed_at')[:limit]:
+        if row[4] > horizon:
+            break
+        settled.append(row[:4])
+    return settled
+
+
+def compact(now=None):
+    """Deletes changes superseded by a later one to the same object, and those past retention
+
+    Returns:
+        tuple -- Number of superseded and expired changes deleted
+    """
+    # Rows a little younger than the retention survive, so a token that
+    # is just inside it can't have lost a change to a compaction run.
+    cutoff = (now or timezone.now()) - get_retention() - datetime.timedelta(hours=1)
+    later = Change.objects.filter(kind=OuterRef('kind'), object_id=OuterRef('object_id'), id__gt=OuterRef('id'))
+    with transaction.atomic():
+        superseded = list(Change.objects.annotate(superseded=Exists(later)).filter(superseded=True)
+                          .values_list('id', flat=True))
+        for start in range(0, len(superseded), 500):
+            Change.objects.filter(id__in=superseded[start:start + 500]).delete()
+        expired_count, _ = Change.objects.filter(changed_at__lt=cutoff).delete()
+    return len(superseded), expired_count
+
+
+@receiver(post_save, sender=Item)
+def item_saved(sender, instance, **kwargs):
+    changed(Change.ITEM, instance.organizer_id, [instance.pk])
+
+
+@receiver(post_delete, sender=Item)
+def item_deleted(sender, instance, **kwargs):
+    changed(Change.ITEM, instance.organizer_id, [instance.pk], deleted=True)
+
+
+@receiver(items_bulk_created, sender=Item)
+@receiver(items_bulk_updated, sender=Item)
+def items_written(sender, items, **kwargs):
+    record([Change(kind=Change.ITEM, organizer_id=item.organizer_id, object_id=item.pk) for item in items])
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    changed(Change.CATEGORY, None, [instance.pk])
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    changed(Change.CATEGORY, None, [instance.pk], deleted=True)
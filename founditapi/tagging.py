@@ -0,0 +1,308 @@
+"""Category tags on items and the any/all category filters that read them
+
+CategoryItem rows tag items with further categories. Every item is also
+tagged with its own category, added by the receivers here when items are
+created or moved to another category, so a category filter only ever
+needs the tags.
+
+Scanning the tag index and grouping by item costs a millisecond per few
+thousand tags, too slow for several large categories, so each process
+keeps a bitmap per category of the organizer's tagged items. Any/all is
+an OR/AND of a few bitmaps. When few items match, their ids go to the
+database as a list; when many do, the item query keeps an EXISTS check
+on the tags and, walking items in page order, finds a page of matches
+after a few rows.
+
+Building an organizer's bitmaps reads all of their tags, so writes that
+only add tags don't throw them away. Creating, tagging and moving items
+insert tag rows, and tags_added() tells every process to read the tags
+of the items that have a tag newer than the last one it applied, clear
+those items' bits and set them again. Only removing tags, which leaves
+no row behind to find, makes processes rebuild. On PostgreSQL a tag id
+can commit after a higher one, so the rows read again start from the
+last id that was read FOUNDIT_SYNC['SAFETY_LAG_SECONDS'] ago, as the
+/sync feed does.
+"""
+import threading
+import time
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from founditapi import routing
+from founditapi.bulk import items_bulk_created
+from founditapi.caching import expiry, get_cache, get_versions
+from founditapi.models import Category, CategoryItem, Item
+from founditapi.summaries import STATE_FIELDS
+from founditapi.sync import get_lag
+
+
+# Matches up to this many items are sent to the database as a list of ids
+INLINE_IDS = 500
+
+
+# Deleting a category deletes its tags in every organizer
+CATEGORIES_KEY = 'foundit-version:tags-categories'
+
+
+def version_key(organizer_id):
+    return 'foundit-version:tags:%s' % organizer_id
+
+
+def added_key(organizer_id):
+    return 'foundit-version:tags-added:%s' % organizer_id
+
+
+def touch(key):
+    transaction.on_commit(lambda: get_cache().set(key, time.time_ns(), None))
+
+
+def tags_changed(organizer_id):
+    """Marks tags as removed once committed, so every process rebuilds the organizer's bitmaps"""
+    touch(version_key(organizer_id))
+
+
+def tags_added(organizer_id):
+    """Marks tags as inserted once committed, so every process applies the new rows"""
+    touch(added_key(organizer_id))
+
+
+def own_tag(item):
+    return CategoryItem(organizer_id=item.organizer_id, item_id=item.pk, category_id=item.category_id)
+
+
+def to_bitmap(item_ids, base, size):
+    bits = bytearray(size)
+    for item_id in item_ids:
+        offset = item_id - base
+        bits[offset >> 3] |= 1 << (offset & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class OrganizerTags:
+    """A bitmap per category of one organizer's tagged items
+
+    Bit n stands for item id `base + n`, so bitmaps are as long as the
+    organizer's range of item ids rather than the whole table's. Instances
+    aren't changed once built; caught_up() returns a new one, so a request
+    never sees bitmaps half way through an update.
+
+    Every tag with an id up to `applied` is in the bitmaps. `reads` holds
+    (time, highest tag id) for the reads made within the safety lag, below
+    whose highest id tags may still be committing.
+    """
+
+    def __init__(self, organizer_id, version, added, base, size, bitmaps, applied, reads):
+        self.organizer_id = organizer_id
+        self.version = version
+        self.added = added
+        self.base = base
+        self.size = size
+        self.bitmaps = bitmaps
+        self.applied = applied
+        self.reads = reads
+
+    @classmethod
+    def read(cls, organizer_id, version, added):
+        """Builds the bitmaps from all of the organizer's tags"""
+        started = time.monotonic()
+        highest = 0
+        tagged = dict()
+        for pk, category_id, item_id in CategoryItem.objects.filter(organizer_id=organizer_id).values_list(
+                'id', 'category_id', 'item_id').iterator(chunk_size=5000):
+            tagged.setdefault(category_id, []).append(item_id)
+            highest = max(highest, pk)
+
+        base = min((min(ids) for ids in tagged.values()), default=0)
+        size = (max((max(ids) for ids in tagged.values()), default=0) - base) // 8 + 1
+        bitmaps = {category_id: to_bitmap(ids, base, size) for category_id, ids in tagged.items()}
+        return cls(organizer_id, version, added, base, size, bitmaps, *settle(0, [(started, highest)], started))
+
+    def caught_up(self, added):
+        """Returns bitmaps with the tags inserted since this read applied
+
+        Items with a tag newer than `applied` have their bits cleared and
+        set again from all of their tags, which also takes a moved item
+        out of the category it left.
+        """
+        started = time.monotonic()
+        newer = CategoryItem.objects.filter(organizer_id=self.organizer_id, id__gt=self.applied).values('item_id')
+        # The item already fixes the organizer; filtering on it again would
+        # have SQLite scan all of the organizer's tags
+        rows = list(CategoryItem.objects.filter(item_id__in=newer).values_list('id', 'category_id', 'item_id'))
+        touched = {item_id for pk, category_id, item_id in rows}
+        if touched and min(touched) < self.base:
+            return OrganizerTags.read(self.organizer_id, self.version, added)
+
+        highest = max([pk for pk, category_id, item_id in rows] + [self.reads[-1][1]])
+        size = max(self.size, (max(touched, default=self.base) - self.base) // 8 + 1)
+        cleared = ~to_bitmap(touched, self.base, size)
+        bitmaps = {category_id: bitmap & cleared for category_id, bitmap in self.bitmaps.items()}
+        tagged = dict()
+        for pk, category_id, item_id in rows:
+            tagged.setdefault(category_id, []).append(item_id)
+        for category_id, ids in tagged.items():
+            bitmaps[category_id] = bitmaps.get(category_id, 0) | to_bitmap(ids, self.base, size)
+        applied, reads = settle(self.applied, self.reads + [(started, highest)], started)
+        return OrganizerTags(self.organizer_id, self.version, added, self.base, size, bitmaps, applied, reads)
+
+    def match(self, category_ids, match_all=False):
+        """Returns the bitmap of items tagged with any, or all, of the categories"""
+        bitmaps = [self.bitmaps.get(category_id, 0) for category_id in category_ids]
+        matched = bitmaps[0] if bitmaps else 0
+        for bitmap in bitmaps[1:]:
+            if match_all:
+                matched &= bitmap
+            else:
+                matched |= bitmap
+        return matched
+
+    def item_ids(self, bitmap):
+        """Returns the item ids set in a bitmap, in ascending order"""
+        ids = []
+        for index, byte in enumerate(bitmap.to_bytes(self.size, 'little')):
+            while byte:
+                low = byte & -byte
+                ids.append(self.base + index * 8 + low.bit_length() - 1)
+                byte ^= low
+        return ids
+
+
+def settle(applied, reads, now):
+    """Advances `applied` past the reads made at least the safety lag before `now`
+
+    A tag id at or below the highest one a read saw was taken before that
+    read, so once the lag has passed it has committed, and the read made
+    at `now` saw it.
+
+    Returns:
+        tuple -- The new `applied`, and the reads still too recent to settle
+    """
+    horizon = now - get_lag().total_seconds()
+    for read_at, highest in reads:
+        if read_at <= horizon:
+            applied = max(applied, highest)
+    return applied, [(read_at, highest) for read_at, highest in reads if read_at > horizon] or reads[-1:]
+
+
+class TagIndex:
+    """Each organizer's tag bitmaps, built from one query on first use
+
+    An organizer's bitmaps are rebuilt when tags are removed in any
+    process, which tags_changed records in the shared cache, or when a
+    category is deleted, which deletes its tags. When tags_added records
+    new tags they are applied with one query instead.
+    """
+
+    def __init__(self):
+        self.organizers = dict()
+        self.lock = threading.Lock()
+
+    def organizer_tags(self, organizer_id):
+        stamps = get_versions([version_key(organizer_id), CATEGORIES_KEY, added_key(organizer_id)])
+        routing.check_versions(stamps)
+        version = tuple(stamps[:2]) + (expiry(),)
+        added = stamps[2]
+        with self.lock:
+            tags = self.organizers.get(organizer_id)
+            if tags is None or tags.version != version:
+                tags = OrganizerTags.read(organizer_id, version, added)
+            elif tags.added != added:
+                tags = tags.caught_up(added)
+            self.organizers[organizer_id] = tags
+            return tags
+
+
+_index = TagIndex()
+
+
+def filter_tagged(items, organizer, category_ids, match_all=False):
+    """Narrows an item queryset to those tagged with any, or all, of the categories"""
+    category_ids = sorted(set(category_ids))
+    if not category_ids:
+        return items.none()
+
+    tags = _index.organizer_tags(organizer.pk)
+    matched = tags.match(category_ids, match_all)
+    if bin(matched).count('1') <= INLINE_IDS:
+        return items.filter(pk__in=tags.item_ids(matched))
+
+    groups = [category_ids] if not match_all else [[category_id] for category_id in category_ids]
+    for index, group in enumerate(groups):
+        name = '_tagged_%d' % index
+        tagged = Exists(CategoryItem.objects.filter(item_id=OuterRef('pk'), category_id__in=group))
+        items = items.annotate(**{name: tagged}).filter(**{name: True})
+    return items
+
+
+def existing_tags(organizer, pairs):
+    """Returns {(item id, category id): tag id} for those of `pairs` that exist"""
+    item_ids = {item_id for item_id, category_id in pairs}
+    tags = CategoryItem.objects.filter(organizer=organizer, item_id__in=item_ids).values_list(
+        'item_id', 'category_id', 'id')
+    return {(item_id, category_id): pk for item_id, category_id, pk in tags if (item_id, category_id) in pairs}
+
+
+def tag_items(organizer, pairs):
+    """Tags items with categories, leaving tags that already exist alone
+
+    Returns:
+        set -- The (item id, category id) pairs that were added
+    """
+    pairs = set(pairs)
+    with transaction.atomic():
+        added = pairs - set(existing_tags(organizer, pairs))
+        CategoryItem.objects.bulk_create([
+            CategoryItem(organizer=organizer, item_id=item_id, category_id=category_id)
+            for item_id, category_id in added
+        ], ignore_conflicts=True)
+    if added:
+        tags_added(organizer.pk)
+    return added
+
+
+def untag_items(organizer, pairs):
+    """Removes tags from items
+
+    Returns:
+        set -- The (item id, category id) pairs that were removed
+    """
+    with transaction.atomic():
+        existing = existing_tags(organizer, set(pairs))
+        CategoryItem.objects.filter(pk__in=existing.values()).delete()
+    if existing:
+        tags_changed(organizer.pk)
+    return set(existing)
+
+
+@receiver(pre_save, sender=Item)
+def item_saving(sender, instance, **kwargs):
+    # founditapi.summaries connects first and has already read the stored
+    # values into _summary_state, including the category being left
+    state = getattr(instance, '_summary_state', None)
+    instance._tagged_category_id = state[STATE_FIELDS.index('category_id')] if state else None
+
+
+@receiver(post_save, sender=Item)
+def item_saved(sender, instance, created, **kwargs):
+    old_category_id = instance._tagged_category_id
+    if not created and old_category_id == instance.category_id:
+        return
+    if old_category_id is not None:
+        # The new category's tag is inserted again even if the item had it,
+        # so the move leaves a new row for other processes to find
+        CategoryItem.objects.filter(item=instance, category_id__in=(old_category_id, instance.category_id)).delete()
+    own_tag(instance).save(force_insert=True)
+    tags_added(instance.organizer_id)
+
+
+@receiver(items_bulk_created, sender=Item)
+def items_created(sender, items, **kwargs):
+    CategoryItem.objects.bulk_create([own_tag(item) for item in items], ignore_conflicts=True)
+    for organizer_id in {item.organizer_id for item in items}:
+        tags_added(organizer_id)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    touch(CATEGORIES_KEY)
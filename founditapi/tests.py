@@ -0,0 +1,126 @@
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from founditapi.caching import bump
+from founditapi.models import Category, Item, Organizer
+
+
+class CategoryListQueryTests(TestCase):
+    """GET /categories costs the same number of queries however many categories there are"""
+
+    def setUp(self):
+        user = User.objects.create_user('lister', password='lister')
+        self.organizer = Organizer.objects.create(user=user)
+        self.headers = {'HTTP_AUTHORIZATION': 'Token %s' % Token.objects.create(user=user).key}
+
+    def add_categories(self, count):
+        for index in range(Category.objects.count(), count):
+            category = Category.objects.create(name='Category %d' % index)
+            Item.objects.create(organizer=self.organizer, category=category, name='Item %d' % index,
+                                description='', quantity=1, location='', created_at=timezone.now())
+
+    def assert_list_queries(self, count):
+        self.add_categories(count)
+        # Miss the response cache and the catalog, as the first request after a write does
+        bump(self.organizer, 'catalog', 'organizer')
+        # The token, the catalog and the organizer's items
+        with self.assertNumQueries(3):
+            response = self.client.get('/categories', **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), count)
+        self.assertEqual(sum(len(category['organizer_items']) for category in response.json()), count)
+
+    def test_few_categories(self):
+        self.assert_list_queries(3)
+
+    def test_many_categories(self):
+        self.assert_list_queries(30)
+
+
+class MetricsAccessTests(TestCase):
+    """/metrics is for staff, as /cache-stats is"""
+
+    def get_metrics(self, user=None):
+        headers = {} if user is None else {'HTTP_AUTHORIZATION': 'Token %s' % Token.objects.create(user=user).key}
+        return self.client.get('/metrics', HTTP_ACCEPT='text/plain;version=0.0.4;q=0.5,*/*;q=0.1', **headers)
+
+    def test_anonymous(self):
+        self.assertEqual(self.get_metrics().status_code, 401)
+
+    def test_organizer(self):
+        self.assertEqual(self.get_metrics(User.objects.create_user('organizer', password='organizer')).status_code, 403)
+
+    def test_staff(self):
+        response = self.get_metrics(User.objects.create_user('scraper', password='scraper', is_staff=True))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+
+class BulkItemTests(TestCase):
+    """/items/bulk rejects rows that the single-item endpoints would"""
+
+    def setUp(self):
+        user = User.objects.create_user('bulker', password='bulker')
+        organizer = Organizer.objects.create(user=user)
+        self.headers = {'HTTP_AUTHORIZATION': 'Token %s' % Token.objects.create(user=user).key}
+        self.item = Item.objects.create(organizer=organizer, category=Category.objects.create(name='Tools'),
+                                        name='Hammer', description='', quantity=2, location='',
+                                        created_at=timezone.now())
+
+    def test_negative_quantity(self):
+        response = self.client.patch('/items/bulk', [{'id': self.item.pk, 'quantity': -1}],
+                                     content_type='application/json', **self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.json()[0]['errors'])
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 2)
+
+    def test_boolean_ids(self):
+        response = self.client.delete('/items/bulk', [True], content_type='application/json', **self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Item.objects.filter(pk=self.item.pk).exists())
+
+
+class QuantityChangeTests(TestCase):
+    """PUT and adjust answer 404 for ids that can't be items"""
+
+    def setUp(self):
+        user = User.objects.create_user('stocker', password='stocker')
+        Organizer.objects.create(user=user)
+        self.headers = {'HTTP_AUTHORIZATION': 'Token %s' % Token.objects.create(user=user).key}
+
+    def test_adjust_non_numeric_id(self):
+        response = self.client.post('/items/abc/adjust', {'delta': 1}, content_type='application/json',
+                                    **self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_update_non_numeric_id(self):
+        response = self.client.put('/items/abc', {'quantity': 1}, content_type='application/json', **self.headers)
+        self.assertEqual(response.status_code, 404)
+
+
+class ImportLengthTests(TestCase):
+    """Imports reject values longer than their columns before writing anything"""
+
+    def setUp(self):
+        user = User.objects.create_user('importer', password='importer')
+        self.organizer = Organizer.objects.create(user=user)
+        self.headers = {'HTTP_AUTHORIZATION': 'Token %s' % Token.objects.create(user=user).key}
+
+    def import_csv(self, *lines):
+        upload = SimpleUploadedFile('inventory.csv', '\n'.join(('name,quantity,category',) + lines).encode())
+        return self.client.post('/items/import', {'file': upload}, **self.headers)
+
+    def test_long_item_name(self):
+        response = self.import_csv('Hammer,1,Tools', '%s,1,Tools' % ('x' * 51))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Row 1', response.json()['message'])
+        self.assertFalse(Item.objects.filter(organizer=self.organizer).exists())
+
+    def test_long_category_name(self):
+        response = self.import_csv('Hammer,1,%s' % ('x' * 51))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Row 0', response.json()['message'])
+        self.assertFalse(Category.objects.exists())
@@ -3,4 +3,8 @@ from .register import login_user
 from .user import UserViewSet
 from .item import Items
 from .category import Categories
-from .organizer import Organizers
\ No newline at end of file
+from .organizer import Organizers
+from .metrics import cache_stats
+from .metrics import prometheus_metrics
+from .sync import sync_changes
+from .job import Jobs
@@ -6,7 +6,9 @@ from rest_framework import serializers
 from rest_framework import status
 from founditapi.models import Category
 from founditapi.models import Item
-from founditapi.models import Organizer
+from founditapi.caching import conditional, invalidates
+from founditapi.catalog import get_catalog
+from .rows import CategoryRowSerializer
 
 
 class CategoryItemSerializer(serializers.HyperlinkedModelSerializer):
@@ -43,43 +45,46 @@ class CategorySerializer(serializers.HyperlinkedModelSerializer):
         fields = ('id', 'url', 'name', 'organizer_items')
         depth = 2
 
+def organizer_items(organizer):
+    """Groups an organizer's items by category id with one query
+
+    Returns:
+        dict -- Category id to a list of {id, name} items
+    """
+    grouped = dict()
+    items = Item.objects.filter(organizer=organizer).values_list('category_id', 'id', 'name')
+    for category_id, item_id, name in items:
+        grouped.setdefault(category_id, []).append({'id': item_id, 'name': name})
+    return grouped
+
+
+def with_organizer_items(categories, grouped):
+    """Attaches grouped items to category rows as `organizer_items`"""
+    for category in categories:
+        category['organizer_items'] = grouped.get(category['id'], [])
+    return categories
+
+
 class Categories(ViewSet):
     """Categories"""
 
+    @conditional('catalog', 'organizer')
     def list(self, request):
         """Handle GET requests to categories resource
 
+        `?fields=` picks the keys of each category; leaving out
+        `organizer_items` skips the item query altogether.
+
         Returns:
             Response -- JSON serialized list of categories
         """
-        # items = Item.objects.get(user=request.auth.user)
-        my_categories = []
-
-        categories = Category.objects.all()
-        organizer = Organizer.objects.get(user=request.auth.user)
-        for category in categories:
-            items = Item.objects.filter(category=category, organizer=organizer)
-            json_items = CategoryItemSerializer(items, many=True, context={'request': request})
-
-            category.organizer_items = json_items.data
-            serializer = CategorySerializer(
-                category,
-                many=False,
-                context={'request': request}
-            )
-            my_categories.append(serializer.data)
-
-        # categories = Category.objects.values_list('name','items__name').filter(items__organizer=organizer)
-        # print(categories.query.__str__())
-        # items = Category.item_set.get(organizer=request.auth.user)
-        # categories = categories.filter(items__organizer=organizer)
-        # serializer = CategorySerializer(
-        #     categories,
-        #     many=True,
-        #     context={'request': request}
-        # )
+        serializer = CategoryRowSerializer(request)
+        my_categories = get_catalog().rows(serializer)
+        if serializer.wants('organizer_items'):
+            my_categories = with_organizer_items(my_categories, organizer_items(request.organizer))
         return Response(my_categories)
 
+    @invalidates('catalog')
     def create(self, request):
         """Handle POST operations
 
@@ -94,19 +99,25 @@ class Categories(ViewSet):
 
         return Response(serializer.data)
 
+    @conditional('catalog')
     def retrieve(self, request, pk=None):
         """Handle GET requests for single category
 
         Returns:
-            Response -- JSON serialized category instance
+            Response -- JSON serialized category instance, limited to `?fields=`
         """
         try:
-            category = Category.objects.get(pk=pk)
-            serializer = CategorySerializer(category, context={'request': request})
-            return Response(serializer.data)
+            serializer = CategoryRowSerializer(request)
+            category = get_catalog([int(pk)]).row(serializer, int(pk))
+            if serializer.wants('organizer_items'):
+                category['organizer_items'] = []
+            return Response(category)
+        except (Category.DoesNotExist, ValueError) as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
         except Exception as ex:
             return HttpResponseServerError(ex)
 
+    @invalidates('catalog')
     def update(self, request, pk=None):
         """Handle PUT requests for a category
 
@@ -119,6 +130,7 @@ class Categories(ViewSet):
 
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
+    @invalidates('catalog')
     def destroy(self, request, pk=None):
         """Handle DELETE requests for a single product type
 
@@ -1,12 +1,26 @@
 """View module for handling requests about items"""
-from django.http import HttpResponseServerError
+import io
+from django.db import transaction
+from django.http import HttpResponseServerError, StreamingHttpResponse
 from django.core.validators import RegexValidator
+from django.utils.dateparse import parse_datetime
 from rest_framework.viewsets import ViewSet
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import serializers
 from rest_framework import status
-from founditapi.models import Item, Category, CategoryItem, Organizer
+from founditapi import jobs, search, summaries, sync
+from founditapi.models import Item, Category, CategoryItem, CategorySummary, LocationSummary, Organizer
+from founditapi.bulk import bulk_create_items, bulk_update_items
+from founditapi.catalog import get_catalog
+from founditapi.caching import conditional, invalidates
+from founditapi.export import EXPORT_FORMATS, batched
+from founditapi.importer import BATCH_SIZE, INPUT_FORMATS, InventoryImporter, InventoryImportError, guess_format
+from founditapi.pagination import KeysetPagination
+from founditapi.stock import StaleVersion, change_quantity
+from founditapi.tagging import filter_tagged, tag_items, untag_items
+from .job import accepted
+from .rows import ItemRowSerializer
 
 """HyperlinkedModelSerializer class
 Author: Sam Birky
@@ -35,10 +49,141 @@ class ItemSerializer(serializers.HyperlinkedModelSerializer):
         depth = 2
 
 
+class BulkItemSerializer(serializers.Serializer):
+    """Validates one row of a bulk item create"""
+
+    name = serializers.CharField(max_length=50)
+    description = serializers.CharField(max_length=1000, allow_blank=True)
+    quantity = serializers.IntegerField()
+    location = serializers.CharField(max_length=100, allow_blank=True)
+    category = serializers.IntegerField()
+
+
+class QuantitySerializer(serializers.Serializer):
+    """Validates a quantity change, optionally guarded by the expected version"""
+
+    quantity = serializers.IntegerField(min_value=0)
+    version = serializers.IntegerField(required=False)
+
+
+class AdjustSerializer(serializers.Serializer):
+    """Validates a relative quantity change"""
+
+    delta = serializers.IntegerField()
+    version = serializers.IntegerField(required=False)
+
+
+class BulkQuantitySerializer(serializers.Serializer):
+    """Validates one row of a bulk quantity change"""
+
+    id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0)
+
+
+class TagSerializer(serializers.Serializer):
+    """Validates one row of a bulk tag or untag"""
+
+    item = serializers.IntegerField()
+    category = serializers.IntegerField()
+
+
+def validate_rows(rows, serializer_class):
+    """Validates every row of a bulk payload
+
+    Returns:
+        tuple -- (validated rows, per-row results with errors or None)
+    """
+    if not isinstance(rows, list):
+        return None, [{'index': None, 'errors': {'non_field_errors': ['Expected a list of items.']}}]
+
+    validated = []
+    results = []
+    failed = False
+    for index, row in enumerate(rows):
+        serializer = serializer_class(data=row)
+        if serializer.is_valid():
+            validated.append(serializer.validated_data)
+            results.append({'index': index})
+        else:
+            failed = True
+            validated.append(None)
+            results.append({'index': index, 'errors': serializer.errors})
+
+    return validated, (results if failed else None)
+
+
+def parse_ids(value, name):
+    """Parses a comma separated list of ids
+
+    Raises:
+        ValueError -- When any of them isn't an integer
+    """
+    try:
+        return [int(pk) for pk in value.split(',') if pk.strip()]
+    except ValueError:
+        raise ValueError('Invalid %s' % name)
+
+
+def filter_items(organizer, params):
+    """Returns the organizer's items filtered by the Items.list query parameters
+
+    Raises:
+        ValueError -- When a parameter can't be parsed
+    """
+    items = Item.objects.filter(organizer=organizer)
+
+    # support filtering by category
+    category = params.get('category', None)
+    if category is not None:
+        items = items.filter(category_id=category)
+
+    # support filtering by the categories items are tagged with, matching
+    # any of them or, with match=all, every one
+    categories = params.get('categories', None)
+    if categories is not None:
+        match = params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValueError('Invalid match')
+        items = filter_tagged(items, organizer, parse_ids(categories, 'categories'), match_all=match == 'all')
+
+    # support filtering by exact name or name prefix
+    name = params.get('name', None)
+    if name is not None:
+        items = items.filter(name=name)
+    name_prefix = params.get('name_prefix', None)
+    if name_prefix is not None:
+        items = items.filter(name__startswith=name_prefix)
+
+    # support filtering by location
+    location = params.get('location', None)
+    if location is not None:
+        items = items.filter(location=location)
+
+    # support filtering by a created_at range
+    for param, lookup in (('created_after', 'created_at__gte'), ('created_before', 'created_at__lt')):
+        value = params.get(param, None)
+        if value is not None:
+            created_at = parse_datetime(value)
+            if created_at is None:
+                raise ValueError('Invalid %s' % param)
+            items = items.filter(**{lookup: created_at})
+
+    # category and name searches only ever showed items in stock
+    in_stock = params.get('in_stock', None)
+    if in_stock is None:
+        in_stock = category is not None or categories is not None or name is not None
+    else:
+        in_stock = in_stock.lower() in ('1', 'true')
+    if in_stock:
+        items = items.filter(quantity__gt=0)
+
+    return items
+
 
 class Items(ViewSet):
     """Items for Found It!"""
 
+    @invalidates('organizer')
     def create(self, request):
         """Handle POST operations
         Returns:
@@ -47,12 +192,15 @@ class Items(ViewSet):
         new_item = Item()
 
         new_item.name = request.data["name"]
-        new_item.organizer = Organizer.objects.get(user=request.auth.user)
+        new_item.organizer = request.organizer
         new_item.description = request.data["description"]
         new_item.quantity = request.data["quantity"]
         new_item.created_at = request.data["created_at"]
-        new_item.category = Category.objects.get(
-            pk=request.data["category"])
+        try:
+            category_id = int(request.data["category"])
+            new_item.category = get_catalog([category_id]).category(category_id)
+        except (Category.DoesNotExist, TypeError, ValueError):
+            return Response({'message': 'Invalid category.'}, status=status.HTTP_400_BAD_REQUEST)
         new_item.location = request.data["location"]
         new_item.save()
 
@@ -61,37 +209,80 @@ class Items(ViewSet):
 
         return Response(serializer.data)
 
+    # ?expand=category embeds the category's name, which renames change
+    @conditional('catalog', 'organizer')
     def retrieve(self, request, pk=None):
         """Handle GET requests for single item
         Returns:
             Response -- JSON serialized item instance
         """
         try:
-            single_item = Item.objects.get(pk=pk)
-            serializer = ItemSerializer(
-                single_item, context={'request': request})
-            return Response(serializer.data)
+            serializer = ItemRowSerializer(request)
+            items = Item.objects.filter(organizer=request.organizer)
+            return Response(serializer.to_single(items, pk=pk))
         except Exception as ex:
             return HttpResponseServerError(ex)
 
+    @invalidates('organizer')
     def update(self, request, pk=None):
         """Handle PUT requests for an individual item to be edited
+
+        An optional `version` applies the change only if the item hasn't
+        changed since that version.
+
         Returns:
-            Response -- Empty body with 204 status code
+            Response -- Empty body with 204 status code, or 409 with the
+                        current version
         """
-        item = Item.objects.get(pk=pk)
-        item.quantity = request.data["quantity"]
-        item.save()
+        serializer = QuantitySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            change_quantity(request.organizer, pk, quantity=serializer.validated_data['quantity'],
+                            version=serializer.validated_data.get('version'))
+        except Item.DoesNotExist as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
+        except StaleVersion as ex:
+            return Response({'message': ex.args[0], 'version': ex.version}, status=status.HTTP_409_CONFLICT)
 
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
+    @action(methods=['post'], detail=True)
+    @invalidates('organizer')
+    def adjust(self, request, pk=None):
+        """Handle POST requests to add to or take from an item's quantity
+
+        `delta` is applied by the database, so concurrent adjustments are
+        never lost, and the quantity doesn't go below zero. An optional
+        `version` applies it only to that version of the item.
+
+        Returns:
+            Response -- The new quantity and version, or 409 with the
+                        current version
+        """
+        serializer = AdjustSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            quantity, version = change_quantity(request.organizer, pk, delta=serializer.validated_data['delta'],
+                                                version=serializer.validated_data.get('version'))
+        except Item.DoesNotExist as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
+        except StaleVersion as ex:
+            return Response({'message': ex.args[0], 'version': ex.version}, status=status.HTTP_409_CONFLICT)
+
+        return Response({'id': int(pk), 'quantity': quantity, 'version': version})
+
+    @invalidates('organizer')
     def destroy(self, request, pk=None):
         """Handle DELETE requests for a single item
         Returns:
             Response -- 200, 404, or 500 status code
         """
         try:
-            item = Item.objects.get(pk=pk)
+            item = Item.objects.get(organizer=request.organizer, pk=pk)
             item.delete()
 
             return Response({}, status=status.HTTP_204_NO_CONTENT)
@@ -102,35 +293,306 @@ class Items(ViewSet):
         except Exception as ex:
             return Response({'message': ex.args[0]}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(methods=['post', 'patch', 'delete'], detail=False)
+    @invalidates('organizer')
+    def bulk(self, request):
+        """Handle POST, PATCH and DELETE of many items at once
+
+        POST takes a list of new items, PATCH a list of {id, quantity}
+        changes and DELETE a list of ids. The whole payload is validated
+        before anything is written and all rows are written in one
+        transaction, so a request either applies completely or not at all.
+
+        Returns:
+            Response -- Per-row results, or per-row errors with a 400
+        """
+        if request.method == 'POST':
+            return self.bulk_create(request)
+        if request.method == 'PATCH':
+            return self.bulk_update(request)
+        return self.bulk_destroy(request)
+
+    def bulk_create(self, request):
+        rows, errors = validate_rows(request.data, BulkItemSerializer)
+        if errors is not None:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        categories = get_catalog({row['category'] for row in rows})
+        missing = [
+            {'index': index, 'errors': {'category': ['Invalid category.']}}
+            for index, row in enumerate(rows) if row['category'] not in categories
+        ]
+        if missing:
+            return Response(missing, status=status.HTTP_400_BAD_REQUEST)
+
+        new_items = [
+            Item(organizer=request.organizer, name=row['name'], description=row['description'],
+                 quantity=row['quantity'], location=row['location'], category_id=row['category'])
+            for row in rows
+        ]
+        with transaction.atomic():
+            bulk_create_items(request.organizer, new_items)
+
+        results = [{'index': index, 'id': item.pk} for index, item in enumerate(new_items)]
+        return Response(results, status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, request):
+        rows, errors = validate_rows(request.data, BulkQuantitySerializer)
+        if errors is not None:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            items = Item.objects.filter(organizer=request.organizer).select_for_update().in_bulk(
+                [row['id'] for row in rows])
+            missing = [
+                {'index': index, 'errors': {'id': ['Item not found.']}}
+                for index, row in enumerate(rows) if row['id'] not in items
+            ]
+            if missing:
+                return Response(missing, status=status.HTTP_400_BAD_REQUEST)
+
+            for row in rows:
+                items[row['id']].quantity = row['quantity']
+                items[row['id']].version += 1
+            bulk_update_items(list(items.values()), ['quantity', 'version'])
+
+        results = [{'index': index, 'id': row['id']} for index, row in enumerate(rows)]
+        return Response(results)
+
+    def bulk_destroy(self, request):
+        ids = request.data
+        # bool is a subclass of int, but true and false aren't ids
+        if not isinstance(ids, list) or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+            return Response({'message': 'Expected a list of item ids.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            items = Item.objects.filter(organizer=request.organizer, id__in=ids)
+            found = set(items.values_list('id', flat=True))
+            with summaries.batch(), sync.batch(), search.batch():
+                items.delete()
+
+        results = [{'index': index, 'id': pk, 'deleted': pk in found} for index, pk in enumerate(ids)]
+        return Response(results)
+
+    @action(methods=['get', 'post', 'delete'], detail=False)
+    def tags(self, request):
+        """Handle GET, POST and DELETE of many category tags at once
+
+        GET lists the {item, category} tags of the `?items=1,2` ids. POST
+        and DELETE take a list of {item, category} rows; POST tags the
+        items with the categories and DELETE removes the tags, though not
+        an item's own category. The payload is validated first and written
+        in one transaction.
+
+        Returns:
+            Response -- The tags, or per-row results saying whether each
+                        tag was created (or deleted), or per-row errors
+                        with a 400
+        """
+        if request.method == 'GET':
+            return self.list_tags(request)
+        return self.change_tags(request)
+
+    @invalidates('organizer')
+    def change_tags(self, request):
+        rows, errors = validate_rows(request.data, TagSerializer)
+        if errors is not None:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        items = dict(Item.objects.filter(organizer=request.organizer, id__in={row['item'] for row in rows})
+                     .values_list('id', 'category_id'))
+        categories = get_catalog({row['category'] for row in rows})
+        errors = []
+        for index, row in enumerate(rows):
+            if row['item'] not in items:
+                errors.append({'index': index, 'errors': {'item': ['Item not found.']}})
+            elif row['category'] not in categories:
+                errors.append({'index': index, 'errors': {'category': ['Invalid category.']}})
+            elif request.method == 'DELETE' and items[row['item']] == row['category']:
+                errors.append({'index': index, 'errors': {'category': ["Can't untag an item's own category."]}})
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        pairs = [(row['item'], row['category']) for row in rows]
+        if request.method == 'POST':
+            created = tag_items(request.organizer, pairs)
+            results = [
+                {'index': index, 'item': item, 'category': category, 'created': (item, category) in created}
+                for index, (item, category) in enumerate(pairs)
+            ]
+            return Response(results, status=status.HTTP_201_CREATED)
+
+        deleted = untag_items(request.organizer, pairs)
+        results = [
+            {'index': index, 'item': item, 'category': category, 'deleted': (item, category) in deleted}
+            for index, (item, category) in enumerate(pairs)
+        ]
+        return Response(results)
+
+    def list_tags(self, request):
+        try:
+            ids = parse_ids(request.query_params.get('items', ''), 'items')
+        except ValueError as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+        tags = CategoryItem.objects.filter(organizer=request.organizer, item_id__in=ids).order_by(
+            'item_id', 'category_id').values_list('item_id', 'category_id')
+        return Response([{'item': item, 'category': category} for item, category in tags])
+
+    @action(methods=['get', 'post'], detail=False)
+    def export(self, request):
+        """Handle GET and POST requests for the organizer's whole inventory
+
+        GET streams every item with its category name as NDJSON, or as CSV
+        with `?output=csv`. Rows are read from the database in chunks while
+        the response is written, so memory use doesn't grow with inventory
+        size. POST writes the same file in a background job instead, to be
+        downloaded from /jobs/{id}/file once it has finished.
+
+        Returns:
+            StreamingHttpResponse -- One line per item, or the queued job with 202
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_FORMATS:
+            return Response({'message': 'Unsupported output %s' % output}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.method == 'POST':
+            job = jobs.enqueue('export_items', user=request.user, organizer_id=request.organizer.pk, output=output)
+            return accepted(request, job)
+
+        lines, content_type, extension = EXPORT_FORMATS[output]
+        items = Item.objects.filter(organizer=request.organizer)
+        response = StreamingHttpResponse(batched(lines(items)), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="inventory.%s"' % extension
+        return response
+
+    @action(methods=['post'], detail=False, url_path='import')
+    def import_items(self, request):
+        """Handle POST of an inventory file upload
+
+        The `file` part may be a fixture, NDJSON or CSV file; `?input=`
+        overrides the format guessed from its name. Rows are committed in
+        batches of `?batch_size=`, and `?skip=` resumes an import that
+        failed part way using the `committed` count from the error.
+
+        Files over FOUNDIT_JOBS['INLINE_IMPORT_BYTES'] are imported by a
+        background job, which resumes after its last committed batch when
+        retried.
+
+        Returns:
+            Response -- Import statistics, the error and committed row count, or the queued job with 202
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'message': 'No file uploaded'}, status=status.HTTP_400_BAD_REQUEST)
+
+        input_format = request.query_params.get('input') or guess_format(upload.name)
+        if input_format not in INPUT_FORMATS:
+            return Response({'message': 'Unsupported input %s' % input_format}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            batch_size = int(request.query_params.get('batch_size', BATCH_SIZE))
+            skip = int(request.query_params.get('skip', 0))
+        except ValueError:
+            return Response({'message': 'batch_size and skip must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if upload.size > jobs.get_options().get('INLINE_IMPORT_BYTES', 1024 * 1024):
+            with transaction.atomic():
+                job = jobs.enqueue('import_items', user=request.user, organizer_id=request.organizer.pk,
+                                   input_format=input_format, batch_size=max(batch_size, 1), skip=skip)
+                jobs.save_upload(job, upload)
+            return accepted(request, job)
+
+        importer = InventoryImporter(request.organizer, batch_size=max(batch_size, 1), skip=skip)
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        try:
+            stats = importer.run(INPUT_FORMATS[input_format](stream))
+        except (InventoryImportError, ValueError) as ex:
+            return Response({'message': str(ex), 'committed': importer.committed},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(stats, status=status.HTTP_201_CREATED)
+
+    @action(methods=['get'], detail=False)
+    @conditional('catalog', 'organizer')
+    def summary(self, request):
+        """Handle GET requests for the organizer's inventory totals
+
+        Reads the precomputed summary tables rather than the items, so the
+        cost doesn't grow with inventory size.
+
+        Returns:
+            Response -- Item count, total quantity and out-of-stock count,
+                        overall and per category and location
+        """
+        fields = ('item_count', 'quantity', 'out_of_stock')
+        categories = CategorySummary.objects.filter(organizer=request.organizer, item_count__gt=0).order_by(
+            'category__name', 'category_id').values_list('category_id', 'category__name', *fields)
+        locations = LocationSummary.objects.filter(organizer=request.organizer, item_count__gt=0).order_by(
+            'location').values_list('location', *fields)
+
+        categories = [
+            {'category': pk, 'name': name, 'items': count, 'quantity': quantity, 'out_of_stock': out_of_stock}
+            for pk, name, count, quantity, out_of_stock in categories
+        ]
+        locations = [
+            {'location': location, 'items': count, 'quantity': quantity, 'out_of_stock': out_of_stock}
+            for location, count, quantity, out_of_stock in locations
+        ]
+        return Response({
+            'items': sum(row['items'] for row in categories),
+            'quantity': sum(row['quantity'] for row in categories),
+            'out_of_stock': sum(row['out_of_stock'] for row in categories),
+            'categories': categories,
+            'locations': locations,
+        })
+
+    @action(methods=['get'], detail=False)
+    def search(self, request):
+        """Handle GET requests to search the organizer's items
+
+        Matches `?q=` against item names, descriptions and locations,
+        tolerating prefixes and small typos. `?limit=` caps the results.
+
+        Returns:
+            Response -- JSON serialized items with a `score`, best match first
+        """
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+        except ValueError:
+            return Response({'message': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = search.search_items(request.organizer, query, limit)
+        scores = dict(results)
+        serializer = ItemRowSerializer(request)
+        rows = {row['id']: row for row in serializer.to_rows(Item.objects.filter(pk__in=scores))}
+        matches = []
+        for pk, item_score in results:
+            if pk in rows:
+                rows[pk]['score'] = item_score
+                matches.append(rows[pk])
+
+        return Response(matches)
+
     def list(self, request):
         """Handle GET requests to items resource
+
+        `?fields=id,name,quantity` returns, and selects, only those
+        columns, plus the `id` and `created_at` the next page cursor needs.
+        `?categories=1,2` returns items tagged with any of the categories,
+        and `&match=all` only those tagged with all of them.
+
         Returns:
             Response -- JSON serialized list of items
         """
-        organizer = Organizer.objects.get(user=request.auth.user)
-        items = Item.objects.filter(organizer=organizer)
-
-        item_list = list()
-
-        # support filtering by category
-        category = self.request.query_params.get('category', None)
-        if category is not None:
-            items = items.filter(category_id=category)
-            for item in items:
-                if item.quantity > 0:
-                    item_list.append(item)
-            items = item_list
-
-        # support filtering by name
-        name = self.request.query_params.get('name', None)
-        if name is not None:
-            items = items.filter(name=name)
-            for item in items:
-                if item.quantity > 0:
-                    item_list.append(item)
-            items = item_list
+        try:
+            items = filter_items(request.organizer, request.query_params)
+        except ValueError as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = ItemSerializer(
-            items, many=True, context={'request': request})
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(items, request, view=self)
+        serializer = ItemRowSerializer(request)
 
-        return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.to_rows(page))
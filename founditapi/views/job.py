@@ -0,0 +1,82 @@
+"""View module for background job status and results"""
+import json
+import os
+from django.http import FileResponse
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.viewsets import ViewSet
+from founditapi import routing
+from founditapi.jobs import job_path
+from founditapi.models import Job
+from .rows import JobRowSerializer
+
+
+def visible_jobs(request):
+    """Every job for staff users, otherwise the ones the requester queued"""
+    if request.user.is_staff:
+        return Job.objects.all()
+    return Job.objects.filter(user=request.user)
+
+
+def job_row(request, pk):
+    """Reads a job's row, raising Job.DoesNotExist when it isn't visible"""
+    try:
+        row = JobRowSerializer(request).to_single(visible_jobs(request), pk=pk)
+    except Job.DoesNotExist:
+        # A job queued moments ago may not have reached the replica yet
+        with routing.primary():
+            row = JobRowSerializer(request).to_single(visible_jobs(request), pk=pk)
+    if row.get('result') is not None:
+        row['result'] = json.loads(row['result'])
+    return row
+
+
+def accepted(request, job):
+    """The 202 response for a request that queued `job`, pointing at its status"""
+    row = job_row(request, job.pk)
+    return Response(row, status=status.HTTP_202_ACCEPTED, headers={'Location': '/jobs/%d' % job.pk})
+
+
+class Jobs(ViewSet):
+    """Background jobs queued by long running requests
+
+    Poll a job until its status is `succeeded` or `failed`. `progress`
+    counts the rows handled so far, out of `total` when that is known.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def retrieve(self, request, pk=None):
+        """Handle GET requests for a job's status
+
+        Returns:
+            Response -- The job, with `result` once it has succeeded
+        """
+        try:
+            return Response(job_row(request, pk))
+        except Job.DoesNotExist as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
+
+    @action(methods=['get'], detail=True)
+    def file(self, request, pk=None):
+        """Handle GET requests for the file a finished export job wrote
+
+        Returns:
+            FileResponse -- The export, or 404 while there is none
+        """
+        try:
+            row = job_row(request, pk)
+        except Job.DoesNotExist as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
+
+        result = row['result'] or {}
+        if row['status'] != Job.SUCCEEDED or 'file' not in result:
+            return Response({'message': 'Job %s has no file' % pk}, status=status.HTTP_404_NOT_FOUND)
+        extension = result['file'].rsplit('.', 1)[1]
+        path = job_path(row['id'], extension)
+        if not os.path.exists(path):
+            return Response({'message': 'The file has expired'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename='inventory.%s' % extension,
+                            content_type=result['content_type'])
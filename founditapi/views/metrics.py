@@ -0,0 +1,34 @@
+"""View module for reporting runtime performance counters"""
+from django.http import HttpResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from founditapi import metrics
+from founditapi.caching import stats
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    '''Handles GET requests for response cache statistics
+    Method arguments:
+      request -- The full HTTP request object
+
+    Returns:
+        Response -- Hit ratio, outcome counts and mean latency per cached endpoint
+    '''
+    return Response(stats.snapshot())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def prometheus_metrics(request):
+    '''Handles GET requests from a Prometheus scraper, which authenticates as a staff user
+    Method arguments:
+      request -- The full HTTP request object
+
+    Returns:
+        HttpResponse -- Request, database and cache metrics in the text exposition format
+    '''
+    body = metrics.render(stats.snapshot())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,62 +1,34 @@
 """View module for handling requests about organizers"""
-from django.http import HttpResponseServerError
+from django.http import HttpResponseServerError, StreamingHttpResponse
 from rest_framework.viewsets import ViewSet
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework import serializers
 from rest_framework import status
-from django.contrib.auth.models import User
 from founditapi.models import Organizer
+from founditapi.caching import conditional, invalidates
+from founditapi.export import batched, ndjson_rows
+from founditapi.pagination import IdKeysetPagination
+from .rows import OrganizerRowSerializer
 
-"""HyperlinkedModelSerializer class
-Author: Sam Birky
-Purpose:  Allows user to communicate with the Bangazon
-database to GET PUT POST and DELETE by using hyperlinking
-between entities. Like the Model Serializer, it implements
-create() and update() methods by default.
-Methods: GET, PUT, POST, DELETE
-"""
 
-class UserSerializer(serializers.HyperlinkedModelSerializer):
-    user = serializers.HyperlinkedRelatedField(many=True, view_name='user-detail', read_only=True)
-    """JSON serializer for users
+def visible_organizers(request):
+    """Every organizer for staff users, otherwise just the requester's own"""
+    organizers = Organizer.objects.all()
+    if request.user.is_staff:
+        return organizers
+    organizer = getattr(request, 'organizer', None)
+    if organizer is None:
+        return organizers.none()
+    return organizers.filter(pk=organizer.pk)
 
-    Arguments:
-        serializers.HyperlinkedModelSerializer
 
-    """
-    class Meta:
-        model = User
-        fields = ('id', 'url', 'username', 'first_name',
-                  'last_name', 'email', 'date_joined', 'is_active')
-        depth = 1
-
-class OrganizerSerializer(serializers.HyperlinkedModelSerializer):
-
-    """JSON serializer for organziers
+class Organizers(ViewSet):
+    """Organziers for Found It!
 
-    Arguments:
-        serializers.HyperlinkedModelSerializer
+    Organizers are read as flat rows with their user joined in the same
+    query and embedded, so a page costs one query however many organizers
+    there are. `?expand=` with no value returns the user by id instead.
     """
-# Meta class is used to define props to associate with the model
-# that won't be part of the db. Great way to display related
-# properties of a model.
-    class Meta:
-        model = Organizer
-        # HyperlinkedIdentityField is used with HyperlinkedModelSerializer
-        # instead of PrimaryKeyIdentityField(used with Model Serializer)
-        url = serializers.HyperlinkedIdentityField(
-            view_name='organzier',
-        )
-        fields = ('id', 'url', 'user', 'phone_number')
-        # The default ModelSerializer uses primary keys for relationships,
-        # but you can also easily generate nested representations using the depth option:
-        # It is an integer value that indicates the depth of relationships that should
-        # be traversed before reverting to a flat representation.
-        depth = 1
-
-
-class Organizers(ViewSet):
-    """Organziers for Found It!"""
 
     def retrieve(self, request, pk=None):
 
@@ -66,12 +38,13 @@ class Organizers(ViewSet):
             Response -- JSON serialized organizer instance
         """
         try:
-            organizer = Organizer.objects.get(pk=pk)
-            serializer = OrganizerSerializer(organizer, context={'request': request})
-            return Response(serializer.data)
+            return Response(OrganizerRowSerializer(request).to_single(Organizer.objects.all(), pk=pk))
+        except Organizer.DoesNotExist as ex:
+            return Response({'message': ex.args[0]}, status=status.HTTP_404_NOT_FOUND)
         except Exception as ex:
             return HttpResponseServerError(ex)
 
+    @invalidates('organizers')
     def update(self, request, pk=None):
 
         """Handle PUT requests for a organizer
@@ -80,20 +53,38 @@ class Organizers(ViewSet):
         """
         organizer = Organizer.objects.get(pk=pk)
         organizer.user.is_active = False
-        organizer.save()
+        organizer.user.save(update_fields=['is_active'])
 
         return Response({}, status=status.HTTP_204_NO_CONTENT)
 
+    @conditional('organizers')
     def list(self, request):
         """Handle GET requests to organizers resource
 
+        Staff users see every organizer, anyone else only their own. Pages
+        are ordered by id and followed with the `next` cursor.
+
+        Returns:
+            Response -- JSON serialized page of organizers
+        """
+        paginator = IdKeysetPagination()
+        page = paginator.paginate_queryset(visible_organizers(request), request, view=self)
+        serializer = OrganizerRowSerializer(request)
+
+        return paginator.get_paginated_response(serializer.to_rows(page))
+
+    @action(methods=['get'], detail=False)
+    def export(self, request):
+        """Handle GET requests for every visible organizer at once
+
+        Streams the same rows as the listing as NDJSON, read from the
+        database in chunks while the response is written.
+
         Returns:
-            Response -- JSON serialized list of organizers
+            StreamingHttpResponse -- One line per organizer
         """
-        organizers = Organizer.objects.all()
-        serializer = OrganizerSerializer(
-            organizers,
-            many=True,
-            context={'request': request}
-        )
-        return Response(serializer.data)
+        serializer = OrganizerRowSerializer(request)
+        rows = serializer.iter_rows(visible_organizers(request).order_by('id'))
+        response = StreamingHttpResponse(batched(ndjson_rows(rows)), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="organizers.ndjson"'
+        return response
@@ -1,13 +1,62 @@
 import json
+import math
 from django.http import HttpResponse
-from django.contrib.auth import login, authenticate
 from django.contrib.auth.models import User
-from rest_framework.authtoken.models import Token
+from django.db import IntegrityError, transaction
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.authtoken.models import Token
 from founditapi.models import Organizer
+from founditapi.caching import bump
+from founditapi.ratelimit import get_login_limiters
+
+REGISTER_FIELDS = ('username', 'email', 'password', 'first_name', 'last_name', 'phone_number')
+
+
+def json_response(data, status=200):
+    return HttpResponse(json.dumps(data), content_type='application/json', status=status)
+
+
+def read_body(request, fields):
+    '''Parses a JSON request body that must contain every one of `fields`
+
+    Returns:
+        tuple -- (body dict, None) or (None, 400 response)
+    '''
+    try:
+        req_body = json.loads(request.body.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError):
+        return None, json_response({'message': 'Request body must be JSON'}, status=400)
+    if not isinstance(req_body, dict):
+        return None, json_response({'message': 'Request body must be a JSON object'}, status=400)
+    missing = [field for field in fields if not isinstance(req_body.get(field), str)]
+    if missing:
+        return None, json_response({'message': 'Missing fields: %s' % ', '.join(missing)}, status=400)
+    return req_body, None
+
+
+def check_credentials(username, password):
+    '''Looks up a user and their token in one query and checks the password
+
+    Mirrors ModelBackend.authenticate: unknown usernames still run the
+    hasher so response times don't reveal which accounts exist, and a
+    password stored with an outdated hasher is rehashed by check_password.
+
+    Returns:
+        User -- The active user, with `auth_token` loaded if they have one, or None
+    '''
+    try:
+        user = User.objects.select_related('auth_token').get(username=username)
+    except User.DoesNotExist:
+        User().set_password(password)
+        return None
+    if user.check_password(password) and user.is_active:
+        return user
+    return None
 
 
 @csrf_exempt
+@require_POST
 def login_user(request):
 
     '''Handles the authentication of a user
@@ -15,30 +64,43 @@ def login_user(request):
       request -- The full HTTP request object
     '''
 
-    body = request.body.decode('utf-8')
-    req_body = json.loads(body)
-
-    # If the request is a HTTP POST, try to pull out the relevant information.
-    if request.method == 'POST':
-
-        # Use the built-in authenticate method to verify
-        username = req_body['username']
-        password = req_body['password']
-        authenticated_user = authenticate(username=username, password=password)
-
-        # If authentication was successful, respond with their token
-        if authenticated_user is not None:
-            token = Token.objects.get(user=authenticated_user)
-            data = json.dumps({"valid": True, "token": token.key})
-            return HttpResponse(data, content_type='application/json')
-
-        else:
-            # Bad login details were provided. So we can't log the user in.
-            data = json.dumps({"valid": False})
-            return HttpResponse(data, content_type='application/json')
+    req_body, error = read_body(request, ('username', 'password'))
+    if error is not None:
+        return error
+
+    # Refuse without checking the password once either the username or the
+    # client address has failed too often recently
+    username = req_body['username']
+    address = request.META.get('REMOTE_ADDR', '')
+    by_username, by_address = get_login_limiters()
+    retry_after = max(by_username.retry_after(username), by_address.retry_after(address))
+    if retry_after:
+        response = json_response({
+            'valid': False,
+            'message': 'Too many failed logins, try again in %d seconds' % math.ceil(retry_after),
+        }, status=429)
+        response['Retry-After'] = str(math.ceil(retry_after))
+        return response
+
+    authenticated_user = check_credentials(username, req_body['password'])
+
+    # If authentication was successful, respond with their token
+    if authenticated_user is not None:
+        by_username.reset(username)
+        try:
+            token = authenticated_user.auth_token
+        except Token.DoesNotExist:
+            token = Token.objects.create(user=authenticated_user)
+        return json_response({"valid": True, "token": token.key})
+
+    # Bad login details were provided. So we can't log the user in.
+    by_username.hit(username)
+    by_address.hit(address)
+    return json_response({"valid": False})
 
 
 @csrf_exempt
+@require_POST
 def register_user(request):
 
     '''Handles the creation of a new user for authentication
@@ -46,30 +108,31 @@ def register_user(request):
       request -- The full HTTP request object
     '''
 
-    # Load the JSON string of the request body into a dict
-    req_body = json.loads(request.body.decode())
+    req_body, error = read_body(request, REGISTER_FIELDS)
+    if error is not None:
+        return error
 
-    # Create a new user by invoking the `create_user` helper method
-    # on Django's built-in User model
-    new_user = User.objects.create_user(
-        username=req_body['username'],
-        email=req_body['email'],
-        password=req_body['password'],
+    # Hash before the transaction so it isn't held open during the slow part
+    new_user = User(
+        username=User.normalize_username(req_body['username']),
+        email=User.objects.normalize_email(req_body['email']),
         first_name=req_body['first_name'],
-        last_name=req_body['last_name']
-    )
-
-    organizer = Organizer.objects.create(
-        phone_number=req_body['phone_number'],
-        user=new_user
+        last_name=req_body['last_name'],
     )
+    new_user.set_password(req_body['password'])
 
-    # Commit the user to the database by saving it
-    organizer.save()
+    # The user, organizer and token are created together or not at all,
+    # one INSERT each; a taken username fails the first one
+    try:
+        with transaction.atomic():
+            new_user.save()
+            Organizer.objects.create(phone_number=req_body['phone_number'], user=new_user)
+            token = Token.objects.create(user=new_user)
+    except IntegrityError:
+        return json_response({'message': 'Username is already taken'}, status=400)
 
-    # Use the REST Framework's token generator on the new user account
-    token = Token.objects.create(user=new_user)
+    # New organizers show up in the organizer listing
+    bump(None, 'organizers')
 
     # Return the token to the client
-    data = json.dumps({"token": token.key})
-    return HttpResponse(data, content_type='application/json')
\ No newline at end of file
+    return json_response({"token": token.key})
@@ -0,0 +1,177 @@
+"""Flat read serializers that build rows straight from queryset tuples"""
+from django.urls import reverse
+
+
+class RowSerializer:
+    """Serializes `values_list` tuples against a precomputed field plan
+
+    Subclasses list the model columns in `fields` and the related objects
+    that may be embedded in `expandable`. Related objects are returned by id
+    unless the client asks for them with `?expand=category,organizer`, or
+    the subclass embeds them by default in `default_expand`. Embedded
+    objects named in `related_views` get a url of their own.
+
+    `?fields=id,name` keeps only those keys in each row, and only their
+    columns are selected. `url` and the view-computed `extra_fields` can be
+    asked for too; `required_fields` are always kept. Unknown names are
+    ignored, as they are in `?expand=`. The plan for each distinct
+    combination of expand and fields is built once per process.
+
+    Arguments:
+        request -- The current request, used for `?expand=`, `?fields=` and absolute urls
+    """
+
+    fields = ()
+    expandable = {}
+    default_expand = ()
+    related_views = {}
+    extra_fields = ()
+    required_fields = ('id',)
+    view_name = None
+
+    _plans = {}
+    _paths = {}
+
+    def __init__(self, request):
+        self.request = request
+        self.expand = self.parse_expand(request)
+        self.selected = self.parse_fields(request)
+        self.columns, self.flat_keys, self.groups, with_url = self.plan(self.expand, self.selected)
+        self.url_prefix = self.detail_url_prefix(request, self.view_name) if with_url else None
+        self.related_url_prefixes = {
+            name: self.detail_url_prefix(request, self.related_views[name])
+            for name, start, end, related_fields in self.groups if name in self.related_views
+        }
+
+    @classmethod
+    def parse_expand(cls, request):
+        """Returns the requested expansions this serializer knows about"""
+        if request is None or 'expand' not in request.query_params:
+            return tuple(sorted(cls.default_expand))
+        names = {name.strip() for name in request.query_params['expand'].split(',')}
+        return tuple(sorted(name for name in names if name in cls.expandable))
+
+    @classmethod
+    def parse_fields(cls, request):
+        """Returns the requested fields this serializer knows about, or None for all of them"""
+        fields = request.query_params.get('fields') if request is not None else None
+        if fields is None:
+            return None
+        known = set(cls.fields) | set(cls.extra_fields) | ({'url'} if cls.view_name else set())
+        names = {name.strip() for name in fields.split(',')}
+        return tuple(sorted(names & known))
+
+    @classmethod
+    def plan(cls, expand, selected=None):
+        """Returns (columns, flat keys, expanded groups, with url) for an expand and field set"""
+        key = (cls, expand, selected)
+        plan = cls._plans.get(key)
+        if plan is None:
+            keep = set(cls.fields) if selected is None else set(selected) | set(cls.required_fields)
+            flat_keys = [field for field in cls.fields if field in keep and field not in expand]
+            columns = list(flat_keys)
+            groups = []
+            for name in expand:
+                if name not in keep:
+                    continue
+                related_fields = cls.expandable[name]
+                groups.append((name, len(columns), len(columns) + len(related_fields), related_fields))
+                columns.extend('%s__%s' % (name, field) for field in related_fields)
+            with_url = cls.view_name is not None and (selected is None or 'url' in selected)
+            plan = cls._plans[key] = (tuple(columns), tuple(flat_keys), tuple(groups), with_url)
+        return plan
+
+    def wants(self, name):
+        """Whether the response should include `name`, for fields the view fills in"""
+        return self.selected is None or name in self.selected
+
+    def detail_url_prefix(self, request, view_name):
+        """Returns the detail url of `view_name` up to the id, so rows only need string concatenation
+
+        The route is reversed once per process; only the scheme and host
+        come from the request.
+        """
+        if view_name is None or request is None:
+            return None
+        path = self._paths.get(view_name)
+        if path is None:
+            path = self._paths[view_name] = reverse(view_name, kwargs={'pk': 0})[:-1]
+        return request.build_absolute_uri(path)
+
+    def to_row(self, values):
+        """Builds a single response dict from a `values_list` tuple"""
+        row = dict(zip(self.flat_keys, values))
+        for name, start, end, related_fields in self.groups:
+            related = row[name] = dict(zip(related_fields, values[start:end]))
+            if name in self.related_url_prefixes:
+                related['url'] = self.related_url_prefixes[name] + str(related['id'])
+        if self.url_prefix is not None:
+            row['url'] = self.url_prefix + str(row['id'])
+        return row
+
+    def to_rows(self, queryset):
+        """Evaluates the queryset for just the planned columns"""
+        to_row = self.to_row
+        return [to_row(values) for values in queryset.values_list(*self.columns)]
+
+    def iter_rows(self, queryset, chunk_size=2000):
+        """Streams rows from a server-side cursor without caching the queryset"""
+        to_row = self.to_row
+        for values in queryset.values_list(*self.columns).iterator(chunk_size=chunk_size):
+            yield to_row(values)
+
+    def to_single(self, queryset, **lookup):
+        """Fetches one row, raising the model's DoesNotExist when missing"""
+        return self.to_row(queryset.values_list(*self.columns).get(**lookup))
+
+
+class ItemRowSerializer(RowSerializer):
+    """Flat JSON rows for items
+
+    `created_at` is always kept because the keyset pagination cursor is
+    built from it.
+    """
+
+    fields = ('id', 'name', 'description', 'quantity', 'version',
+              'location', 'created_at', 'updated_at', 'category', 'organizer')
+    expandable = {
+        'category': ('id', 'name'),
+        'organizer': ('id', 'phone_number', 'user'),
+    }
+    required_fields = ('id', 'created_at')
+    view_name = 'item-detail'
+
+
+class CategoryRowSerializer(RowSerializer):
+    """Flat JSON rows for categories"""
+
+    fields = ('id', 'name', 'updated_at')
+    extra_fields = ('organizer_items',)
+    view_name = 'category-detail'
+
+
+class OrganizerRowSerializer(RowSerializer):
+    """Flat JSON rows for organizers, with their user embedded unless `?expand=` says otherwise"""
+
+    fields = ('id', 'phone_number', 'user')
+    expandable = {
+        'user': ('id', 'username', 'first_name', 'last_name', 'email', 'date_joined', 'is_active'),
+    }
+    default_expand = ('user',)
+    related_views = {'user': 'user-detail'}
+    view_name = 'organizer-detail'
+
+
+class UserRowSerializer(RowSerializer):
+    """Flat JSON rows for users"""
+
+    fields = ('id', 'username', 'first_name', 'last_name', 'email', 'date_joined', 'is_active')
+    view_name = 'user-detail'
+
+
+class JobRowSerializer(RowSerializer):
+    """Flat JSON rows for background jobs, with `result` still JSON encoded"""
+
+    fields = ('id', 'kind', 'status', 'attempts', 'progress', 'total', 'result', 'error',
+              'created_at', 'started_at', 'finished_at')
+    view_name = 'job-detail'
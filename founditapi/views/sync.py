@@ -0,0 +1,72 @@
+"""View module for the incremental change feed"""
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from founditapi import sync
+from founditapi.models import Category, Change, Item
+from .rows import CategoryRowSerializer, ItemRowSerializer
+
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1000
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_changes(request):
+    '''Handles GET requests for the items and categories changed since a token
+    Method arguments:
+      request -- The full HTTP request object
+
+    Without `?since=` only a token for the current position is returned,
+    to be fetched before downloading the full lists. With it, up to
+    `?limit=` changes after that position come back as the current rows
+    of changed items and categories and the ids of deleted ones; `more`
+    says to poll again straight away. A token older than the change
+    log's retention gets `reset`, meaning the lists must be downloaded
+    again.
+
+    Returns:
+        Response -- The changes and the `next` token to poll with
+    '''
+    since = request.query_params.get('since')
+    if since is None:
+        return Response({'next': sync.encode_token(sync.latest_id()), 'reset': True})
+
+    try:
+        last_id, issued = sync.decode_token(since)
+    except ValueError as ex:
+        return Response({'message': ex.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT))
+    except ValueError:
+        return Response({'message': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if sync.expired(issued):
+        return Response({'next': sync.encode_token(sync.latest_id()), 'reset': True})
+
+    changes = sync.changes_after(request.organizer, last_id, limit + 1)
+    more = len(changes) > limit
+    changes = changes[:limit]
+    if not changes:
+        return Response({'next': sync.encode_token(last_id), 'reset': False, 'more': False})
+
+    # Only the latest change to each object counts
+    latest = {(kind, object_id): deleted for _, kind, object_id, deleted in changes}
+    changed = {Change.ITEM: [], Change.CATEGORY: []}
+    deleted = {Change.ITEM: [], Change.CATEGORY: []}
+    for (kind, object_id), is_deleted in latest.items():
+        (deleted if is_deleted else changed)[kind].append(object_id)
+
+    items = Item.objects.filter(organizer=request.organizer, pk__in=changed[Change.ITEM]).order_by('id')
+    categories = Category.objects.filter(pk__in=changed[Change.CATEGORY]).order_by('id')
+    return Response({
+        'next': sync.encode_token(changes[-1][0]),
+        'reset': False,
+        'more': more,
+        'items': ItemRowSerializer(request).to_rows(items) if changed[Change.ITEM] else [],
+        'deleted_items': deleted[Change.ITEM],
+        'categories': CategoryRowSerializer(request).to_rows(categories) if changed[Change.CATEGORY] else [],
+        'deleted_categories': deleted[Change.CATEGORY],
+    })
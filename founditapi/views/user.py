@@ -1,6 +1,81 @@
 from django.contrib.auth.models import User
-from rest_framework import viewsets
+from django.http import StreamingHttpResponse
+from rest_framework import serializers, viewsets
+from rest_framework.decorators import action
+from founditapi import jobs
+from founditapi.caching import bump
+from founditapi.export import batched, ndjson_rows
+from founditapi.models import Item
+from founditapi.pagination import IdKeysetPagination
+from .job import accepted
+from .rows import UserRowSerializer
+
+
+class UserSerializer(serializers.HyperlinkedModelSerializer):
+    """JSON serializer for users
+
+    Arguments:
+        serializers.HyperlinkedModelSerializer
+    """
+    class Meta:
+        model = User
+        fields = ('id', 'url', 'username', 'first_name',
+                  'last_name', 'email', 'date_joined', 'is_active')
 
 
 class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
\ No newline at end of file
+    """Users, all of them for staff and only themselves for anyone else
+
+    Listings are read as flat rows a page at a time by id, rather than
+    counting and hyperlinking the whole table.
+    """
+    queryset = User.objects.order_by('id')
+    serializer_class = UserSerializer
+    pagination_class = IdKeysetPagination
+
+    def get_queryset(self):
+        users = super().get_queryset()
+        if self.request.user.is_staff:
+            return users
+        return users.filter(pk=self.request.user.pk)
+
+    def list(self, request):
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(UserRowSerializer(request).to_rows(page))
+
+    @action(methods=['get'], detail=False)
+    def export(self, request):
+        """Streams every visible user as NDJSON, read in chunks while the response is written"""
+        rows = UserRowSerializer(request).iter_rows(self.get_queryset())
+        response = StreamingHttpResponse(batched(ndjson_rows(rows)), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="users.ndjson"'
+        return response
+
+    # Organizer listings embed their users, so user writes invalidate them
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        bump(None, 'organizers')
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        bump(None, 'organizers')
+
+    def destroy(self, request, *args, **kwargs):
+        """Deletes a user, in a background job when their organizer has many items
+
+        The user is deactivated straight away, so their tokens stop working
+        while the job deletes the items a batch at a time.
+        """
+        user = self.get_object()
+        items = Item.objects.filter(organizer__user=user)
+        if items.count() <= jobs.get_options().get('INLINE_DELETE_ITEMS', 1000):
+            return super().destroy(request, *args, **kwargs)
+
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        bump(None, 'organizers')
+        return accepted(request, jobs.enqueue('delete_organizer', user=request.user, user_id=user.pk))
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        bump(None, 'organizers')